@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from loguru import logger
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.batching import MicroBatcher
+
+STEP_TIME = 0.02
+PROMPT_TIME = 0.001
+REQUESTS = 400
+CALLERS = 64
+MAX_BATCH_SIZE = 16
+MAX_WAIT = 0.005
+
+
+class _StubServer(BaseHTTPRequestHandler):
+    """
+    Inference server stub running one forward pass at a time: a pass takes STEP_TIME plus PROMPT_TIME
+    per prompt, whether it serves a single completion or a batch.
+    """
+    protocol_version = "HTTP/1.1"
+    engine = threading.Lock()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _complete(self, payloads: list) -> list:
+        with self.engine:
+            time.sleep(STEP_TIME + PROMPT_TIME * len(payloads))
+        return [{"choices": [{"message": {"content": payload["messages"][-1]["content"]}}],
+                 "usage": {"total_tokens": 10}} for payload in payloads]
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/completions":
+            response = self._complete([body])[0]
+        elif self.path == "/batch/completions":
+            response = {"responses": self._complete(body["requests"])}
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _Server(ThreadingHTTPServer):
+    # all callers may connect at once
+    request_queue_size = CALLERS
+
+
+def _run(base_url: str, batcher: Optional[MicroBatcher]) -> None:
+    model = LlamaChatModel(model_name="llama", base_url=base_url, micro_batcher=batcher,
+                           max_connections=CALLERS, max_keepalive_connections=CALLERS)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        list(executor.map(lambda i: model.invoke([HumanMessage(content=f"prompt {i}")]), range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+
+    name = "batched" if batcher is not None else "single"
+    logger.info(f"{name}: {REQUESTS / elapsed:.1f} completions/s, {model.pool_metrics().requests} HTTP requests, "
+                f"batches: {model.batch_metrics()}")
+    model.close()
+
+
+def main() -> None:
+    """
+    Script for comparing single completion requests with micro-batched requests against a local stub
+    server, which serves one forward pass at a time, like an inference server without continuous batching.
+    """
+    server = _Server(("127.0.0.1", 0), _StubServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    _run(base_url, None)
+    _run(base_url, MicroBatcher(max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
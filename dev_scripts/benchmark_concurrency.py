@@ -0,0 +1,76 @@
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+from langchain_core.messages import HumanMessage
+from loguru import logger
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.concurrency import AdaptiveLimiter
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import RetryPolicy
+
+CAPACITY = 8
+SERVICE_TIME = 0.05
+QUEUE_TIMEOUT = 0.25
+REQUESTS = 1000
+CALLERS = 128
+
+
+def _simulated_backend() -> httpx.AsyncBaseTransport:
+    """A backend serving `CAPACITY` requests at a time, rejecting requests queued longer than `QUEUE_TIMEOUT`."""
+    slots = asyncio.Semaphore(CAPACITY)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.wait_for(slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return httpx.Response(503)
+        try:
+            await asyncio.sleep(SERVICE_TIME)
+        finally:
+            slots.release()
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    return httpx.MockTransport(handle)
+
+
+async def _run(limiter: Optional[AdaptiveLimiter]) -> None:
+    model = LlamaChatModel(model_name="llama", base_url="http://llm", concurrency_limiter=limiter,
+                           retry_policy=RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1.0),
+                           circuit_breaker=None)
+    model._http = PooledClient(async_transport=_simulated_backend())
+    callers = asyncio.Semaphore(CALLERS)
+    failed = 0
+
+    async def request(i: int) -> None:
+        nonlocal failed
+        async with callers:
+            try:
+                await model.ainvoke([HumanMessage(content=str(i))])
+            except httpx.HTTPStatusError:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+
+    name = "adaptive" if limiter is not None else "fixed"
+    logger.info(f"{name}: {(REQUESTS - failed) / elapsed:.1f} successful requests/s, {failed} failed after retries, "
+                f"{model.pool_metrics().requests} sent, limiter: {model.concurrency_metrics()}")
+
+
+def main() -> None:
+    """
+    Script for comparing a fixed number of concurrent requests with the adaptive concurrency limiter.
+    A simulated backend serves a few requests at a time and rejects requests it cannot start in time,
+    like a busy inference server; the ideal throughput is CAPACITY / SERVICE_TIME requests per second.
+    """
+    logger.info(f"Backend capacity: {CAPACITY / SERVICE_TIME:.0f} requests/s, callers: {CALLERS}")
+    asyncio.run(_run(None))
+    asyncio.run(_run(AdaptiveLimiter(initial_limit=16, max_limit=CALLERS)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from punito.processing import ClassIndex
+from punito.processing.preprocessor import get_tested_public_methods
+from punito.processing.tree_preprocessor import find_java_classes
+from punito.utils import read_file
+
+
+def _chunking_facts(class_code: str, backend: str) -> tuple:
+    # everything chunking needs from the parser, forced in the order get_chunk_layouts uses it
+    index = ClassIndex(class_code, backend=backend)
+    return (get_tested_public_methods(index), index.method_spans, index.call_graph.calls,
+            index.state_updating_methods, index.field_names, index.fields_update_state)
+
+
+def _measure(class_code: str, backend: str, repeats: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        facts = _chunking_facts(class_code, backend)
+    return (time.perf_counter() - start) / repeats, facts
+
+
+def main():
+    """
+    Script for comparing the speed of the structural scanner and javalang on all panel controller beans of a module.
+    """
+    module_path = Path(r"C:\moeve_IDE\moeve-ide\workspaces\master\moeve-vvst\moeve-enst-dlg\src\main\java")
+    repeats = 3
+
+    totals = {"scanner": 0.0, "javalang": 0.0}
+    fallbacks = 0
+    for path in find_java_classes(module_path, "*PanelControllerBean.java"):
+        class_code = read_file(path)
+        if not class_code:
+            continue
+
+        javalang_time, javalang_facts = _measure(class_code, "javalang", repeats)
+        scanner_time, scanner_facts = _measure(class_code, "scanner", repeats)
+        totals["javalang"] += javalang_time
+        totals["scanner"] += scanner_time
+
+        if ClassIndex(class_code, backend="scanner").scan is None:
+            fallbacks += 1
+        elif scanner_facts != javalang_facts:
+            logger.warning(f"{path.name}: scanner and javalang disagree")
+
+        logger.info(f"{path.name} ({class_code.count(chr(10))} lines): javalang {javalang_time:.3f}s, "
+                    f"scanner {scanner_time:.3f}s, speedup {javalang_time / scanner_time:.1f}x")
+
+    logger.info(f"Total: javalang {totals['javalang']:.2f}s, scanner {totals['scanner']:.2f}s, "
+                f"speedup {totals['javalang'] / max(totals['scanner'], 1e-9):.1f}x, {fallbacks} classes fell back")
+
+
+if __name__ == "__main__":
+    main()
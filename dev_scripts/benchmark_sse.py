@@ -0,0 +1,92 @@
+import json
+import time
+from typing import Callable, Iterator, List, Optional
+
+import httpx
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from loguru import logger
+
+from punito.chat_model.sse import SSEDecoder
+
+TOKENS = 2000
+STREAMS = 200
+READ_SIZE = 4096
+FLUSH_INTERVAL = 0.05
+TOKEN = "    this.softly.assertThat"
+
+
+def _body() -> bytes:
+    event = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "model": "llama",
+             "choices": [{"index": 0, "delta": {"content": TOKEN}, "finish_reason": None}]}
+    return ("".join(f"data: {json.dumps(event)}\n\n" for _ in range(TOKENS)) + "data: [DONE]\n\n").encode()
+
+
+def _reads(body: bytes) -> Iterator[bytes]:
+    for start in range(0, len(body), READ_SIZE):
+        yield body[start:start + READ_SIZE]
+
+
+def _parse_stream_line(line: str) -> Optional[str]:
+    # the line parser the chat model used before the SSE decoder
+    if not line or line == "data: [DONE]":
+        return None
+    try:
+        data = json.loads(line.replace("data: ", ""))
+        return data.get("choices", [{}])[0].get("delta", {}).get("content", "")
+    except json.JSONDecodeError:
+        logger.warning(f"JSON decode error in stream chunk: {line}")
+    return None
+
+
+def _lines(body: bytes) -> Iterator[str]:
+    response = httpx.Response(200, content=_reads(body))
+    for line in response.iter_lines():
+        content = _parse_stream_line(line)
+        if content:
+            yield content
+
+
+def _decoder(flush_interval: float) -> Callable[[bytes], Iterator[str]]:
+    def decode(body: bytes) -> Iterator[str]:
+        response = httpx.Response(200, content=_reads(body))
+        decoder = SSEDecoder(flush_interval)
+        for data in response.iter_bytes():
+            yield from decoder.feed(data)
+        yield from decoder.close()
+
+    return decode
+
+
+def _measure(name: str, decode: Callable[[bytes], Iterator[str]], body: bytes) -> None:
+    start = time.perf_counter()
+    for _ in range(STREAMS):
+        deltas = list(decode(body))
+    decoded = time.perf_counter() - start
+    assert "".join(deltas) == TOKEN * TOKENS
+
+    start = time.perf_counter()
+    for _ in range(STREAMS):
+        chunks: List[ChatGenerationChunk] = [ChatGenerationChunk(message=AIMessageChunk(content=content))
+                                             for content in decode(body)]
+    streamed = time.perf_counter() - start
+    logger.info(f"{name}: decoding {STREAMS * TOKENS / decoded:,.0f} tokens/s, "
+                f"with chunks {STREAMS * TOKENS / streamed:,.0f} tokens/s, {len(chunks)} chunks per stream")
+
+
+def main() -> None:
+    """
+    Micro-benchmark of decoding chat completion streams: the previous line parser against the SSE
+    decoder, without and with coalescing. The streams are decoded from memory as fast as possible,
+    so with coalescing every stream ends up in a single chunk; a real stream arrives over time and
+    is coalesced into one chunk per FLUSH_INTERVAL.
+    """
+    body = _body()
+    logger.info(f"{STREAMS} streams of {TOKENS} tokens ({len(body)} bytes each)")
+    _measure("line parser", _lines, body)
+    _measure("SSE decoder", _decoder(0.0), body)
+    _measure(f"SSE decoder, coalescing per {FLUSH_INTERVAL} s", _decoder(FLUSH_INTERVAL), body)
+
+
+if __name__ == "__main__":
+    main()
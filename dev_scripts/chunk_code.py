@@ -1,4 +1,4 @@
-from punito.processing.preprocessor import get_chunked_code
+from punito.processing import get_chunked_code_cached
 from pathlib import Path
 from punito.utils import read_file
 from dev_utils import save_chunks
@@ -13,7 +13,7 @@ def main():
     class_path = r"C:\moeve_IDE\moeve-ide\workspaces\master\moeve-vvst\moeve-enst-dlg\src\main\java\de\itzbund\moeve\enst\permission\application\dlg\af100\controller\OtherAdmissionsPanelControllerBean.java"
     class_code = read_file(Path(class_path))
 
-    chunked_code = get_chunked_code(class_code)
+    chunked_code = get_chunked_code_cached(class_code)
     save_chunks(json.dumps(chunked_code), Path(__file__).parent / "debug" / "latest" / "chunked_code" / "chunked_code.txt" )
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+from pathlib import Path
+import json
+
+from loguru import logger
+
+from punito.processing import chunk_source_tree
+from dev_utils import save_chunks
+
+
+def main():
+    """
+    Script for chunking all panel controller beans of a module in parallel and saving the results in a readable format.
+    """
+    module_path = Path(r"C:\moeve_IDE\moeve-ide\workspaces\master\moeve-vvst\moeve-enst-dlg\src\main\java")
+    output_path = Path(__file__).parent / "debug" / "latest" / "chunked_source_tree"
+
+    failed = 0
+    for result in chunk_source_tree(module_path):
+        if result.error:
+            failed += 1
+            continue
+        save_chunks(json.dumps(result.chunks), output_path / f"{result.path.stem}.txt")
+
+    logger.info(f"Chunking finished, {failed} classes failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from typing import List
 
 from punito.utils import write_to_file
 from loguru import logger
-from punito.processing import get_chunked_code
+from punito.processing import get_chunked_code_cached
 from punito.utils import read_file, extract_class_name, find_project_root, get_package_version
 from punito.tests_generator import TestsGenerator
 from datetime import datetime
@@ -55,7 +55,7 @@ def _get_function_code_and_save_debug(class_path: Path, exe_fn_name: str, tst_fn
     """
     common_path = find_project_root() / 'dev_scripts' / "debug"
 
-    chunked_code = get_chunked_code(read_file(class_path))
+    chunked_code = get_chunked_code_cached(read_file(class_path))
     save_chunks(json.dumps(chunked_code), common_path / "latest" / "chunked_code" / "chunked_code.txt")
 
     function_code = chunked_code[exe_fn_name][tst_fn_name]
@@ -0,0 +1,88 @@
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List
+
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+from punito import TestsGenerator
+from punito.tests_generator.generator_utils import get_test_example
+from punito.utils import create_messages_from_yaml_template, extract_class_name, read_file
+
+CLASS_PATH = Path(
+    r"C:\Projects\moeve\R3\devon-ide\workspaces\main\moeve-enst\moeve-enst-dlg\src\main\java\de\itzbund\moeve\enst\permission\application\dlg\af100\controller\OtherAdmissionsPanelControllerBean.java"
+)
+# prompts the server keeps cached at the same time
+CACHED_PROMPTS = 8
+# stands in for the plan generated for a chunk, which differs from chunk to chunk
+PLAN = "**shouldUpdate{name}WhenConditionHolds**\n- **Test Setup:**\n  - Create model for {name}.\n" * 20
+# sends every prompt to the configured server and measures the time to its first token
+MEASURE_TTFT = False
+
+
+def _shared_prefix(first: str, second: str) -> int:
+    """Length of the common prefix of two strings, by binary search over slice comparisons."""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(message.content for message in messages)
+
+
+def _measure_ttft(generator: TestsGenerator, messages: List[BaseMessage]) -> float:
+    start = time.perf_counter()
+    for _ in generator.llm.stream(messages, max_tokens=1):
+        break
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """
+    Script for measuring how much of the prompts of a class a prefix-caching inference server can reuse.
+    The prompts of every chunk are rendered in submission order; a prompt reuses the longest prefix it
+    shares with one of the last CACHED_PROMPTS prompts, the rest of it has to be prefilled.
+    """
+    generator = TestsGenerator(extract_class_name(CLASS_PATH), datetime.now().isoformat().replace(":", "-"))
+    class_code = read_file(CLASS_PATH)
+    example_code = get_test_example("PanelControllerExampleMockitoTest.java")
+
+    recent: Deque[str] = deque(maxlen=CACHED_PROMPTS)
+    total: Dict[str, int] = {}
+    reused: Dict[str, int] = {}
+    ttft: List[float] = []
+    for chunk, public_fn, dep_name, _ in generator._iter_pending_chunks(class_code, example_code, {}, {}, []):
+        placeholders = {
+            "execution_function_name": public_fn,
+            "tested_function_name": dep_name,
+            "source_code": str(chunk),
+            "test_example": example_code,
+            "tests_plan": PLAN.format(name=dep_name),
+        }
+        for step in ("plan", "tests"):
+            messages = create_messages_from_yaml_template(generator.pipeline_steps[step]["prompt"], placeholders)
+            prompt = _prompt_text(messages)
+            total[step] = total.get(step, 0) + len(prompt.encode())
+            shared = max((_shared_prefix(prompt, previous) for previous in recent), default=0)
+            reused[step] = reused.get(step, 0) + len(prompt[:shared].encode())
+            recent.append(prompt)
+            if MEASURE_TTFT:
+                ttft.append(_measure_ttft(generator, messages))
+
+    for step in total:
+        logger.info(f"{step}: {total[step]} prompt bytes, {reused[step]} reusable from the prefix cache "
+                    f"({100 * reused[step] / total[step]:.1f} %), {total[step] - reused[step]} to prefill")
+    if ttft:
+        logger.info(f"Time to first token: mean {sum(ttft) / len(ttft):.3f} s, max {max(ttft):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from punito.chat_model.response_cache import get_default_response_cache
+
+
+def main() -> None:
+    """
+    Script for moving the LLM response cache between machines.
+    Exports the local cache into an archive, or imports an archive exported on another machine,
+    e.g. to run the generation with `--cache-mode replay-only` without the inference server.
+    """
+
+    archive_path = Path(__file__).parent / "debug" / "latest" / "response_cache.zip"
+    export = True
+
+    cache = get_default_response_cache()
+    if export:
+        cache.export_archive(archive_path)
+    else:
+        cache.import_archive(archive_path)
+
+
+if __name__ == "__main__":
+    main()
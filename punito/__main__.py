@@ -1,7 +1,10 @@
 import argparse
+import asyncio
 from pathlib import Path
 
 from loguru import logger
+from punito.chat_model.response_cache import CACHE_MODES
+from punito.processing.chunk_cover import CHUNK_PLANNERS
 from punito.tests_generator import TestsGenerator
 from datetime import datetime
 from punito.utils import extract_class_name
@@ -32,12 +35,45 @@ def main() -> None:
     logger.info("Starting Punito...")
     parser = argparse.ArgumentParser(description="Generate JUnit Mockito tests using deployed model.")
     parser.add_argument("class_path", help="Path to the Java class file.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuse tests of the previous run for chunks whose code did not change.")
+    parser.add_argument("--target-tokens", type=int, default=None,
+                        help="Pack chunks into requests of about this many prompt tokens (0 disables packing).")
+    parser.add_argument("--planner", choices=CHUNK_PLANNERS, default=None,
+                        help="How chunks are selected; the min-* planners test every private dependency "
+                             "in the context of the public method with the cheapest chunk.")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Send the requests from an asyncio event loop instead of worker threads.")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Maximum number of chunks generated at the same time.")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default=None,
+                        help="Cache of LLM completions; replay-only answers from the cache without the server.")
+    parser.add_argument("--continuation", action="store_true", default=None,
+                        help="Ask for the tests in the conversation of the plan instead of a new request.")
 
-    class_path = parser.parse_args().class_path
-    logger.info(f"Received arguments: class_path={class_path}")
+    args = parser.parse_args()
+    class_path = args.class_path
+    logger.info(f"Received arguments: class_path={class_path}, incremental={args.incremental}, "
+                f"target_tokens={args.target_tokens}, planner={args.planner}, use_async={args.use_async}, "
+                f"max_concurrency={args.max_concurrency}, cache_mode={args.cache_mode}, "
+                f"continuation={args.continuation}")
+
+    generator = TestsGenerator(extract_class_name(Path(class_path)), datetime.now().isoformat().replace(":", "-"),
+                               incremental=args.incremental, target_tokens=args.target_tokens, planner=args.planner,
+                               max_concurrency=args.max_concurrency, cache_mode=args.cache_mode,
+                               continuation=args.continuation)
+    if args.use_async:
+        asyncio.run(_generate_async(generator, Path(class_path)))
+    else:
+        generator.generate_tests_for_class(class_path=Path(class_path))
+
+
+async def _generate_async(generator: TestsGenerator, class_path: Path) -> None:
+    try:
+        await generator.agenerate_tests_for_class(class_path)
+    finally:
+        await generator.llm.aclose()
 
-    generator = TestsGenerator(extract_class_name(class_path), datetime.now().isoformat().replace(":", "-"))
-    generator.generate_tests_for_class(class_path=Path(class_path))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Generic, List, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# status codes of a batch endpoint the server does not provide
+BATCH_UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+
+class BatchNotSupported(Exception):
+    """Raised to the callers of a batch the server does not accept; they send their requests one by one."""
+
+
+class BatchMetrics(NamedTuple):
+    """
+    Snapshot of a `MicroBatcher`.
+
+    Attributes
+    ----------
+    batches : int
+        Batches sent.
+    items : int
+        Requests sent in the batches.
+    largest : int
+        Number of requests in the largest batch.
+    """
+    batches: int
+    items: int
+    largest: int
+
+
+class _Batch(Generic[T, R]):
+
+    def __init__(self):
+        self.items: List[T] = []
+        self.futures: list = []
+        self.full = threading.Event()
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects concurrent requests into batches sent together.
+
+    A batch is opened by the first request submitted while no batch is open and sent when it
+    holds `max_batch_size` requests or `max_wait` seconds after it was opened, whichever is first.
+    The results of the batch are routed back to the callers in the order of their requests; if
+    sending the batch fails, every caller gets the error.
+
+    Threads are batched with threads (`submit`), the first thread of a batch sends it; coroutines
+    are batched with coroutines of the same event loop (`asubmit`), their batches are sent by a task.
+
+    Parameters
+    ----------
+    max_batch_size : int, optional
+        Maximum number of requests in a batch, by default 16.
+    max_wait : float, optional
+        Seconds a batch waits for more requests, by default 0.01.
+    """
+
+    def __init__(self, max_batch_size: int = 16, max_wait: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending: Optional[_Batch] = None
+        self._apending: Optional[_Batch] = None
+        self._apending_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+
+    def metrics(self) -> BatchMetrics:
+        """Return a snapshot of the batches sent."""
+        with self._lock:
+            return BatchMetrics(self._batches, self._items, self._largest)
+
+    def _sent(self, batch: _Batch) -> None:
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch.items)
+            self._largest = max(self._largest, len(batch.items))
+
+    def submit(self, item: T, send: Callable[[List[T]], List[R]]) -> R:
+        """
+        Adds a request to the open batch and waits for its result.
+
+        Parameters
+        ----------
+        item : T
+            The request.
+        send : Callable[[List[T]], List[R]]
+            Sends a batch and returns the results of its requests in order; the function of the
+            thread opening the batch is used.
+
+        Returns
+        -------
+        R
+            The result of the request.
+        """
+        future = Future()
+        with self._lock:
+            batch = self._pending
+            opened = batch is None
+            if opened:
+                batch = self._pending = _Batch()
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch_size:
+                self._pending = None
+                batch.full.set()
+
+        if opened:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            self._sent(batch)
+            try:
+                results = send(batch.items)
+            except BaseException as e:
+                for waiting in batch.futures:
+                    waiting.set_exception(e)
+            else:
+                for waiting, result in zip(batch.futures, results):
+                    waiting.set_result(result)
+        return future.result()
+
+    async def asubmit(self, item: T, send: Callable[[List[T]], Awaitable[List[R]]]) -> R:
+        """Async variant of `submit`."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            batch = self._apending if self._apending_loop is loop else None
+            if batch is None:
+                batch = self._apending = _Batch()
+                self._apending_loop = loop
+                batch.full = asyncio.Event()
+                # sent by its own task, so a cancelled caller does not strand the others
+                loop.create_task(self._asend(batch, send))
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch_size:
+                self._apending = None
+                batch.full.set()
+
+        return await future
+
+    async def _asend(self, batch: _Batch, send: Callable[[List[T]], Awaitable[List[R]]]) -> None:
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                # closed even if the task is cancelled while waiting, so no caller joins a batch never sent
+                with self._lock:
+                    if self._apending is batch:
+                        self._apending = None
+            self._sent(batch)
+            results = await send(batch.items)
+        except Exception as e:
+            for waiting in batch.futures:
+                if not waiting.done():
+                    waiting.set_exception(e)
+        except BaseException:
+            # e.g. the task is cancelled, the callers must not wait for results that never come
+            for waiting in batch.futures:
+                waiting.cancel()
+            raise
+        else:
+            for waiting, result in zip(batch.futures, results):
+                if not waiting.done():
+                    waiting.set_result(result)
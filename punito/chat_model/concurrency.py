@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+# responses and errors that mean the backend has more requests than it can serve
+OVERLOAD_STATUS_CODES = (429, 503, 504)
+
+
+def is_overload(error: BaseException) -> bool:
+    """Return whether a failed request indicates an overloaded backend."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in OVERLOAD_STATUS_CODES
+    return isinstance(error, httpx.TimeoutException)
+
+
+class LimiterMetrics(NamedTuple):
+    """
+    Snapshot of an `AdaptiveLimiter`.
+
+    Attributes
+    ----------
+    limit : int
+        Current maximum number of requests in flight.
+    in_flight : int
+        Requests currently being sent.
+    queued : int
+        Requests waiting for a free slot.
+    overloads : int
+        Requests that failed because the backend was overloaded, since the limiter was created.
+    latency : float or None
+        Recent average request latency in seconds, None before the first request completed.
+    """
+    limit: int
+    in_flight: int
+    queued: int
+    overloads: int
+    latency: Optional[float]
+
+
+class AdaptiveLimiter:
+    """
+    Limits the requests in flight to what the backend can serve, adjusting the limit with AIMD.
+
+    Every request that completes while the limit is in use (requests are queued, or at least half
+    the limit is in flight) raises the limit by `1 / limit`, i.e. by about one per round of `limit`
+    requests (additive increase). The limit is cut by
+    `backoff_ratio` (multiplicative decrease), at most once per round, when a request fails
+    because the backend is overloaded (429, 503, 504 or a timeout).
+
+    With a `latency_tolerance`, the limit is also cut when the recent latency exceeds that many
+    times the long-term latency. The latency of a completion grows with its output, so this only
+    suits requests of similar length; by default, latency is only reported in the metrics.
+
+    Slots are shared by threads (`slot`) and coroutines (`aslot`).
+
+    Parameters
+    ----------
+    initial_limit : int, optional
+        Limit before any feedback, by default 16.
+    min_limit : int, optional
+        Lowest limit, by default 1.
+    max_limit : int, optional
+        Highest limit, by default 128.
+    backoff_ratio : float, optional
+        Factor applied to the limit on overload, by default 0.7.
+    latency_tolerance : float or None, optional
+        Ratio of recent to long-term latency that counts as overload, by default None (latency
+        does not lower the limit).
+    """
+
+    def __init__(self, initial_limit: int = 16, min_limit: int = 1, max_limit: int = 128,
+                 backoff_ratio: float = 0.7, latency_tolerance: Optional[float] = None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._in_flight = 0
+        self._queued = 0
+        self._overloads = 0
+        # requests to complete before the next decrease, so one overload burst cuts the limit once
+        self._cooldown = 0
+        self._short_latency: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        self._samples = 0
+
+    @property
+    def limit(self) -> int:
+        """Current maximum number of requests in flight."""
+        return int(self._limit)
+
+    def metrics(self) -> LimiterMetrics:
+        """Return a snapshot of the limiter."""
+        with self._lock:
+            return LimiterMetrics(int(self._limit), self._in_flight, self._queued, self._overloads,
+                                  self._short_latency)
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        with self._lock:
+            self._queued += 1
+            try:
+                while not self._try_acquire():
+                    self._available.wait()
+            finally:
+                self._queued -= 1
+
+    async def aacquire(self) -> None:
+        """Wait until a request may be sent, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+                self._queued += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    # the wake-up may have been meant for this waiter, pass it on
+                    self._wake()
+                raise
+            finally:
+                with self._lock:
+                    self._queued -= 1
+
+    def _wake(self) -> None:
+        free = int(self._limit) - self._in_flight
+        if free <= 0:
+            return
+        self._available.notify(free)
+        while free > 0 and self._async_waiters:
+            loop, future = self._async_waiters.pop(0)
+            if not future.done():
+                loop.call_soon_threadsafe(_resolve, future)
+                free -= 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Frees the slot of a finished request and adjusts the limit.
+
+        Parameters
+        ----------
+        latency : float or None, optional
+            Duration of a successful request in seconds; None if it failed.
+        overloaded : bool, optional
+            Whether the request failed because the backend was overloaded.
+        """
+        with self._lock:
+            # the limit is only raised while it is what holds requests back
+            saturated = self._queued > 0 or 2 * self._in_flight >= self._limit
+            self._in_flight -= 1
+            self._cooldown = max(0, self._cooldown - 1)
+
+            if overloaded:
+                self._overloads += 1
+                self._decrease("overload")
+            elif latency is not None:
+                self._record_latency(latency)
+                if (self.latency_tolerance is not None and self._samples > self._limit
+                        and self._short_latency > self.latency_tolerance * self._long_latency):
+                    self._decrease(f"latency {self._short_latency:.1f} s, usually {self._long_latency:.1f} s")
+                elif saturated:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+            self._wake()
+
+    def _record_latency(self, latency: float) -> None:
+        self._samples += 1
+        if self._short_latency is None:
+            self._short_latency = self._long_latency = latency
+            return
+        self._short_latency += 0.2 * (latency - self._short_latency)
+        # the baseline follows the latency slowly in both directions, so the spread of short and long
+        # completions averages out while queueing on the backend shows up as a gap
+        self._long_latency += 0.02 * (latency - self._long_latency)
+
+    def _decrease(self, reason: str) -> None:
+        if self._cooldown > 0:
+            return
+        previous = int(self._limit)
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        self._cooldown = int(self._limit)
+        if int(self._limit) != previous:
+            logger.info(f"Concurrency limit lowered from {previous} to {int(self._limit)} ({reason})")
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold a slot while sending a request, feeding its latency and outcome back into the limit."""
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.release(overloaded=is_overload(e))
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """Async variant of `slot`."""
+        await self.aacquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.release(overloaded=is_overload(e))
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release(time.perf_counter() - start)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
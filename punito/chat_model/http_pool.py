@@ -0,0 +1,190 @@
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, NamedTuple, Optional
+
+import httpx
+from loguru import logger
+
+
+class PoolMetrics(NamedTuple):
+    """
+    Snapshot of the connection pool of a `PooledClient`.
+
+    Attributes
+    ----------
+    open_connections : int
+        Connections currently held by the pool.
+    idle_connections : int
+        Open connections not serving a request (kept alive for reuse).
+    in_flight : int
+        Requests currently being sent or streamed.
+    requests : int
+        Requests sent since the client was created.
+    waits : int
+        Requests that had to wait for a free connection, because all `max_connections` were busy.
+    """
+    open_connections: int
+    idle_connections: int
+    in_flight: int
+    requests: int
+    waits: int
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class PooledClient:
+    """
+    Thread-safe HTTP client with a keep-alive connection pool, shared by all requests of a chat model.
+
+    Connections are reused across requests and threads, so the TCP and TLS handshakes are paid
+    once per connection instead of once per request. Async requests (`apost`, `astream`) use a
+    separate `httpx.AsyncClient` with the same limits, created on first use and bound to the
+    event loop it is first used in.
+
+    Parameters
+    ----------
+    max_connections : int, optional
+        Maximum number of concurrent connections, by default 50.
+    max_keepalive_connections : int, optional
+        Maximum number of idle connections kept alive for reuse, by default 50.
+    keepalive_expiry : float, optional
+        Seconds an idle connection is kept alive, by default 30.
+    http2 : bool, optional
+        Whether to use HTTP/2 if the server supports it. Requires the `h2` package (`httpx[http2]`);
+        without it HTTP/1.1 is used.
+    timeout : float or None, optional
+        Request timeout in seconds.
+    transport : httpx.BaseTransport, optional
+        Transport to use instead of the pooled HTTP transport (e.g. `httpx.MockTransport` in tests).
+    async_transport : httpx.AsyncBaseTransport, optional
+        Transport to use instead of the pooled async HTTP transport.
+    """
+
+    def __init__(self, max_connections: int = 50, max_keepalive_connections: int = 50,
+                 keepalive_expiry: float = 30.0, http2: bool = False, timeout: Optional[float] = None,
+                 transport: Optional[httpx.BaseTransport] = None,
+                 async_transport: Optional[httpx.AsyncBaseTransport] = None):
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 requested, but the 'h2' package is not installed. Falling back to HTTP/1.1")
+            http2 = False
+
+        self.max_connections = max_connections
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                              keepalive_expiry=keepalive_expiry)
+        self._transport = transport or httpx.HTTPTransport(limits=limits, http2=http2)
+        self.client = httpx.Client(transport=self._transport, timeout=timeout)
+        self._async_transport = async_transport or httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._requests = 0
+        self._waits = 0
+
+    @contextmanager
+    def _track(self) -> Iterator[None]:
+        with self._lock:
+            self._requests += 1
+            if self._in_flight >= self.max_connections:
+                self._waits += 1
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a POST request over a pooled connection. Keyword arguments are passed to `httpx.Client.post`."""
+        with self._track():
+            return self.client.post(url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs: Any) -> Iterator[httpx.Response]:
+        """Stream a response over a pooled connection, which is held until the context is left."""
+        with self._track(), self.client.stream(method, url, **kwargs) as response:
+            yield response
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The async client of the pool, created on first use."""
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(transport=self._async_transport, timeout=self._timeout)
+            return self._async_client
+
+    async def apost(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Async variant of `post`."""
+        with self._track():
+            return await self.async_client.post(url, **kwargs)
+
+    @asynccontextmanager
+    async def astream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Async variant of `stream`."""
+        with self._track():
+            async with self.async_client.stream(method, url, **kwargs) as response:
+                yield response
+
+    def warm_up(self, url: str, connections: int = 1) -> int:
+        """
+        Opens connections to a server in advance, so the first requests do not pay for the handshakes.
+
+        Sends `connections` concurrent HEAD requests. Any HTTP response counts as success, because
+        only the connection matters; connection errors are logged and ignored.
+
+        Parameters
+        ----------
+        url : str
+            URL of the server.
+        connections : int, optional
+            Number of connections to open, by default 1.
+
+        Returns
+        -------
+        int
+            Number of warm-up requests that reached the server.
+        """
+        def open_connection(_) -> bool:
+            try:
+                self.client.head(url)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"Connection warm-up to {url} failed: {e.__class__.__name__}: {e}")
+                return False
+
+        connections = max(0, min(connections, self.max_connections))
+        with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+            opened = sum(executor.map(open_connection, range(connections)))
+        logger.info(f"Connection warm-up to {url}: {opened} of {connections} requests succeeded, "
+                    f"{self.metrics().open_connections} connections open")
+        return opened
+
+    def metrics(self) -> PoolMetrics:
+        """Return a snapshot of the pool usage."""
+        # the HTTP transports do not expose their pools publicly; other transports report no connections
+        connections = [connection for transport in (self._transport, self._async_transport)
+                       for connection in getattr(getattr(transport, "_pool", None), "connections", [])]
+        with self._lock:
+            return PoolMetrics(
+                open_connections=len(connections),
+                idle_connections=sum(1 for connection in connections if connection.is_idle()),
+                in_flight=self._in_flight,
+                requests=self._requests,
+                waits=self._waits,
+            )
+
+    def close(self) -> None:
+        """Close all pooled connections of the sync client."""
+        self.client.close()
+
+    async def aclose(self) -> None:
+        """Close all pooled connections, including those of the async client."""
+        self.client.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -1,22 +1,92 @@
-from typing import Any, Dict, List, Optional, Iterator
+from typing import Any, AsyncIterator, Dict, List, Optional, Iterator, Tuple
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
 from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
-from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain_core.runnables import RunnableConfig
-import httpx, json
+from pydantic import Field, PrivateAttr, field_validator
+import re, threading, time
+from pathlib import Path
+import contextlib
+import asyncio
+import httpx
 from loguru import logger
+from punito.processing.packing import estimate_tokens
 from punito.utils import get_default_settings
+from .batching import BATCH_UNSUPPORTED_STATUS_CODES, BatchMetrics, BatchNotSupported, MicroBatcher
+from .concurrency import AdaptiveLimiter, LimiterMetrics
+from .http_pool import PoolMetrics, PooledClient
+from .rate_limit import RateLimiter, RateLimiterMetrics
+from .resilience import (CircuitBreaker, RetryPolicy, acall_with_retry, call_with_retry, record_shared_failure,
+                         retry_delay)
+from .routing import EndpointMetrics, EndpointRouter
+from .response_cache import CACHE_MODES, ResponseCache, ResponseCacheMiss, get_default_response_cache
+from .single_flight import SingleFlight, SingleFlightMetrics
+from .sse import SSEDecoder
+
+# roles of the OpenAI-compatible chat API by LangChain message type
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+# seconds a health probe of a replica may take before the replica counts as unhealthy
+HEALTH_PROBE_TIMEOUT = 5.0
+
+# generation parameters forwarded in the payload when given as keyword arguments
+GENERATION_PARAMS = ("max_tokens", "temperature", "top_p")
+
+# a fenced code block tagged as Java, closed by a fence at the start of a line; untagged blocks (examples,
+# plans) may come before the test class
+_CODE_BLOCK = re.compile(r"```java[ \t]*\n.*?\n[ \t]*```", re.DOTALL)
 
 
 class LlamaChatModel(BaseChatModel):
     """
     Custom implementation of a LangChain-compatible chat model for LLaMA-based APIs.
 
-    This class enables synchronous and streaming chat completions by sending HTTP
+    This class enables synchronous, asynchronous and streaming chat completions by sending HTTP
     requests to a specified LLaMA-compatible endpoint. It supports LangChain's
     `Runnable` protocol, making it composable in agent chains and pipelines.
 
+    All requests of an instance share one thread-safe, connection-pooled HTTP client, so
+    connections (and their TCP and TLS handshakes) are reused across requests and threads.
+    The async methods (`ainvoke`, `astream`) do not block a thread per request, so many requests
+    can be in flight from a single event loop.
+
+    Completions can be cached on disk, keyed by the model name, the messages and the generation
+    parameters. With `cache_mode`:
+
+    - "off": the cache is not used.
+    - "read": cached completions are returned, new ones are not stored.
+    - "write": every request goes to the server, its completion is stored.
+    - "readwrite": cached completions are returned, new ones are stored.
+    - "replay-only": cached completions are returned, a miss raises `ResponseCacheMiss`
+      without contacting the server.
+
+    Rate limiting, temporary server errors and connection failures are retried according to
+    `retry_policy`. All requests of the model share `circuit_breaker`, which pauses them while
+    the server keeps failing, and `concurrency_limiter`, which adapts the number of requests in
+    flight to the latency and overload errors of the server. `rate_limiter` keeps the requests
+    within request and token quotas per minute, shared with other processes on the host.
+
+    Identical completions requested while one is in flight are coalesced by `single_flight`:
+    later callers wait for the result of the request in flight instead of sending their own.
+    Streams are not coalesced, every caller gets its own chunks.
+
+    Stop sequences (`stop`) and the generation parameters in `GENERATION_PARAMS` passed to
+    `invoke`, `stream` and their async variants are forwarded in the payload. A stream requested
+    with `stop_after_code_block=True` ends, and closes its connection, as soon as the first fenced
+    code block tagged as Java is complete, so the tokens the model would write after it are not waited for.
+
+    With a `micro_batcher`, concurrent completions are collected into batches posted together to
+    `batch_endpoint` as `{"requests": [payload, ...]}`, answered by `{"responses": [completion, ...]}`
+    in the same order. If the server does not provide the endpoint, the model falls back to
+    sending the completions one by one, in parallel as before. A failed batch counts as a single
+    failure in `circuit_breaker`, however many requests it carried.
+
+    With a `router`, requests are spread over several replicas of the server instead of going to
+    `base_url`: to the replica with the fewest requests in flight, or, with an affinity router, to
+    the replica owning the `affinity_key` passed to `invoke` or `stream`, so related prompts hit the
+    same prefix cache. Failing replicas are ejected and re-admitted by the router.
+
     Parameters
     ----------
     model_name : str
@@ -27,12 +97,83 @@ class LlamaChatModel(BaseChatModel):
         Endpoint path appended to `base_url`, by default "/completions".
     timeout : float or None, optional
         Request timeout in seconds.
+    max_connections : int, optional
+        Maximum number of concurrent connections, by default 50.
+    max_keepalive_connections : int, optional
+        Maximum number of idle connections kept alive for reuse, by default 50.
+    keepalive_expiry : float, optional
+        Seconds an idle connection is kept alive, by default 30.
+    http2 : bool, optional
+        Whether to use HTTP/2 (requires the `h2` package), by default False.
+    cache_mode : str, optional
+        One of `CACHE_MODES`, by default "off".
+    response_cache : ResponseCache, optional
+        The cache of completions, by default `get_default_response_cache()`.
+    retry_policy : RetryPolicy, optional
+        When and how long to wait before repeating a failed request.
+    circuit_breaker : CircuitBreaker or None, optional
+        Circuit breaker shared by all requests, None disables it.
+    concurrency_limiter : AdaptiveLimiter or None, optional
+        Limit of the requests in flight, by default None (only limited by the callers).
+    rate_limiter : RateLimiter or None, optional
+        Budget of requests and tokens per minute, by default None (no quotas).
+    expected_completion_tokens : int, optional
+        Completion tokens budgeted for a request without `max_tokens`, by default 1024.
+    single_flight : SingleFlight or None, optional
+        Coalesces identical completions in flight, None disables it.
+    micro_batcher : MicroBatcher or None, optional
+        Collects concurrent completions into batch requests, by default None (no batching).
+    stream_flush_interval : float, optional
+        Seconds the deltas of a stream are coalesced into one chunk, by default 0 (one chunk per delta).
+    batch_endpoint : str, optional
+        Endpoint path of batch requests appended to `base_url`, by default "/batch/completions".
+    router : EndpointRouter or None, optional
+        Routes requests to several replicas, by default None (every request goes to `base_url`).
+    health_endpoint : str, optional
+        Endpoint path of the health probes of the router's replicas, by default "/health".
+    warm_up_connections : int, optional
+        Connections opened to every replica before the first request is sent, by default 0 (none).
+    health_interval : float, optional
+        Seconds between the health probes of the router's replicas, started with the first request
+        sent, by default 0 (no probes).
     """
 
     model_name: str
     base_url: str
     endpoint: str = "/completions"
     timeout: Optional[float] = None
+    max_connections: int = 50
+    max_keepalive_connections: int = 50
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    cache_mode: str = "off"
+    response_cache: Optional[ResponseCache] = None
+    retry_policy: RetryPolicy = RetryPolicy()
+    circuit_breaker: Optional[CircuitBreaker] = Field(default_factory=CircuitBreaker)
+    concurrency_limiter: Optional[AdaptiveLimiter] = None
+    rate_limiter: Optional[RateLimiter] = None
+    expected_completion_tokens: int = 1024
+    single_flight: Optional[SingleFlight] = Field(default_factory=SingleFlight)
+    micro_batcher: Optional[MicroBatcher] = None
+    batch_endpoint: str = "/batch/completions"
+    stream_flush_interval: float = 0.0
+    router: Optional[EndpointRouter] = None
+    health_endpoint: str = "/health"
+    warm_up_connections: int = 0
+    health_interval: float = 0.0
+
+    _http: Optional[PooledClient] = PrivateAttr(default=None)
+    _http_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _started: bool = PrivateAttr(default=False)
+    _start_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _batch_supported: bool = PrivateAttr(default=True)
+
+    @field_validator("cache_mode")
+    @classmethod
+    def _check_cache_mode(cls, cache_mode: str) -> str:
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode: {cache_mode}. Expected one of {', '.join(CACHE_MODES)}")
+        return cache_mode
 
     @property
     def _llm_type(self) -> str:
@@ -42,6 +183,228 @@ class LlamaChatModel(BaseChatModel):
     def _identifying_params(self) -> Dict[str, Any]:
         return {"model_name": self.model_name}
 
+    @property
+    def http_client(self) -> PooledClient:
+        """The pooled HTTP client of this model, created on first use."""
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    self._http = PooledClient(self.max_connections, self.max_keepalive_connections,
+                                              self.keepalive_expiry, self.http2, self.timeout)
+        return self._http
+
+    def warm_up(self, connections: int = 1) -> int:
+        """
+        Opens connections to the inference server before the first request.
+
+        Parameters
+        ----------
+        connections : int, optional
+            Number of connections to open, by default 1.
+
+        Returns
+        -------
+        int
+            Number of warm-up requests that reached the server, summed over the replicas of a router.
+        """
+        return sum(self.http_client.warm_up(url, connections) for url in self._base_urls())
+
+    def _base_urls(self) -> List[str]:
+        return self.router.urls if self.router is not None else [self.base_url]
+
+    def _start(self) -> None:
+        """
+        Warms up the connections and starts the health probes, once, before the first request is sent.
+
+        Models that never send a request (e.g. replaying from the cache or only rendering prompts)
+        open no connections and start no threads.
+        """
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            if self.warm_up_connections > 0:
+                self.warm_up(self.warm_up_connections)
+            if self.health_interval > 0:
+                self.start_health_probes(self.health_interval)
+
+    def _route(self, affinity_key: Optional[str] = None) -> contextlib.AbstractContextManager:
+        """Context of a request, yielding the base URL it is sent to."""
+        if not self._started:
+            self._start()
+        return self.router.route(affinity_key) if self.router is not None else contextlib.nullcontext(self.base_url)
+
+    @contextlib.asynccontextmanager
+    async def _aroute(self, affinity_key: Optional[str] = None) -> AsyncIterator[str]:
+        if not self._started:
+            # the warm-up requests are blocking
+            await asyncio.to_thread(self._start)
+        if self.router is None:
+            yield self.base_url
+            return
+        async with self.router.aroute(affinity_key) as base_url:
+            yield base_url
+
+    def _probe_endpoint(self, url: str) -> bool:
+        # any answer but a server error means the replica is up; connection errors are raised
+        return self.http_client.client.get(url + self.health_endpoint, timeout=HEALTH_PROBE_TIMEOUT).status_code < 500
+
+    def start_health_probes(self, interval: float) -> None:
+        """
+        Probes the health of the router's replicas every `interval` seconds, until the model is closed.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between two rounds of probes.
+        """
+        if self.router is not None:
+            self.router.start_probes(self._probe_endpoint, interval)
+
+    def pool_metrics(self) -> PoolMetrics:
+        """Return a snapshot of the connection pool usage."""
+        return self.http_client.metrics()
+
+    def concurrency_metrics(self) -> Optional[LimiterMetrics]:
+        """Return a snapshot of the concurrency limiter, or None if requests are not limited."""
+        return self.concurrency_limiter.metrics() if self.concurrency_limiter is not None else None
+
+    def rate_limit_metrics(self) -> Optional[RateLimiterMetrics]:
+        """Return a snapshot of the rate limiter, or None if there are no quotas."""
+        return self.rate_limiter.metrics() if self.rate_limiter is not None else None
+
+    def single_flight_metrics(self) -> Optional[SingleFlightMetrics]:
+        """Return a snapshot of the coalesced completions, None if they are not coalesced."""
+        return self.single_flight.metrics() if self.single_flight is not None else None
+
+    def batch_metrics(self) -> Optional[BatchMetrics]:
+        """Return a snapshot of the batched completions, None if completions are not batched."""
+        return self.micro_batcher.metrics() if self.micro_batcher is not None else None
+
+    def routing_metrics(self) -> Optional[List[EndpointMetrics]]:
+        """Return a snapshot of every replica, None if requests are not routed."""
+        return self.router.metrics() if self.router is not None else None
+
+    def _estimate_tokens(self, payload: Dict[str, Any]) -> int:
+        return _prompt_tokens(payload) + int(payload.get("max_tokens") or self.expected_completion_tokens)
+
+    def _acquire_budget(self, payload: Dict[str, Any]) -> int:
+        """Wait for the rate limit to admit a request and return its estimated tokens."""
+        if self.rate_limiter is None:
+            return 0
+        tokens = self._estimate_tokens(payload)
+        self.rate_limiter.acquire(tokens)
+        return tokens
+
+    async def _aacquire_budget(self, payload: Dict[str, Any]) -> int:
+        if self.rate_limiter is None:
+            return 0
+        tokens = self._estimate_tokens(payload)
+        await self.rate_limiter.aacquire(tokens)
+        return tokens
+
+    def _settle_budget(self, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        if self.rate_limiter is not None and used_tokens is not None:
+            self.rate_limiter.adjust(used_tokens - estimated_tokens)
+
+    async def _asettle_budget(self, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        if self.rate_limiter is not None and used_tokens is not None:
+            await self.rate_limiter.aadjust(used_tokens - estimated_tokens)
+
+    def _request_slot(self) -> contextlib.AbstractContextManager:
+        return self.concurrency_limiter.slot() if self.concurrency_limiter is not None else contextlib.nullcontext()
+
+    def _arequest_slot(self) -> contextlib.AbstractAsyncContextManager:
+        return self.concurrency_limiter.aslot() if self.concurrency_limiter is not None else contextlib.nullcontext()
+
+    def close(self) -> None:
+        """Close all pooled connections and stop the health probes."""
+        self._started = False
+        if self.router is not None:
+            self.router.stop_probes()
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    async def aclose(self) -> None:
+        """Close all pooled connections, including those opened by async requests, and stop the health probes."""
+        self._started = False
+        if self.router is not None:
+            self.router.stop_probes()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _payload(self, messages: List[BaseMessage], stream: bool, stop: Optional[List[str]] = None,
+                 **kwargs: Any) -> Dict[str, Any]:
+        payload = {
+            "model": self.model_name,
+            "messages": _convert_messages(messages),
+            "stream": stream
+        }
+        if stop:
+            payload["stop"] = list(stop)
+        payload.update({name: kwargs[name] for name in GENERATION_PARAMS if kwargs.get(name) is not None})
+        return payload
+
+    def _get_cache(self) -> ResponseCache:
+        if self.response_cache is None:
+            self.response_cache = get_default_response_cache()
+        return self.response_cache
+
+    def _cached_content(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Return the cached completion of a request, if the cache mode allows reading it.
+
+        Raises
+        ------
+        ResponseCacheMiss
+            In "replay-only" mode, if the request has no cached completion.
+        """
+        if self.cache_mode in ("read", "readwrite", "replay-only"):
+            content = self._get_cache().get(payload)
+            if content is not None:
+                logger.debug(f"Response cache hit: {ResponseCache.key(payload)[:12]}")
+                return content
+
+        if self.cache_mode == "replay-only":
+            raise ResponseCacheMiss(f"No cached response for request {ResponseCache.key(payload)[:12]} "
+                                    f"in replay-only mode")
+        return None
+
+    def _cache_content(self, payload: Dict[str, Any], content: str) -> None:
+        if self.cache_mode in ("write", "readwrite"):
+            self._get_cache().put(payload, content)
+
+    def _check_stream_response(self, response: httpx.Response) -> None:
+        response.raise_for_status()
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+
+    def _iter_deltas(self, response: httpx.Response) -> Iterator[str]:
+        decoder = SSEDecoder(self.stream_flush_interval)
+        for data in response.iter_bytes():
+            yield from decoder.feed(data)
+            if decoder.done:
+                break
+        yield from decoder.close()
+
+    async def _aiter_deltas(self, response: httpx.Response) -> AsyncIterator[str]:
+        decoder = SSEDecoder(self.stream_flush_interval)
+        async for data in response.aiter_bytes():
+            for content in decoder.feed(data):
+                yield content
+            if decoder.done:
+                break
+        for content in decoder.close():
+            yield content
+
+    def _stream_retry_delay(self, error: Exception, attempt: int, parts: List[str]) -> Optional[float]:
+        # chunks that were already yielded cannot be taken back, so only streams failing before the first chunk are retried
+        if parts:
+            return None
+        return retry_delay(self.retry_policy, self.circuit_breaker, error, attempt)
+
     def _generate(
             self,
             messages: List[BaseMessage],
@@ -53,30 +416,139 @@ class LlamaChatModel(BaseChatModel):
         Perform chat completion via HTTP POST request.
         """
 
-        payload = {
-            "model": self.model_name,
-            "messages": _convert_messages(messages),
-            "stream": False
-        }
-
-        url = self.base_url + self.endpoint
+        payload = self._payload(messages, stream=False, stop=stop, **kwargs)
+        affinity_key = kwargs.get("affinity_key")
+        content = self._cached_content(payload)
+        if content is None:
+            if self.single_flight is not None:
+                content = self.single_flight.do(ResponseCache.key(payload),
+                                                lambda: self._complete(payload, affinity_key))
+            else:
+                content = self._complete(payload, affinity_key)
+
+        return _to_chat_result(content)
+
+    def _complete(self, payload: Dict[str, Any], affinity_key: Optional[str] = None) -> str:
+        def send() -> str:
+            estimated_tokens = self._acquire_budget(payload)
+            try:
+                with self._request_slot():
+                    content, used_tokens = self._post_completion(payload, affinity_key)
+            except Exception:
+                # a failed attempt is charged its prompt only, the retry budgets the completion again
+                self._settle_budget(estimated_tokens, _prompt_tokens(payload))
+                raise
+            self._settle_budget(estimated_tokens, used_tokens)
+            return content
+
+        content = call_with_retry(send, self.retry_policy, self.circuit_breaker)
+        self._cache_content(payload, content)
+        return content
+
+    async def _agenerate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> ChatResult:
+        """
+        Perform chat completion via async HTTP POST request.
+        """
 
-        response = httpx.post(url, json=payload, timeout=self.timeout)
+        payload = self._payload(messages, stream=False, stop=stop, **kwargs)
+        affinity_key = kwargs.get("affinity_key")
+        content = self._cached_content(payload)
+        if content is None:
+            if self.single_flight is not None:
+                content = await self.single_flight.ado(ResponseCache.key(payload),
+                                                       lambda: self._acomplete(payload, affinity_key))
+            else:
+                content = await self._acomplete(payload, affinity_key)
+
+        return _to_chat_result(content)
+
+    async def _acomplete(self, payload: Dict[str, Any], affinity_key: Optional[str] = None) -> str:
+        async def send() -> str:
+            estimated_tokens = await self._aacquire_budget(payload)
+            try:
+                async with self._arequest_slot():
+                    content, used_tokens = await self._apost_completion(payload, affinity_key)
+            except Exception:
+                await self._asettle_budget(estimated_tokens, _prompt_tokens(payload))
+                raise
+            await self._asettle_budget(estimated_tokens, used_tokens)
+            return content
+
+        content = await acall_with_retry(send, self.retry_policy, self.circuit_breaker)
+        self._cache_content(payload, content)
+        return content
+
+    def _post_completion(self, payload: Dict[str, Any],
+                         affinity_key: Optional[str] = None) -> Tuple[str, Optional[int]]:
+        # batches mix the requests of several keys, so they go to the least loaded replica
+        if self.micro_batcher is not None and self._batch_supported:
+            try:
+                return self.micro_batcher.submit(payload, self._send_batch)
+            except BatchNotSupported:
+                pass
+        with self._route(affinity_key) as base_url:
+            return _parse_completion(self.http_client.post(base_url + self.endpoint, json=payload))
+
+    async def _apost_completion(self, payload: Dict[str, Any],
+                                affinity_key: Optional[str] = None) -> Tuple[str, Optional[int]]:
+        if self.micro_batcher is not None and self._batch_supported:
+            try:
+                return await self.micro_batcher.asubmit(payload, self._asend_batch)
+            except BatchNotSupported:
+                pass
+        async with self._aroute(affinity_key) as base_url:
+            return _parse_completion(await self.http_client.apost(base_url + self.endpoint, json=payload))
+
+    def _send_batch(self, payloads: List[Dict[str, Any]]) -> List[Tuple[str, Optional[int]]]:
+        try:
+            with self._route() as base_url:
+                response = self.http_client.post(base_url + self.batch_endpoint, json={"requests": payloads})
+                return self._parse_batch(response, len(payloads))
+        except BatchNotSupported:
+            raise
+        except Exception as e:
+            # one failed batch is one failure of the backend, not one per request in it
+            record_shared_failure(self.retry_policy, self.circuit_breaker, e)
+            raise
+
+    async def _asend_batch(self, payloads: List[Dict[str, Any]]) -> List[Tuple[str, Optional[int]]]:
+        try:
+            async with self._aroute() as base_url:
+                response = await self.http_client.apost(base_url + self.batch_endpoint,
+                                                        json={"requests": payloads})
+                return self._parse_batch(response, len(payloads))
+        except BatchNotSupported:
+            raise
+        except Exception as e:
+            record_shared_failure(self.retry_policy, self.circuit_breaker, e)
+            raise
+
+    def _parse_batch(self, response: httpx.Response, size: int) -> List[Tuple[str, Optional[int]]]:
+        if response.status_code in BATCH_UNSUPPORTED_STATUS_CODES:
+            if self._batch_supported:
+                logger.warning(f"Batch endpoint {self.batch_endpoint} not supported ({response.status_code}), "
+                               f"sending completions one by one")
+            self._batch_supported = False
+            raise BatchNotSupported(self.batch_endpoint)
         response.raise_for_status()
 
-        data = response.json()
-        content = data["choices"][0]["message"]["content"]
-
-        message = AIMessage(content=content)
-        generation = ChatGeneration(message=message)
-
-        return ChatResult(generations=[generation])
+        completions = response.json()["responses"]
+        if len(completions) != size:
+            raise ValueError(f"Batch of {size} requests answered with {len(completions)} responses")
+        return [_completion_content(completion) for completion in completions]
 
     def _stream(
             self,
             messages: List[BaseMessage],
             stop: Optional[List[str]] = None,
             run_manager: Optional[CallbackManagerForLLMRun] = None,
+            stop_after_code_block: bool = False,
             **kwargs: Any,
     ) -> Iterator[ChatGenerationChunk]:
         """
@@ -87,43 +559,144 @@ class LlamaChatModel(BaseChatModel):
         messages : list of BaseMessage
             Input messages for context.
         stop : list of str, optional
-            Stop sequences (unused).
+            Stop sequences.
         run_manager : CallbackManagerForLLMRun, optional
             LangChain run manager to receive token callbacks.
+        stop_after_code_block : bool, optional
+            Whether to end the stream after the first complete fenced Java code block, by default False.
         **kwargs : Any
-            Additional generation parameters.
+            Additional generation parameters, see `GENERATION_PARAMS`, and the `affinity_key` of the `router`.
 
         Yields
         ------
         ChatGenerationChunk
             Partial chunks of the generated message.
         """
-        payload = {
-            "model": self.model_name,
-            "messages": _convert_messages(messages),
-            "stream": True
-        }
-
-        url = self.base_url + self.endpoint
-
-        with httpx.stream("POST", url, json=payload, timeout=self.timeout) as response:
-            for line in response.iter_lines():
-                if not line or line == "data: [DONE]":
-                    continue
-                try:
-                    data = json.loads(line.replace("data: ", ""))
-                    content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                    if content:
-                        chunk = ChatGenerationChunk(
-                            message=AIMessageChunk(content=content)
-                        )
-                        if run_manager:
-                            run_manager.on_llm_new_token(content, chunk=chunk)
-                        yield chunk
-                except json.JSONDecodeError as e:
-                    logger.warning(f"JSON decode error in stream chunk: {line}")
-                except (KeyError, TypeError) as e:
-                    logger.warning(f"Malformed stream chunk: {line} ({e.__class__.__name__})")
+        payload = self._payload(messages, stream=True, stop=stop, **kwargs)
+        # a stream stopped after the code block is not the complete completion of the payload
+        cache_payload = {**payload, "stop_after_code_block": True} if stop_after_code_block else payload
+        cached = self._cached_content(cache_payload)
+        if cached is not None:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=cached))
+            if run_manager:
+                run_manager.on_llm_new_token(cached, chunk=chunk)
+            yield chunk
+            return
+
+        affinity_key = kwargs.get("affinity_key")
+
+        attempt = 1
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request()
+            parts = []
+            estimated_tokens = None
+            try:
+                estimated_tokens = self._acquire_budget(payload)
+                with self._request_slot(), self._route(affinity_key) as base_url, \
+                        self.http_client.stream("POST", base_url + self.endpoint, json=payload) as response:
+                    self._check_stream_response(response)
+                    for content in self._iter_deltas(response):
+                        if content:
+                            complete = False
+                            if stop_after_code_block:
+                                content, complete = _cut_after_code_block(parts, content)
+                            parts.append(content)
+                            chunk = ChatGenerationChunk(
+                                message=AIMessageChunk(content=content)
+                            )
+                            if run_manager:
+                                run_manager.on_llm_new_token(content, chunk=chunk)
+                            yield chunk
+                            if complete:
+                                # leaving the block closes the response and its connection
+                                logger.debug("Code block complete, stream stopped")
+                                break
+                break
+            except Exception as e:
+                if estimated_tokens is not None:
+                    self._settle_budget(estimated_tokens, _attempt_tokens(payload, parts))
+                delay = self._stream_retry_delay(e, attempt, parts)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+            except BaseException:
+                # e.g. the stream is closed early; a probe without an outcome lets another request probe
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release()
+                raise
+        content = "".join(parts)
+        self._settle_budget(estimated_tokens, _attempt_tokens(payload, parts))
+        # only completely consumed streams are cached
+        self._cache_content(cache_payload, content)
+
+    async def _astream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            stop_after_code_block: bool = False,
+            **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """
+        Async variant of `_stream`.
+        """
+        payload = self._payload(messages, stream=True, stop=stop, **kwargs)
+        # a stream stopped after the code block is not the complete completion of the payload
+        cache_payload = {**payload, "stop_after_code_block": True} if stop_after_code_block else payload
+        cached = self._cached_content(cache_payload)
+        if cached is not None:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=cached))
+            if run_manager:
+                await run_manager.on_llm_new_token(cached, chunk=chunk)
+            yield chunk
+            return
+
+        affinity_key = kwargs.get("affinity_key")
+
+        attempt = 1
+        while True:
+            if self.circuit_breaker is not None:
+                await self.circuit_breaker.abefore_request()
+            parts = []
+            estimated_tokens = None
+            try:
+                estimated_tokens = await self._aacquire_budget(payload)
+                async with self._arequest_slot(), self._aroute(affinity_key) as base_url, \
+                        self.http_client.astream("POST", base_url + self.endpoint, json=payload) as response:
+                    self._check_stream_response(response)
+                    async for content in self._aiter_deltas(response):
+                        if content:
+                            complete = False
+                            if stop_after_code_block:
+                                content, complete = _cut_after_code_block(parts, content)
+                            parts.append(content)
+                            chunk = ChatGenerationChunk(
+                                message=AIMessageChunk(content=content)
+                            )
+                            if run_manager:
+                                await run_manager.on_llm_new_token(content, chunk=chunk)
+                            yield chunk
+                            if complete:
+                                logger.debug("Code block complete, stream stopped")
+                                break
+                break
+            except Exception as e:
+                if estimated_tokens is not None:
+                    await self._asettle_budget(estimated_tokens, _attempt_tokens(payload, parts))
+                delay = self._stream_retry_delay(e, attempt, parts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+            except BaseException:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release()
+                raise
+        content = "".join(parts)
+        await self._asettle_budget(estimated_tokens, _attempt_tokens(payload, parts))
+        self._cache_content(cache_payload, content)
 
     def invoke(
             self,
@@ -178,23 +751,103 @@ class LlamaChatModel(BaseChatModel):
         for chunk in self._stream(messages, **kwargs):
             yield chunk.message
 
+    async def ainvoke(
+            self,
+            messages: List[BaseMessage],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> BaseMessage:
+        """
+        Async variant of `invoke`.
+        """
+
+        return (await self._agenerate(messages, **kwargs)).generations[0].message
+
+    async def astream(
+            self,
+            messages: List[BaseMessage],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[BaseMessage]:
+        """
+        Async variant of `stream`.
+        """
+
+        async for chunk in self._astream(messages, **kwargs):
+            yield chunk.message
+
 
 def _convert_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
     """
     Convert LangChain message objects to dict format required by the LLaMA API.
     """
 
-    return [{"role": m.type, "content": m.content} for m in messages]
+    return [{"role": _ROLES.get(m.type, m.type), "content": m.content} for m in messages]
+
+
+def _prompt_tokens(payload: Dict[str, Any]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in payload["messages"])
+
+
+def _attempt_tokens(payload: Dict[str, Any], parts: List[str]) -> int:
+    # streams report no usage, the completion received so far is estimated like the prompt
+    return _prompt_tokens(payload) + estimate_tokens("".join(parts))
+
+
+def _parse_completion(response: httpx.Response) -> Tuple[str, Optional[int]]:
+    """
+    Return the completion of a response and the total tokens it reports, if any.
+    """
+    response.raise_for_status()
+    return _completion_content(response.json())
+
+
+def _completion_content(data: Dict[str, Any]) -> Tuple[str, Optional[int]]:
+    return data["choices"][0]["message"]["content"], (data.get("usage") or {}).get("total_tokens")
+
+
+def _cut_after_code_block(parts: List[str], content: str) -> Tuple[str, bool]:
+    """Cuts the next chunk of a stream after the closing fence of its first Java code block, if it completes one."""
+    if "`" not in content:
+        return content, False
+    received = "".join(parts)
+    match = _CODE_BLOCK.search(received + content)
+    if match is None:
+        return content, False
+    return content[:match.end() - len(received)], True
 
 
-def create_llama_model_from_config(timeout=None) -> LlamaChatModel:
+def _to_chat_result(content: str) -> ChatResult:
+    message = AIMessage(content=content)
+    generation = ChatGeneration(message=message)
+
+    return ChatResult(generations=[generation])
+
+
+def create_llama_model_from_config(timeout=None, cache_mode: Optional[str] = None) -> LlamaChatModel:
     """
     Create an instance of LlamaChatModel using default configuration.
 
+    The connection pool is configured by the `HTTP_*` settings. If `HTTP_WARM_UP_CONNECTIONS`
+    is positive, that many connections are opened before the first request. The response cache is configured
+    by the `LLM_CACHE_*` settings, retries by the `RETRY_*` settings and the circuit breaker by the
+    `CIRCUIT_*` settings. If `ADAPTIVE_CONCURRENCY` is enabled, the requests in flight are limited
+    by an `AdaptiveLimiter` configured by the `CONCURRENCY_*` settings. If `RATE_LIMIT_RPM` or
+    `RATE_LIMIT_TPM` is set, requests are budgeted by a `RateLimiter` shared by the processes using
+    the database `RATE_LIMIT_DB`, with one budget per `BASE_URL`. Identical completions in flight
+    are coalesced unless `LLM_SINGLE_FLIGHT` is disabled. If `LLM_BATCH_ENDPOINT` is set, concurrent
+    completions are sent in batches of up to `LLM_BATCH_MAX_SIZE` requests collected for up to
+    `LLM_BATCH_MAX_WAIT_MS` milliseconds. Streamed deltas are coalesced for `LLM_STREAM_FLUSH_MS`.
+    `BASE_URL` may be a list of replicas, routed by an `EndpointRouter` configured by the
+    `LLM_ROUTING_*` settings; with `LLM_HEALTH_INTERVAL`, their health is probed in the background
+    once the first request is sent. Creating the model sends no requests.
+
     Parameters
     ----------
     timeout : float or None, optional
         Request timeout in seconds.
+    cache_mode : str, optional
+        Response cache mode (see `CACHE_MODES`), by default the `LLM_CACHE_MODE` setting.
 
     Returns
     -------
@@ -203,9 +856,67 @@ def create_llama_model_from_config(timeout=None) -> LlamaChatModel:
     """
 
     settings = get_default_settings()
+    base_urls = _base_urls(settings)
     return LlamaChatModel(
         model_name=settings["MODEL"],
-        base_url=settings["BASE_URL"],
+        base_url=base_urls[0],
         endpoint=settings["ENDPOINT"],
         timeout=timeout,
+        max_connections=settings.get("HTTP_MAX_CONNECTIONS", 50),
+        max_keepalive_connections=settings.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 50),
+        keepalive_expiry=settings.get("HTTP_KEEPALIVE_EXPIRY", 30.0),
+        http2=settings.get("HTTP2", False),
+        cache_mode=cache_mode or settings.get("LLM_CACHE_MODE", "off"),
+        retry_policy=RetryPolicy(
+            max_attempts=int(settings.get("RETRY_MAX_ATTEMPTS", 5)),
+            base_delay=float(settings.get("RETRY_BASE_DELAY", 1.0)),
+            max_delay=float(settings.get("RETRY_MAX_DELAY", 30.0)),
+        ),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=int(settings.get("CIRCUIT_FAILURE_THRESHOLD", 5)),
+            reset_timeout=float(settings.get("CIRCUIT_RESET_TIMEOUT", 30.0)),
+        ),
+        concurrency_limiter=AdaptiveLimiter(
+            initial_limit=int(settings.get("CONCURRENCY_INITIAL_LIMIT", 16)),
+            min_limit=int(settings.get("CONCURRENCY_MIN_LIMIT", 1)),
+            max_limit=int(settings.get("CONCURRENCY_MAX_LIMIT", 128)),
+        ) if settings.get("ADAPTIVE_CONCURRENCY", False) else None,
+        rate_limiter=_create_rate_limiter(settings),
+        expected_completion_tokens=int(settings.get("RATE_LIMIT_COMPLETION_TOKENS", 1024)),
+        single_flight=SingleFlight() if settings.get("LLM_SINGLE_FLIGHT", True) else None,
+        micro_batcher=MicroBatcher(
+            max_batch_size=int(settings.get("LLM_BATCH_MAX_SIZE", 16)),
+            max_wait=float(settings.get("LLM_BATCH_MAX_WAIT_MS", 10)) / 1000,
+        ) if settings.get("LLM_BATCH_ENDPOINT") else None,
+        batch_endpoint=settings.get("LLM_BATCH_ENDPOINT") or "/batch/completions",
+        stream_flush_interval=float(settings.get("LLM_STREAM_FLUSH_MS", 0)) / 1000,
+        router=EndpointRouter(
+            base_urls,
+            affinity=settings.get("LLM_ROUTING_AFFINITY", False),
+            failure_threshold=int(settings.get("LLM_ROUTING_EJECTION_FAILURES", 3)),
+            ejection_time=float(settings.get("LLM_ROUTING_EJECTION_TIME", 30.0)),
+        ) if len(base_urls) > 1 else None,
+        health_endpoint=settings.get("LLM_HEALTH_ENDPOINT", "/health"),
+        warm_up_connections=int(settings.get("HTTP_WARM_UP_CONNECTIONS", 0)),
+        health_interval=float(settings.get("LLM_HEALTH_INTERVAL", 0)),
     )
+
+
+def _base_urls(settings) -> List[str]:
+    """The `BASE_URL` setting as a list, which may be a single URL or a list of replicas."""
+    base_url = settings["BASE_URL"]
+    base_urls = [base_url] if isinstance(base_url, str) else list(base_url)
+    if not base_urls:
+        raise ValueError("BASE_URL must contain at least one URL")
+    return base_urls
+
+
+def _create_rate_limiter(settings) -> Optional[RateLimiter]:
+    requests_per_minute = int(settings.get("RATE_LIMIT_RPM", 0))
+    tokens_per_minute = int(settings.get("RATE_LIMIT_TPM", 0))
+    if requests_per_minute <= 0 and tokens_per_minute <= 0:
+        return None
+    db_path = settings.get("RATE_LIMIT_DB", "")
+    # the replicas of a server share the quotas of its gateway
+    return RateLimiter(requests_per_minute, tokens_per_minute, Path(db_path) if db_path else None,
+                       scope=",".join(_base_urls(settings)))
@@ -0,0 +1,199 @@
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+from loguru import logger
+
+# a bucket refills from empty to full within this many seconds (the quotas are per minute)
+WINDOW_SECONDS = 60.0
+
+
+class RateLimiterMetrics(NamedTuple):
+    """
+    Snapshot of a `RateLimiter` in one process.
+
+    Attributes
+    ----------
+    requests : int
+        Requests admitted since the limiter was created.
+    tokens : int
+        Tokens budgeted for the admitted requests, corrected by the reported usage.
+    waits : int
+        Requests that had to wait for the budget.
+    waited_seconds : float
+        Total time requests waited for the budget.
+    """
+    requests: int
+    tokens: int
+    waits: int
+    waited_seconds: float
+
+
+class RateLimiter:
+    """
+    Token-bucket budget of requests and tokens per minute, shared by all processes on a host.
+
+    There are two buckets, holding up to `requests_per_minute` requests and `tokens_per_minute`
+    tokens, refilled continuously at the per-minute rate. A request takes one request and its
+    estimated prompt and completion tokens from the buckets. If either bucket is short, the caller
+    waits until it has refilled enough; requests are queued, never rejected. When a response reports
+    its actual token usage, the difference to the estimate is settled with `adjust`.
+
+    The buckets are stored in a SQLite database and updated in exclusive transactions, so all
+    punito processes using the same database (by default in the temporary directory of the host)
+    share one budget. Buckets are named after `scope`, e.g. the URL of the inference gateway, so
+    separate quotas do not mix.
+
+    Parameters
+    ----------
+    requests_per_minute : int
+        Request quota, 0 for no limit.
+    tokens_per_minute : int
+        Token quota, 0 for no limit.
+    db_path : Path, optional
+        SQLite database holding the buckets, by default `punito_rate_limit.sqlite` in the temporary directory.
+    scope : str, optional
+        Name of the quota, by default "default".
+    clock : Callable[[], float], optional
+        Wall clock in seconds shared by the processes, by default `time.time`.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, db_path: Optional[Path] = None,
+                 scope: str = "default", clock: Callable[[], float] = time.time):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.db_path = db_path or Path(tempfile.gettempdir()) / "punito_rate_limit.sqlite"
+        self.scope = scope
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._requests = 0
+        self._tokens = 0
+        self._waits = 0
+        self._waited = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # transactions are managed explicitly; the timeout covers transactions of other processes
+            self._connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS buckets "
+                                     "(name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+        return self._connection
+
+    def _take(self, tokens: int) -> float:
+        """Takes a request and `tokens` from the buckets if both suffice, otherwise returns the seconds to wait."""
+        buckets = [(f"{self.scope}:requests", self.requests_per_minute, 1),
+                   (f"{self.scope}:tokens", self.tokens_per_minute, tokens)]
+        buckets = [(name, capacity, min(amount, capacity)) for name, capacity, amount in buckets if capacity > 0]
+        if not buckets:
+            return 0.0
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = self._clock()
+                levels = []
+                for name, capacity, amount in buckets:
+                    row = connection.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                    level, updated = row if row is not None else (capacity, now)
+                    # quotas may have changed since the bucket was stored
+                    levels.append(min(capacity, level + max(0.0, now - updated) * capacity / WINDOW_SECONDS))
+
+                wait = max((amount - level) * WINDOW_SECONDS / capacity
+                           for (_, capacity, amount), level in zip(buckets, levels))
+                if wait <= 0:
+                    levels = [level - amount for (_, _, amount), level in zip(buckets, levels)]
+                for (name, _, _), level in zip(buckets, levels):
+                    connection.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                                       (name, level, now))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return max(0.0, wait)
+
+    def _admitted(self, tokens: int, waited: float) -> None:
+        with self._lock:
+            self._requests += 1
+            self._tokens += tokens
+            if waited > 0:
+                self._waits += 1
+                self._waited += waited
+        if waited > 1:
+            logger.debug(f"Waited {waited:.1f} s for the rate limit")
+
+    def acquire(self, tokens: int) -> None:
+        """
+        Blocks until the budget admits a request of the given estimated size, then takes it.
+
+        Parameters
+        ----------
+        tokens : int
+            Estimated prompt and completion tokens of the request.
+        """
+        start = time.monotonic()
+        waited = False
+        while (wait := self._take(tokens)) > 0:
+            time.sleep(wait)
+            waited = True
+        self._admitted(tokens, time.monotonic() - start if waited else 0.0)
+
+    async def aacquire(self, tokens: int) -> None:
+        """Async variant of `acquire`, running the database transactions in a worker thread."""
+        start = time.monotonic()
+        waited = False
+        # a transaction may wait up to the busy timeout for other processes, which must not block the event loop
+        while (wait := await asyncio.to_thread(self._take, tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited = True
+        self._admitted(tokens, time.monotonic() - start if waited else 0.0)
+
+    def adjust(self, tokens: int) -> None:
+        """
+        Settles the difference between the actual and the estimated tokens of an admitted request.
+
+        Parameters
+        ----------
+        tokens : int
+            Actual minus estimated tokens; negative values return tokens to the budget.
+        """
+        if self.tokens_per_minute <= 0 or tokens == 0:
+            return
+        name = f"{self.scope}:tokens"
+        with self._lock:
+            self._tokens += tokens
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # the level may go negative, which delays the next requests until the debt is refilled
+                connection.execute("UPDATE buckets SET level = MIN(?, level - ?) WHERE name = ?",
+                                   (self.tokens_per_minute, tokens, name))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    async def aadjust(self, tokens: int) -> None:
+        """Async variant of `adjust`, running the database transaction in a worker thread."""
+        if self.tokens_per_minute <= 0 or tokens == 0:
+            return
+        await asyncio.to_thread(self.adjust, tokens)
+
+    def metrics(self) -> RateLimiterMetrics:
+        """Return a snapshot of the requests admitted by this process."""
+        with self._lock:
+            return RateLimiterMetrics(self._requests, self._tokens, self._waits, self._waited)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
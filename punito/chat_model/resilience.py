@@ -0,0 +1,352 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple, TypeVar
+
+import httpx
+from loguru import logger
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Parses the `Retry-After` header of a response.
+
+    Parameters
+    ----------
+    response : httpx.Response
+        The response.
+
+    Returns
+    -------
+    float or None
+        Seconds to wait before the next request, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy(NamedTuple):
+    """
+    When and how long to wait before repeating a failed request.
+
+    Only failures that are safe to repeat are retried: connection errors and timeouts, and the
+    status codes in `retry_status_codes` (rate limiting and temporary server errors). Completion
+    requests have no side effects, so repeating them only costs time. Delays grow exponentially
+    with "full jitter" (a random delay between zero and the exponential bound), so workers that
+    failed together do not retry together. A `Retry-After` header takes precedence, up to `max_delay`.
+
+    Attributes
+    ----------
+    max_attempts : int
+        Maximum number of attempts per request, including the first one; 1 disables retries.
+    base_delay : float
+        Upper bound of the delay after the first failed attempt, in seconds.
+    max_delay : float
+        Upper bound of the delay after any attempt, in seconds, including a `Retry-After`.
+    retry_status_codes : Tuple[int, ...]
+        HTTP status codes that are retried.
+    """
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    retry_status_codes: Tuple[int, ...] = RETRYABLE_STATUS_CODES
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Return whether a failed request may be repeated."""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in self.retry_status_codes
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+    def backoff(self, attempt: int) -> float:
+        """Return a jittered delay after the given failed attempt (starting at 1)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        Returns how long to wait before repeating a request that failed.
+
+        Parameters
+        ----------
+        error : BaseException
+            The error of the failed attempt.
+        attempt : int
+            Number of the failed attempt, starting at 1.
+
+        Returns
+        -------
+        float or None
+            Seconds to wait, or None if the request must not be repeated.
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+        retry_after = parse_retry_after(error.response) if isinstance(error, httpx.HTTPStatusError) else None
+        if retry_after is not None:
+            # a server asking for an hour must not stall the worker for an hour
+            return min(retry_after, self.max_delay)
+        return self.backoff(attempt)
+
+
+class CircuitBreaker:
+    """
+    Pauses all requests to a backend that keeps failing, instead of every worker retrying on its own.
+
+    The breaker is closed while requests succeed. After `failure_threshold` consecutive retryable
+    failures, it opens: every request waits until `reset_timeout` seconds (or the `Retry-After` of the
+    last failure, if longer) have passed. Then a single probe request is let through (half-open);
+    the others keep waiting until the probe closes the breaker on success, or reopens it on failure.
+
+    The breaker is shared by threads and coroutines: `wait_time` never blocks, `before_request` and
+    `abefore_request` sleep until a request may be sent.
+
+    Parameters
+    ----------
+    failure_threshold : int, optional
+        Consecutive failures that open the breaker, by default 5. 0 disables the breaker.
+    reset_timeout : float, optional
+        Seconds the breaker stays open before a probe request, by default 30.
+    clock : Callable[[], float], optional
+        Monotonic clock in seconds, by default `time.monotonic`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """The state of the breaker: "closed", "open" or "half-open"."""
+        return self._state
+
+    def wait_time(self) -> float:
+        """
+        Returns how long a request has to wait, or 0 if it may be sent now.
+
+        When the open breaker times out, the first caller becomes the probe request.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            if self._state == self.OPEN:
+                remaining = self._open_until - self._clock()
+                if remaining > 0:
+                    return remaining
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                # the probe decides whether the breaker closes, check again shortly
+                return min(1.0, self.reset_timeout) or 0.1
+            self._probing = True
+            return 0.0
+
+    def before_request(self) -> None:
+        """Block until a request may be sent."""
+        while (delay := self.wait_time()) > 0:
+            time.sleep(delay)
+
+    async def abefore_request(self) -> None:
+        """Async variant of `before_request`."""
+        while (delay := self.wait_time()) > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self) -> None:
+        """Record a request the backend answered, which closes the breaker."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker closed, backend recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """Record a request abandoned without an outcome (e.g. cancelled), letting another request probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """
+        Record a retryable failure, which opens the breaker after `failure_threshold` failures in a row.
+
+        Parameters
+        ----------
+        retry_after : float or None, optional
+            Seconds the backend asked to wait (`Retry-After`), keeping the breaker open at least that long.
+        """
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                pause = max(self.reset_timeout, retry_after or 0.0)
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self._failures} failures, "
+                                   f"pausing requests for {pause:.1f} s")
+                self._state = self.OPEN
+                self._open_until = max(self._open_until, self._clock() + pause)
+                self._probing = False
+
+
+# set on errors shared by several callers once the breaker recorded them
+_RECORDED_ATTRIBUTE = "_breaker_recorded"
+
+
+def _record_outcome(policy: RetryPolicy, breaker: Optional[CircuitBreaker], error: BaseException) -> None:
+    if breaker is None or getattr(error, _RECORDED_ATTRIBUTE, False):
+        return
+    if policy.is_retryable(error):
+        retry_after = parse_retry_after(error.response) if isinstance(error, httpx.HTTPStatusError) else None
+        breaker.record_failure(min(retry_after, policy.max_delay) if retry_after is not None else None)
+    else:
+        # the backend answered, the request itself was wrong
+        breaker.record_success()
+
+
+def record_shared_failure(policy: RetryPolicy, breaker: Optional[CircuitBreaker], error: BaseException) -> None:
+    """
+    Records the failure of a request sent on behalf of several callers (e.g. a batch) once.
+
+    Every caller gets the same error and retries on its own; the error is marked as recorded,
+    so the retries of the callers do not count it in the breaker again.
+
+    Parameters
+    ----------
+    policy : RetryPolicy
+        The retry policy, deciding whether the error counts as a failure of the backend.
+    breaker : CircuitBreaker or None
+        The circuit breaker of the backend.
+    error : BaseException
+        The error of the shared request.
+    """
+    _record_outcome(policy, breaker, error)
+    setattr(error, _RECORDED_ATTRIBUTE, True)
+
+
+def _log_retry(error: BaseException, attempt: int, delay: float, policy: RetryPolicy) -> None:
+    reason = (f"HTTP {error.response.status_code}" if isinstance(error, httpx.HTTPStatusError)
+              else error.__class__.__name__)
+    logger.warning(f"Request failed ({reason}), retrying in {delay:.1f} s "
+                   f"(attempt {attempt} of {policy.max_attempts})")
+
+
+def retry_delay(policy: RetryPolicy, breaker: Optional[CircuitBreaker], error: BaseException,
+                attempt: int) -> Optional[float]:
+    """
+    Records a failed attempt in the breaker and returns how long to wait before the next one.
+
+    Parameters
+    ----------
+    policy : RetryPolicy
+        The retry policy.
+    breaker : CircuitBreaker or None
+        The circuit breaker of the backend.
+    error : BaseException
+        The error of the failed attempt.
+    attempt : int
+        Number of the failed attempt, starting at 1.
+
+    Returns
+    -------
+    float or None
+        Seconds to wait, or None if the error has to be raised.
+    """
+    _record_outcome(policy, breaker, error)
+    delay = policy.retry_delay(error, attempt)
+    if delay is not None:
+        _log_retry(error, attempt, delay, policy)
+    return delay
+
+
+def call_with_retry(send: Callable[[], T], policy: RetryPolicy, breaker: Optional[CircuitBreaker] = None) -> T:
+    """
+    Calls `send` until it succeeds, the error is not retryable, or the attempts are exhausted.
+
+    Parameters
+    ----------
+    send : Callable[[], T]
+        Sends the request and returns its result.
+    policy : RetryPolicy
+        The retry policy.
+    breaker : CircuitBreaker, optional
+        The circuit breaker of the backend, every attempt waits while it is open.
+
+    Returns
+    -------
+    T
+        The result of the first successful attempt.
+    """
+    attempt = 1
+    while True:
+        if breaker is not None:
+            breaker.before_request()
+        try:
+            result = send()
+        except Exception as e:
+            delay = retry_delay(policy, breaker, e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def acall_with_retry(send: Callable[[], Awaitable[T]], policy: RetryPolicy,
+                           breaker: Optional[CircuitBreaker] = None) -> T:
+    """Async variant of `call_with_retry`."""
+    attempt = 1
+    while True:
+        if breaker is not None:
+            await breaker.abefore_request()
+        try:
+            result = await send()
+        except Exception as e:
+            delay = retry_delay(policy, breaker, e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
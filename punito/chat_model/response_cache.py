@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from ..utils import find_project_root, get_default_settings
+
+CACHE_MODES = ("off", "read", "write", "readwrite", "replay-only")
+
+# bumped whenever the key derivation or the layout of the entries changes
+_CACHE_FORMAT = "1"
+
+
+class ResponseCacheMiss(LookupError):
+    """Raised in "replay-only" mode when a request has no cached response."""
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM completions, keyed by the request payload.
+
+    The key is the SHA-256 of the canonical JSON of the payload (model name, converted messages and
+    generation parameters) without the "stream" flag, so streamed and non-streamed requests share
+    entries. Every entry is a small JSON file in a two-level sharded directory. Entries do not
+    depend on the machine or the package version, so a cache directory, or an archive written by
+    `export_archive`, can be copied to another machine and replayed there (e.g. in CI without an
+    inference server).
+
+    Entries older than `ttl_seconds` are treated as misses and removed. When the cache grows beyond
+    `max_bytes`, the least recently used entries (by modification time, which is refreshed on every
+    hit) are evicted. The total size is tracked in memory, so the directory is only scanned once
+    and whenever the limit is exceeded.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        Directory holding the cache entries.
+    max_bytes : int, optional
+        Maximum total size of the entries, by default 1 GB.
+    ttl_seconds : float or None, optional
+        Maximum age of an entry, by default entries never expire.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 1024 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        """Return the cache key of a request payload."""
+        request = {name: value for name, value in payload.items() if name != "stream"}
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(f"{_CACHE_FORMAT}\0{canonical}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Look up the cached completion of a request.
+
+        Parameters
+        ----------
+        payload : Dict[str, Any]
+            The request payload.
+
+        Returns
+        -------
+        str or None
+            The cached completion, or None on a miss, an expired or an unreadable entry.
+        """
+        path = self._entry_path(self.key(payload))
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            content = entry["content"]
+            created = entry["created"]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Discarding corrupted response cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+
+        # refresh recency for the LRU eviction
+        os.utime(path)
+        return content
+
+    def put(self, payload: Dict[str, Any], content: str) -> None:
+        """
+        Store the completion of a request and evict old entries if the cache is too large.
+
+        Parameters
+        ----------
+        payload : Dict[str, Any]
+            The request payload.
+        content : str
+            The completion returned by the model.
+        """
+        key = self.key(payload)
+        entry = {"key": key, "created": time.time(), "model": payload.get("model"), "content": content}
+        self._write(self._entry_path(key), json.dumps(entry, ensure_ascii=False))
+
+    def _write(self, path: Path, data: str) -> bool:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so concurrent readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing response cache entry: {e}")
+            return False
+
+        with self._lock:
+            # the first write scans the directory, which already includes the new entry
+            self._size = self._size + len(data.encode("utf-8")) if self._size is not None else self._evict()
+            if self._size > self.max_bytes:
+                self._size = self._evict()
+        return True
+
+    def _evict(self) -> int:
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"Evicted response cache entry {path.name}")
+        return total
+
+    def export_archive(self, archive_path: Path) -> int:
+        """
+        Writes all entries into a zip archive that `import_archive` can read on another machine.
+
+        Parameters
+        ----------
+        archive_path : Path
+            Path of the archive to write.
+
+        Returns
+        -------
+        int
+            Number of exported entries.
+        """
+        paths = sorted(self.cache_dir.glob("*/*.json"))
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for path in paths:
+                archive.write(path, path.relative_to(self.cache_dir).as_posix())
+        logger.info(f"Exported {len(paths)} response cache entries to {archive_path}")
+        return len(paths)
+
+    def import_archive(self, archive_path: Path, overwrite: bool = False) -> int:
+        """
+        Adds the entries of an archive written by `export_archive` to the cache.
+
+        Entries keep their creation time, so the TTL applies as on the exporting machine.
+
+        Parameters
+        ----------
+        archive_path : Path
+            Path of the archive to read.
+        overwrite : bool, optional
+            Whether to replace entries that are already cached, by default False.
+
+        Returns
+        -------
+        int
+            Number of imported entries.
+        """
+        imported = 0
+        with zipfile.ZipFile(archive_path) as archive:
+            for name in archive.namelist():
+                try:
+                    entry = json.loads(archive.read(name).decode("utf-8"))
+                    key = entry["key"]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Skipping invalid response cache entry {name}: {e}")
+                    continue
+
+                path = self._entry_path(key)
+                if (overwrite or not path.exists()) and self._write(path, json.dumps(entry, ensure_ascii=False)):
+                    imported += 1
+
+        logger.info(f"Imported {imported} response cache entries from {archive_path}")
+        return imported
+
+
+@lru_cache(maxsize=None)
+def get_default_response_cache() -> ResponseCache:
+    """
+    Returns the response cache configured by the `LLM_CACHE_*` settings.
+
+    `LLM_CACHE_DIR` defaults to `generated_tests/.cache/responses` in the project root; a relative
+    path is resolved against the project root. `LLM_CACHE_MAX_MB` limits the size and
+    `LLM_CACHE_TTL_DAYS` the age of the entries (0 keeps them until they are evicted by size).
+
+    Returns
+    -------
+    ResponseCache
+        The shared response cache.
+    """
+    settings = get_default_settings()
+    cache_dir = Path(settings.get("LLM_CACHE_DIR", "") or "generated_tests/.cache/responses")
+    if not cache_dir.is_absolute():
+        cache_dir = find_project_root() / cache_dir
+
+    max_mb = int(settings.get("LLM_CACHE_MAX_MB", 1024))
+    ttl_days = float(settings.get("LLM_CACHE_TTL_DAYS", 0))
+    return ResponseCache(cache_dir, max_mb * 1024 * 1024, ttl_days * 24 * 3600 if ttl_days > 0 else None)
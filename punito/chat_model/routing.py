@@ -0,0 +1,282 @@
+import bisect
+import hashlib
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import httpx
+from loguru import logger
+
+# status codes of a replica that is failing, not of a request that is wrong or rate limited
+ENDPOINT_FAILURE_STATUS_CODES = (500, 502, 503, 504)
+
+
+class EndpointMetrics(NamedTuple):
+    """
+    Snapshot of one endpoint of an `EndpointRouter`.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the endpoint.
+    admitted : bool
+        Whether requests are routed to the endpoint.
+    outstanding : int
+        Requests currently in flight to the endpoint.
+    requests : int
+        Requests routed to the endpoint.
+    failures : int
+        Requests to the endpoint that failed with a connection error or a server error.
+    ejections : int
+        Times the endpoint was ejected.
+    """
+    url: str
+    admitted: bool
+    outstanding: int
+    requests: int
+    failures: int
+    ejections: int
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Return whether a failed request indicates a failing endpoint, rather than a wrong or rate limited request."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in ENDPOINT_FAILURE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class _Endpoint:
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+
+class EndpointRouter:
+    """
+    Routes requests to several replicas of an inference server.
+
+    Every request goes to the admitted endpoint with the fewest requests in flight; ties are broken
+    in turn, so idle endpoints share the load. With `affinity`, requests with the same affinity key
+    go to the same endpoint, chosen by consistent hashing: each endpoint owns `virtual_nodes` points
+    of a hash ring and a key goes to the first admitted endpoint after its hash. Ejecting or adding
+    an endpoint only moves the keys of that endpoint, so the prefix caches of the others stay warm.
+
+    An endpoint failing `failure_threshold` requests in a row (connection errors and the status
+    codes in `ENDPOINT_FAILURE_STATUS_CODES`) is ejected for `ejection_time` seconds, after which it
+    is admitted on trial: its next failure ejects it again. Health probes (`start_probes`) eject
+    endpoints failing a probe and re-admit recovered ones right away. If every endpoint is ejected,
+    requests are routed to all of them rather than failing without a try.
+
+    Parameters
+    ----------
+    urls : Sequence[str]
+        Base URLs of the endpoints.
+    affinity : bool, optional
+        Whether requests with an affinity key are routed by consistent hashing, by default False.
+    failure_threshold : int, optional
+        Consecutive failures that eject an endpoint, by default 3. 0 disables ejection.
+    ejection_time : float, optional
+        Seconds an ejected endpoint gets no requests, unless a health probe re-admits it, by default 30.
+    virtual_nodes : int, optional
+        Points of each endpoint on the hash ring, by default 64.
+    clock : Callable[[], float], optional
+        Monotonic clock in seconds, by default `time.monotonic`.
+    """
+
+    def __init__(self, urls: Sequence[str], affinity: bool = False, failure_threshold: int = 3,
+                 ejection_time: float = 30.0, virtual_nodes: int = 64, clock: Callable[[], float] = time.monotonic):
+        if not urls:
+            raise ValueError("At least one endpoint is required")
+        self.affinity = affinity
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, _Endpoint] = {url: _Endpoint(url) for url in urls}
+        self._order: List[_Endpoint] = list(self._endpoints.values())
+        self._next = 0
+        self._ring: List[Tuple[int, str]] = sorted((_hash(f"{url}#{node}"), url)
+                                                   for url in self._endpoints for node in range(virtual_nodes))
+        self._ring_hashes = [point for point, _ in self._ring]
+        self._stop_probes: Optional[threading.Event] = None
+
+    @property
+    def urls(self) -> List[str]:
+        """Base URLs of all endpoints."""
+        return [endpoint.url for endpoint in self._order]
+
+    def _admitted(self, endpoint: _Endpoint, now: float) -> bool:
+        return endpoint.ejected_until <= now
+
+    def select(self, affinity_key: Optional[str] = None) -> str:
+        """
+        Returns the endpoint the next request goes to, without counting it as in flight.
+
+        Parameters
+        ----------
+        affinity_key : str, optional
+            Key of related requests (e.g. the class whose chunks are generated), used with `affinity`.
+
+        Returns
+        -------
+        str
+            Base URL of the endpoint.
+        """
+        with self._lock:
+            return self._select(affinity_key).url
+
+    def _select(self, affinity_key: Optional[str]) -> _Endpoint:
+        now = self._clock()
+        admitted = [endpoint for endpoint in self._order if self._admitted(endpoint, now)] or self._order
+
+        if self.affinity and affinity_key is not None:
+            candidates = {endpoint.url for endpoint in admitted}
+            start = bisect.bisect(self._ring_hashes, _hash(affinity_key))
+            for offset in range(len(self._ring)):
+                url = self._ring[(start + offset) % len(self._ring)][1]
+                if url in candidates:
+                    return self._endpoints[url]
+
+        self._next = (self._next + 1) % len(admitted)
+        rotated = admitted[self._next:] + admitted[:self._next]
+        return min(rotated, key=lambda endpoint: endpoint.outstanding)
+
+    @contextmanager
+    def route(self, affinity_key: Optional[str] = None) -> Iterator[str]:
+        """
+        Routes a request, which is in flight until the context is left.
+
+        An exception leaving the context is recorded as a failure of the endpoint if
+        `is_endpoint_failure`; leaving it normally, or with an error of the request itself, as a
+        success. A request abandoned without an outcome (e.g. a cancelled task) records neither.
+
+        Parameters
+        ----------
+        affinity_key : str, optional
+            Key of related requests, see `select`.
+
+        Yields
+        ------
+        str
+            Base URL of the endpoint.
+        """
+        with self._lock:
+            endpoint = self._select(affinity_key)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+        try:
+            yield endpoint.url
+        except Exception as e:
+            if is_endpoint_failure(e):
+                self.record_failure(endpoint.url)
+            else:
+                # the endpoint answered, the request itself was wrong
+                self.record_success(endpoint.url)
+            raise
+        else:
+            self.record_success(endpoint.url)
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+
+    @asynccontextmanager
+    async def aroute(self, affinity_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Async variant of `route`."""
+        with self.route(affinity_key) as url:
+            yield url
+
+    def record_success(self, url: str) -> None:
+        """Record a request an endpoint answered."""
+        with self._lock:
+            self._endpoints[url].consecutive_failures = 0
+
+    def record_failure(self, url: str) -> None:
+        """Record a failed request of an endpoint, which ejects it after `failure_threshold` failures in a row."""
+        with self._lock:
+            endpoint = self._endpoints[url]
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if 0 < self.failure_threshold <= endpoint.consecutive_failures:
+                self._eject(endpoint, f"{endpoint.consecutive_failures} failed requests in a row")
+
+    def _eject(self, endpoint: _Endpoint, reason: str) -> None:
+        now = self._clock()
+        if self._admitted(endpoint, now):
+            endpoint.ejections += 1
+            logger.warning(f"Endpoint {endpoint.url} ejected for {self.ejection_time:.1f} s: {reason}")
+        endpoint.ejected_until = now + self.ejection_time
+        # admitted on trial after the ejection, so its next failure ejects it again
+        endpoint.consecutive_failures = max(0, self.failure_threshold - 1)
+
+    def probe(self, check: Callable[[str], bool]) -> None:
+        """
+        Checks the health of every endpoint once: failing endpoints are ejected, healthy ejected ones re-admitted.
+
+        Parameters
+        ----------
+        check : Callable[[str], bool]
+            Returns whether the endpoint with the given base URL is healthy; raising counts as unhealthy.
+        """
+        for url in self.urls:
+            try:
+                healthy = check(url)
+            except Exception as e:
+                logger.debug(f"Health probe of {url} failed: {e.__class__.__name__}: {e}")
+                healthy = False
+
+            with self._lock:
+                endpoint = self._endpoints[url]
+                if not healthy:
+                    self._eject(endpoint, "health probe failed")
+                elif not self._admitted(endpoint, self._clock()):
+                    logger.info(f"Endpoint {url} re-admitted, health probe succeeded")
+                    endpoint.ejected_until = 0.0
+                    endpoint.consecutive_failures = 0
+
+    def start_probes(self, check: Callable[[str], bool], interval: float) -> None:
+        """
+        Probes the endpoints every `interval` seconds in a daemon thread, until `stop_probes` is called.
+
+        Parameters
+        ----------
+        check : Callable[[str], bool]
+            Returns whether the endpoint with the given base URL is healthy, see `probe`.
+        interval : float
+            Seconds between two rounds of probes.
+        """
+        with self._lock:
+            if self._stop_probes is not None:
+                return
+            stop = self._stop_probes = threading.Event()
+
+        def run() -> None:
+            while not stop.wait(interval):
+                self.probe(check)
+
+        threading.Thread(target=run, name="endpoint-health-probes", daemon=True).start()
+
+    def stop_probes(self) -> None:
+        """Stop the health probes started by `start_probes`."""
+        with self._lock:
+            stop, self._stop_probes = self._stop_probes, None
+        if stop is not None:
+            stop.set()
+
+    def metrics(self) -> List[EndpointMetrics]:
+        """Return a snapshot of every endpoint."""
+        with self._lock:
+            now = self._clock()
+            return [EndpointMetrics(endpoint.url, self._admitted(endpoint, now), endpoint.outstanding,
+                                    endpoint.requests, endpoint.failures, endpoint.ejections)
+                    for endpoint in self._order]
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, NamedTuple, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlightMetrics(NamedTuple):
+    """
+    Snapshot of a `SingleFlight` group.
+
+    Attributes
+    ----------
+    calls : int
+        Calls made through the group.
+    coalesced : int
+        Calls that waited for an identical call in flight instead of making their own.
+    in_flight : int
+        Distinct calls currently in flight.
+    """
+    calls: int
+    coalesced: int
+    in_flight: int
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls in flight: the first caller of a key makes the call, later callers
+    of the same key wait for its result (or error) instead of repeating it.
+
+    Only calls in flight are shared, a call made after the previous one finished runs again.
+    Threads share calls with threads (`do`), coroutines with coroutines of the same event loop (`ado`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._total = 0
+        self._coalesced = 0
+
+    def metrics(self) -> SingleFlightMetrics:
+        """Return a snapshot of the group."""
+        with self._lock:
+            return SingleFlightMetrics(self._total, self._coalesced, len(self._calls) + len(self._tasks))
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Calls `fn`, unless a call with the same key is in flight, whose result is returned instead.
+
+        Parameters
+        ----------
+        key : str
+            Identity of the call.
+        fn : Callable[[], T]
+            Makes the call.
+
+        Returns
+        -------
+        T
+            The result of the call.
+        """
+        with self._lock:
+            self._total += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async variant of `do`.
+
+        The call runs in its own task, so cancelling one caller does not cancel it for the others.
+        """
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            self._total += 1
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._forget(task_key))
+            else:
+                self._coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key: Tuple[int, str]) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
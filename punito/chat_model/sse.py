@@ -0,0 +1,143 @@
+import json
+import time
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+_DATA = b"data:"
+_DONE = b"[DONE]"
+_CONTENT_KEY = b'"content":'
+_DELTA_KEY = b'"delta"'
+
+
+def parse_delta(data: bytes) -> Optional[str]:
+    """
+    Extract the content delta from the data of a chat completion event, or None if it has none.
+
+    Plain deltas, i.e. a JSON string without escapes following the only "content" key of the
+    event inside its "delta", are cut out of the bytes directly; all other events are parsed as JSON.
+
+    Parameters
+    ----------
+    data : bytes
+        The data of the event, without the "data:" field name.
+
+    Returns
+    -------
+    str or None
+        The content delta.
+    """
+    start = data.find(_CONTENT_KEY)
+    if start > data.find(_DELTA_KEY) >= 0 and data.find(_CONTENT_KEY, start + 1) == -1:
+        start += len(_CONTENT_KEY)
+        if data[start:start + 1] == b" ":
+            start += 1
+        if data[start:start + 1] == b'"':
+            end = data.find(b'"', start + 1)
+            # an escaped quote would end the string early, so escapes take the JSON path
+            if end != -1 and data.find(b"\\", start + 1, end) == -1:
+                return data[start + 1:end].decode("utf-8")
+
+    try:
+        event = json.loads(data)
+        return event.get("choices", [{}])[0].get("delta", {}).get("content", "")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.warning(f"JSON decode error in stream chunk: {data[:200]!r}")
+    except (KeyError, TypeError, IndexError, AttributeError) as e:
+        logger.warning(f"Malformed stream chunk: {data[:200]!r} ({e.__class__.__name__})")
+    return None
+
+
+class SSEDecoder:
+    """
+    Incremental decoder of the content deltas of a chat completion stream of server-sent events.
+
+    The decoder is fed the raw bytes of the response as they arrive; lines split across reads
+    are buffered until complete. With a positive `flush_interval`, deltas are coalesced and
+    released at most once per interval, so a fast stream yields few large deltas instead of
+    one per token.
+
+    Parameters
+    ----------
+    flush_interval : float, optional
+        Seconds deltas are coalesced for, by default 0 (every delta is released on its own).
+    clock : Callable[[], float], optional
+        Monotonic clock in seconds, by default `time.monotonic`.
+    """
+
+    def __init__(self, flush_interval: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        self.flush_interval = flush_interval
+        self.done = False
+        self._clock = clock
+        self._buffer = b""
+        self._pending: List[str] = []
+        self._flushed = clock()
+
+    def feed(self, data: bytes) -> List[str]:
+        """
+        Decodes the next bytes of the stream.
+
+        Parameters
+        ----------
+        data : bytes
+            Bytes of the response body.
+
+        Returns
+        -------
+        List[str]
+            Content deltas ready to be released, possibly none.
+        """
+        if self.done:
+            return []
+        buffer = self._buffer + data
+        end = buffer.rfind(b"\n")
+        if end == -1:
+            self._buffer = buffer
+            return []
+        self._buffer = buffer[end + 1:]
+        return self._release(self._decode(buffer[:end]))
+
+    def close(self) -> List[str]:
+        """
+        Decodes the rest of the stream, a last line without line break included.
+
+        Returns
+        -------
+        List[str]
+            The remaining content deltas.
+        """
+        deltas = [] if self.done else self._decode(self._buffer)
+        self._buffer = b""
+        self._pending.extend(deltas)
+        return self._flush()
+
+    def _decode(self, lines: bytes) -> List[str]:
+        deltas = []
+        for line in lines.split(b"\n"):
+            if not line.startswith(_DATA):
+                # blank lines between events, comments and other fields
+                continue
+            payload = line[len(_DATA):].strip()
+            if payload == _DONE:
+                self.done = True
+                break
+            delta = parse_delta(payload)
+            if delta:
+                deltas.append(delta)
+        return deltas
+
+    def _release(self, deltas: List[str]) -> List[str]:
+        if self.flush_interval <= 0:
+            return deltas
+        self._pending.extend(deltas)
+        if self.done or self._clock() - self._flushed >= self.flush_interval:
+            return self._flush()
+        return []
+
+    def _flush(self) -> List[str]:
+        self._flushed = self._clock()
+        if not self._pending:
+            return []
+        delta = "".join(self._pending)
+        self._pending = []
+        return [delta]
@@ -1,2 +1,6 @@
+from .class_index import ClassIndex, get_class_index
 from .preprocessor import get_function_with_individual_dependencies, get_all_methods, parse_java_class, get_chunked_code
-from .postprocessor import collect_class_tests
\ No newline at end of file
+from .postprocessor import collect_class_tests
+from .tree_preprocessor import chunk_source_tree, chunk_files, ChunkingResult
+from .chunk_cache import ChunkCache, get_chunked_code_cached
+from .span_chunk import SpanChunk, span_chunks
\ No newline at end of file
@@ -0,0 +1,125 @@
+from typing import Dict, FrozenSet, List, Set, Union
+
+from javalang.tree import MethodDeclaration, MethodInvocation
+
+from .scanner import ScannedMethod
+
+
+class CallGraph:
+    """
+    Intra-class call graph with memoized transitive closure over private methods.
+
+    The graph is built with a single walk over the AST of every method. Strongly connected
+    components of private methods (mutually recursive helpers) are condensed, so the closure
+    of every component is computed exactly once and then shared by all its members.
+
+    Parameters
+    ----------
+    all_methods : Dict[str, MethodDeclaration or ScannedMethod]
+        A dictionary mapping method names to their corresponding AST nodes (or to methods found by
+        the structural scanner, whose invoked methods are already known).
+    """
+
+    def __init__(self, all_methods: Dict[str, Union[MethodDeclaration, ScannedMethod]]):
+        self.public_methods: FrozenSet[str] = frozenset(
+            name for name, method in all_methods.items() if "public" in method.modifiers
+        )
+        invoked = {name: method.calls if isinstance(method, ScannedMethod)
+                   else [node.member for _, node in method.filter(MethodInvocation)]
+                   for name, method in all_methods.items()}
+        self.calls: Dict[str, FrozenSet[str]] = {
+            name: frozenset(member for member in invoked[name] if member in all_methods)
+            for name in all_methods
+        }
+        self._closures: Dict[str, FrozenSet[str]] | None = None
+
+    def is_private(self, method_name: str) -> bool:
+        """Return True if the method is declared in the class and is not public."""
+        return method_name in self.calls and method_name not in self.public_methods
+
+    def private_closure(self, method_name: str) -> FrozenSet[str]:
+        """
+        Returns the method itself and all private methods it transitively depends on.
+
+        Traversal stops at public methods, which are tested on their own.
+
+        Parameters
+        ----------
+        method_name : str
+            The name of the method whose dependencies to collect.
+
+        Returns
+        -------
+        FrozenSet[str]
+            Names of the collected methods, or an empty set if the method is public or
+            not declared in the class.
+        """
+        if self._closures is None:
+            self._closures = self._compute_closures()
+        return self._closures.get(method_name, frozenset())
+
+    def _private_successors(self, method_name: str) -> List[str]:
+        return [call for call in self.calls[method_name] if self.is_private(call)]
+
+    def _compute_closures(self) -> Dict[str, FrozenSet[str]]:
+        closures: Dict[str, FrozenSet[str]] = {}
+        for component in self._strongly_connected_components():
+            members = frozenset(component)
+            successors = {call for name in component for call in self._private_successors(name)} - members
+            closure = members.union(*(closures[call] for call in successors))
+            for name in component:
+                closures[name] = closure
+        return closures
+
+    def _strongly_connected_components(self) -> List[List[str]]:
+        """Iterative Tarjan's algorithm; components are emitted in reverse topological order."""
+        index: Dict[str, int] = {}
+        low_link: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        components: List[List[str]] = []
+        counter = 0
+
+        for root in self.calls:
+            if root in index or not self.is_private(root):
+                continue
+
+            work = [(root, iter(self._private_successors(root)))]
+            index[root] = low_link[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = low_link[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self._private_successors(successor))))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        low_link[node] = min(low_link[node], index[successor])
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+
+                if low_link[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+        return components
@@ -0,0 +1,347 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from .class_index import ClassIndex, get_class_index, get_parser_backend
+from .chunk_cover import get_planned_layouts
+from .preprocessor import ChunkLayout, iter_chunk_layouts, render_chunks
+from ..utils import find_project_root, get_default_settings, get_package_version
+
+MethodIndex = Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+
+# bumped whenever the layout of the cached entries changes
+_CACHE_FORMAT = "6"
+
+
+class CachedClass(NamedTuple):
+    """
+    Cached preprocessing results of a single Java class.
+
+    Attributes
+    ----------
+    layouts : Dict[str, Dict[str, ChunkLayout]]
+        Chunk layouts as returned by `get_chunk_layouts`.
+    method_index : Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+        For every method: its source span, sorted modifiers, sorted names of called class methods
+        and the fingerprint of its normalized code.
+    """
+    layouts: Dict[str, Dict[str, ChunkLayout]]
+    method_index: MethodIndex
+
+    def class_index(self, class_code: str) -> ClassIndex:
+        """Return an index of the class that cuts methods out by their cached spans, without parsing."""
+        return ClassIndex(class_code, method_spans={name: entry[0] for name, entry in self.method_index.items()},
+                          backend=get_parser_backend())
+
+    def chunks(self, class_code: str) -> Dict[str, Dict[str, str]]:
+        """Return the chunked code of the class, rendered from the cached layouts."""
+        return render_chunks(self.class_index(class_code), self.layouts)
+
+
+class ChunkCache:
+    """
+    Persistent, content-addressed cache of chunked Java classes.
+
+    Entries are keyed by the SHA-256 of the class source, the punito version, the parser
+    backend (`JAVA_PARSER`), the chunk planner and whether delegation-only chunks are pruned,
+    so any change of the class or of the package invalidates them. Entries hold chunk layouts
+    and method spans rather than chunk code, which is cut out of the class source on demand.
+    Every entry is a zlib-compressed pickle stored in a two-level sharded directory. The cache
+    is bounded in size: when it grows beyond `max_bytes`, the least recently used entries (by
+    modification time, which is refreshed on every hit) are evicted. The size is counted as
+    entries are written, so the directory is only scanned on the first write and when the
+    count crosses the limit.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        Directory holding the cache entries.
+    max_bytes : int, optional
+        Maximum total size of the entries, by default 256 MB.
+    version : str, optional
+        Version mixed into the keys, by default the punito package version.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024, version: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version if version is not None else get_package_version()
+        self._lock = threading.Lock()
+        # total size of the entries, None until the directory was scanned
+        self._size: Optional[int] = None
+
+    def key(self, class_code: str, planner: str = "order", prune: bool = False) -> str:
+        """Return the cache key of a class source chunked by the given planner."""
+        digest = hashlib.sha256(f"{_CACHE_FORMAT}\0{self.version}\0{get_parser_backend()}\0{planner}\0"
+                                f"{prune:d}\0".encode("utf-8"))
+        digest.update(class_code.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    def get(self, class_code: str, planner: str = "order", prune: bool = False) -> Optional[CachedClass]:
+        """
+        Look up the cached preprocessing results of a class.
+
+        Parameters
+        ----------
+        class_code : str
+            The Java source code of the class.
+        planner : str, optional
+            The chunk planner the layouts were determined with, by default "order".
+        prune : bool, optional
+            Whether delegation-only chunks were pruned, by default False.
+
+        Returns
+        -------
+        CachedClass or None
+            The cached results, or None on a miss or an unreadable entry.
+        """
+        path = self._entry_path(self.key(class_code, planner, prune))
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        try:
+            entry = CachedClass(*pickle.loads(zlib.decompress(data)))
+        except Exception as e:
+            logger.warning(f"Discarding corrupted chunk cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # refresh recency for the LRU eviction
+        os.utime(path)
+        return entry
+
+    def put(self, class_code: str, entry: CachedClass, planner: str = "order", prune: bool = False) -> None:
+        """
+        Store the preprocessing results of a class and evict old entries if the cache is too large.
+
+        Parameters
+        ----------
+        class_code : str
+            The Java source code of the class.
+        entry : CachedClass
+            The results to store.
+        planner : str, optional
+            The chunk planner the layouts were determined with, by default "order".
+        prune : bool, optional
+            Whether delegation-only chunks were pruned, by default False.
+        """
+        path = self._entry_path(self.key(class_code, planner, prune))
+        data = zlib.compress(pickle.dumps(tuple(entry), protocol=pickle.HIGHEST_PROTOCOL))
+
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so concurrent readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing chunk cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            over_limit = self._size is None or self._size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _evict(self) -> None:
+        # also counts the entries written by other processes since the last scan
+        entries = []
+        for path in self.cache_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"Evicted chunk cache entry {path.name}")
+
+        with self._lock:
+            self._size = total
+
+
+def build_method_index(index: ClassIndex) -> MethodIndex:
+    """
+    Summarizes the methods of an indexed class in a form that can be cached.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class.
+
+    Returns
+    -------
+    Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+        For every method: its source span, sorted modifiers, sorted names of called class methods
+        and the fingerprint of its normalized code.
+    """
+    return {
+        name: (index.method_spans[name], sorted(method.modifiers), sorted(index.call_graph.calls[name]),
+               index.method_fingerprints[name])
+        for name, method in index.methods.items()
+    }
+
+
+@lru_cache(maxsize=None)
+def get_default_chunk_cache() -> ChunkCache:
+    """
+    Returns the chunk cache stored under `generated_tests/.cache/chunks` in the project root.
+
+    The size limit is read from the `CHUNK_CACHE_MAX_MB` setting.
+
+    Returns
+    -------
+    ChunkCache
+        The shared chunk cache.
+    """
+    max_mb = get_default_settings().get("CHUNK_CACHE_MAX_MB", 256)
+    return ChunkCache(find_project_root() / "generated_tests" / ".cache" / "chunks", int(max_mb) * 1024 * 1024)
+
+
+def get_cached_class(class_code: str, cache: Optional[ChunkCache] = None, planner: str = "order",
+                     prune: bool = False) -> CachedClass:
+    """
+    Returns the chunk layouts and method index of a class, chunking it only on a cache miss.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    cache : ChunkCache, optional
+        The cache to use, by default `get_default_chunk_cache()`.
+    planner : str, optional
+        The chunk planner, see `get_planned_layouts`. By default "order".
+    prune : bool, optional
+        Whether to drop chunks that only delegate, see `get_chunk_layouts`. By default False.
+
+    Returns
+    -------
+    CachedClass
+        The chunk layouts and method index of the class.
+    """
+    cache = cache or get_default_chunk_cache()
+    entry = cache.get(class_code, planner, prune)
+    if entry is not None:
+        logger.debug("Chunk cache hit")
+        return entry
+
+    entry = CachedClass(get_planned_layouts(class_code, planner, prune),
+                        build_method_index(get_class_index(class_code)))
+    cache.put(class_code, entry, planner, prune)
+    return entry
+
+
+class ChunkStream(NamedTuple):
+    """
+    Chunks of a class that are yielded while they are being built.
+
+    Attributes
+    ----------
+    index : ClassIndex
+        The index of the class, for cutting out the chunk code.
+    method_index : Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+        Method index of the class, for fingerprinting the chunks.
+    layouts : Iterator[Tuple[str, str, ChunkLayout]]
+        Public method name, tested method name and chunk layout of every chunk, grouped by public method.
+    """
+    index: ClassIndex
+    method_index: MethodIndex
+    layouts: Iterator[Tuple[str, str, ChunkLayout]]
+
+
+def _iter_layouts(layouts: Dict[str, Dict[str, ChunkLayout]]) -> Iterator[Tuple[str, str, ChunkLayout]]:
+    for public_fn, chunks in layouts.items():
+        for name, layout in chunks.items():
+            yield public_fn, name, layout
+
+
+def _iter_and_cache(class_code: str, cache: ChunkCache, method_index: MethodIndex,
+                    prune: bool) -> Iterator[Tuple[str, str, ChunkLayout]]:
+    layouts = {}
+    for public_fn, name, layout in iter_chunk_layouts(class_code, prune):
+        layouts.setdefault(public_fn, {})[name] = layout
+        yield public_fn, name, layout
+    # cached only once all chunks were built, an abandoned stream leaves no partial entry
+    cache.put(class_code, CachedClass(layouts, method_index), prune=prune)
+
+
+def stream_cached_class(class_code: str, cache: Optional[ChunkCache] = None, planner: str = "order",
+                        prune: bool = False) -> ChunkStream:
+    """
+    Streaming variant of `get_cached_class`.
+
+    On a cache miss with the "order" planner, chunks are yielded as soon as they are built, so their
+    processing can overlap with building the remaining chunks. The class is indexed up front;
+    the complete layouts are cached once the stream is exhausted. Other planners need the whole
+    class to choose chunks, so their chunks are yielded only after all were planned.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    cache : ChunkCache, optional
+        The cache to use, by default `get_default_chunk_cache()`.
+    planner : str, optional
+        The chunk planner, see `get_planned_layouts`. By default "order".
+    prune : bool, optional
+        Whether to drop chunks that only delegate, see `get_chunk_layouts`. By default False.
+
+    Returns
+    -------
+    ChunkStream
+        The class index, the method index and an iterator over the chunk layouts.
+    """
+    cache = cache or get_default_chunk_cache()
+    entry = (cache.get(class_code, planner, prune) if planner == "order"
+             else get_cached_class(class_code, cache, planner, prune))
+    if entry is not None:
+        return ChunkStream(entry.class_index(class_code), entry.method_index, _iter_layouts(entry.layouts))
+
+    index = get_class_index(class_code)
+    method_index = build_method_index(index)
+    return ChunkStream(index, method_index, _iter_and_cache(class_code, cache, method_index, prune))
+
+
+def get_chunked_code_cached(class_code: str, cache: Optional[ChunkCache] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Cached variant of `get_chunked_code`. Unchanged classes are not parsed again.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    cache : ChunkCache, optional
+        The cache to use, by default `get_default_chunk_cache()`.
+
+    Returns
+    -------
+    Dict[str, Dict[str, str]]
+        Mapping of public method name to a mapping of tested method name to chunk code.
+    """
+    return get_cached_class(class_code, cache).chunks(class_code)
@@ -0,0 +1,128 @@
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from loguru import logger
+
+from .class_index import ClassIndex, get_class_index
+from .packing import estimate_layout_tokens
+from .preprocessor import ChunkLayout, get_chunk_layouts, get_tested_public_methods, is_removable_layout
+
+COVER_COSTS = ("chunks", "tokens")
+CHUNK_PLANNERS = ("order", "min-chunks", "min-tokens")
+
+
+class _Candidate(NamedTuple):
+    public_fn: str
+    dep_name: str
+    layout: ChunkLayout
+    cost: int
+
+
+def _in_source_order(index: ClassIndex, method_names) -> Tuple[str, ...]:
+    return tuple(sorted(method_names, key=lambda name: index.method_spans[name]))
+
+
+def _direct_private_deps(index: ClassIndex, public_fn: str) -> Tuple[str, ...]:
+    call_graph = index.call_graph
+    return _in_source_order(index, (call for call in call_graph.calls[public_fn] if call_graph.is_private(call)))
+
+
+def _get_candidates(index: ClassIndex, cost: str, prune: bool) -> List[_Candidate]:
+    candidates = []
+    for public_fn in get_tested_public_methods(index):
+        direct_deps = _direct_private_deps(index, public_fn)
+        context = (public_fn, *direct_deps)
+
+        for dep in direct_deps:
+            closure = index.call_graph.private_closure(dep)
+            layout = ChunkLayout(context, _in_source_order(index, closure - {dep}))
+            if prune and is_removable_layout(index, layout):
+                continue
+            weight = 1 if cost == "chunks" else estimate_layout_tokens(index, layout)
+            candidates.append(_Candidate(public_fn, dep, layout, weight))
+
+    return candidates
+
+
+def _choose_cheapest(candidates: List[_Candidate]) -> Set[int]:
+    """Returns the indices of the cheapest candidate of every tested method, ties broken by public method name."""
+    # only the tested method of a chunk counts as covered: methods that are only rendered as
+    # dependencies are not the "Tested Function" of the prompt and would get no tests
+    best: Dict[str, int] = {}
+    for i, candidate in enumerate(candidates):
+        j = best.get(candidate.dep_name)
+        if j is None or (candidate.cost, candidate.public_fn) < (candidates[j].cost, candidates[j].public_fn):
+            best[candidate.dep_name] = i
+    return set(best.values())
+
+
+def get_minimal_cover_layouts(class_code: str, cost: str = "chunks",
+                              prune: bool = False) -> Dict[str, Dict[str, ChunkLayout]]:
+    """
+    Determines chunk layouts testing the same methods as `get_chunk_layouts` with as few chunks (or tokens) as possible.
+
+    Every direct private dependency of a tested public method is tested once, as by `get_chunk_layouts`,
+    and every tested public method keeps its own chunk. A dependency called by several public methods
+    gets its chunk in the context of the public method with the cheapest chunk, instead of the first
+    one declared, so the result does not depend on the order of the public methods. Methods that
+    only appear as dependencies of a chunk do not count as tested, so with the "chunks" cost there
+    are as many chunks as with `get_chunk_layouts`.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    cost : str, optional
+        What to minimize: "chunks" (number of LLM requests) or "tokens" (estimated prompt tokens).
+    prune : bool, optional
+        Whether to drop chunks that only delegate, see `get_chunk_layouts`. By default False.
+
+    Returns
+    -------
+    Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+    """
+    if cost not in COVER_COSTS:
+        raise ValueError(f"Invalid cover cost: {cost}. Expected one of {COVER_COSTS}.")
+
+    index = get_class_index(class_code)
+    candidates = _get_candidates(index, cost, prune)
+    chosen = _choose_cheapest(candidates)
+
+    layouts = {}
+    for public_fn in get_tested_public_methods(index):
+        own = ChunkLayout((public_fn, *_direct_private_deps(index, public_fn)))
+        chunks = {} if prune and is_removable_layout(index, own) else {public_fn: own}
+        chunks.update({candidate.dep_name: candidate.layout for i, candidate in enumerate(candidates)
+                       if i in chosen and candidate.public_fn == public_fn})
+        if chunks:
+            layouts[public_fn] = chunks
+
+    logger.info(f"Minimal cover uses {len(chosen)} of {len(candidates)} dependency chunks")
+    return layouts
+
+
+def get_planned_layouts(class_code: str, planner: str = "order",
+                        prune: bool = False) -> Dict[str, Dict[str, ChunkLayout]]:
+    """
+    Determines the chunk layouts of a class with the given planner.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    planner : str, optional
+        "order" for `get_chunk_layouts`, "min-chunks" or "min-tokens" for `get_minimal_cover_layouts`
+        minimizing the number of chunks or the estimated tokens.
+    prune : bool, optional
+        Whether to drop chunks that only delegate, see `get_chunk_layouts`. By default False.
+
+    Returns
+    -------
+    Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+    """
+    if planner not in CHUNK_PLANNERS:
+        raise ValueError(f"Invalid chunk planner: {planner}. Expected one of {CHUNK_PLANNERS}.")
+    if planner == "order":
+        return get_chunk_layouts(class_code, prune)
+    return get_minimal_cover_layouts(class_code, cost=planner.removeprefix("min-"), prune=prune)
@@ -0,0 +1,301 @@
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
+from functools import cached_property, lru_cache
+from typing import Dict, List, Optional, Set, Union
+
+from javalang.tokenizer import JavaToken, Position
+from javalang.tree import Assignment, CompilationUnit, MethodDeclaration, MethodInvocation, FieldDeclaration
+
+from .call_graph import CallGraph
+from .scanner import ScannedClass, ScannedMethod, scan_java_class
+from .spans import Span, compute_line_offsets, get_method_spans, parse_tokens, tokenize_java
+from ..utils import get_default_settings
+
+PARSER_BACKENDS = ("scanner", "javalang")
+# backend of code that does not choose one; chunking reads the `JAVA_PARSER` setting, see `get_parser_backend`
+DEFAULT_PARSER_BACKEND = "javalang"
+
+
+class ClassIndex:
+    """
+    Index of a single Java class, computed once and shared by all chunking functions.
+
+    Every fact (tokens, AST, line-offset table, method spans, call graph, imports, class header and fields)
+    is computed lazily on first access and cached on the instance, so the source code
+    is parsed at most once and scanned at most once per fact, regardless of how many
+    methods are extracted from it.
+
+    With the "scanner" backend, the facts needed for chunking (methods, spans, calls, fields and
+    state updates) come from a single pass of `scan_java_class` over the tokens and the AST is
+    only built if it is accessed directly. Classes the scanner is unsure about are parsed by javalang.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    tree : CompilationUnit, optional
+        Already parsed AST of `class_code`. If omitted, the code is parsed on first access.
+    method_spans : Dict[str, Span], optional
+        Already known method spans (e.g. from a cache). Allows to cut methods out of the
+        code by name without parsing it.
+    backend : str, optional
+        "javalang" (default) or "scanner". If `tree` is given, javalang is used.
+    """
+
+    def __init__(self, class_code: str, tree: Optional[CompilationUnit] = None,
+                 method_spans: Optional[Dict[str, Span]] = None, backend: str = DEFAULT_PARSER_BACKEND):
+        if backend not in PARSER_BACKENDS:
+            raise ValueError(f"Invalid parser backend: {backend}. Expected one of {PARSER_BACKENDS}.")
+        self.class_code = class_code
+        self.backend = backend
+        if tree is not None:
+            self.tree = tree
+            self.backend = "javalang"
+        if method_spans is not None:
+            self.method_spans = method_spans
+
+    @cached_property
+    def tokens(self) -> List[JavaToken]:
+        """Tokens of the source code, shared by the parser and the span extractor."""
+        return tokenize_java(self.class_code)
+
+    @cached_property
+    def tree(self) -> CompilationUnit:
+        """Root node of the Java AST."""
+        return parse_tokens(self.tokens)
+
+    @cached_property
+    def line_offsets(self) -> List[int]:
+        """Offset of the first character of every line (index 0 holds line 1)."""
+        return compute_line_offsets(self.class_code)
+
+    @cached_property
+    def scan(self) -> Optional[ScannedClass]:
+        """Facts found by the structural scanner, or None if javalang is used."""
+        if self.backend != "scanner":
+            return None
+        return scan_java_class(self.class_code, self.tokens, self.line_offsets)
+
+    @cached_property
+    def methods(self) -> Dict[str, Union[MethodDeclaration, ScannedMethod]]:
+        """
+        Method declarations with a body, keyed by method name.
+
+        With the scanner backend, these are `ScannedMethod`s providing `name` and `modifiers`.
+        """
+        if self.scan is not None:
+            return self.scan.methods
+        methods = {}
+        for _, node in self.tree.filter(MethodDeclaration):
+            if node.body is None:
+                continue
+            methods[node.name] = node
+        return methods
+
+    @cached_property
+    def method_spans(self) -> Dict[str, Span]:
+        """Start and end offsets of every method in `methods`, keyed by method name."""
+        if self.scan is not None:
+            return {name: method.span for name, method in self.scan.methods.items()}
+        return {name: self.span_of(method) for name, method in self.methods.items()}
+
+    @cached_property
+    def token_offsets(self) -> List[int]:
+        """Offset of every token in `tokens`."""
+        offsets = self.line_offsets
+        return [offsets[token.position.line - 1] + token.position.column - 1 for token in self.tokens]
+
+    @cached_property
+    def method_fingerprints(self) -> Dict[str, str]:
+        """
+        Hash of the normalized code of every method in `methods`, keyed by method name.
+
+        The hash is computed from the method's token stream, so it does not change with
+        formatting or comments, only with the code itself.
+        """
+        fingerprints = {}
+        token_offsets = self.token_offsets
+        for name, (start, end) in self.method_spans.items():
+            first, last = bisect_left(token_offsets, start), bisect_left(token_offsets, end)
+            digest = hashlib.sha256()
+            for token in self.tokens[first:last]:
+                digest.update(token.value.encode("utf-8"))
+                digest.update(b"\0")
+            fingerprints[name] = digest.hexdigest()
+        return fingerprints
+
+    @cached_property
+    def call_graph(self) -> CallGraph:
+        """Call graph between the methods in `methods`."""
+        return CallGraph(self.methods)
+
+    @cached_property
+    def imports(self) -> str:
+        """All import statements, one per line."""
+        return _find_imports(self.class_code)
+
+    @cached_property
+    def class_definition(self) -> str:
+        """Class header including annotations and extends/implements clauses."""
+        return _find_class_definition(self.class_code)
+
+    @cached_property
+    def class_fields(self) -> str:
+        """Field declarations, one per line."""
+        return _find_class_fields(self.class_code)
+
+    @cached_property
+    def field_names(self) -> Set[str]:
+        """Names of all fields declared in the class."""
+        if self.scan is not None:
+            return self.scan.field_names
+        return {declarator.name for _, node in self.tree.filter(FieldDeclaration)
+                for declarator in node.declarators}
+
+    @cached_property
+    def state_updating_methods(self) -> Set[str]:
+        """Names of methods in `methods` calling a setter or containing an assignment."""
+        if self.scan is not None:
+            return {name for name, method in self.scan.methods.items() if method.updates_state}
+        return {name for name, method in self.methods.items() if _updates_state(method)}
+
+    @cached_property
+    def fields_update_state(self) -> bool:
+        """True if any field initializer calls a setter or contains an assignment."""
+        if self.scan is not None:
+            return self.scan.fields_update_state
+        return any(_updates_state(node) for _, node in self.tree.filter(FieldDeclaration))
+
+    @cached_property
+    def _spans_by_position(self) -> Dict[Position, Span]:
+        methods = [node for _, node in self.tree.filter(MethodDeclaration)]
+        return get_method_spans(self.class_code, methods, self.tokens, self.line_offsets)
+
+    def line_to_offset(self, line: int) -> int:
+        """Return the offset of the first character of a (1-based) line."""
+        return self.line_offsets[line - 1]
+
+    def offset_to_line(self, offset: int) -> int:
+        """Return the (1-based) line containing the given offset."""
+        return bisect_right(self.line_offsets, offset)
+
+    def span_of(self, method: Union[MethodDeclaration, ScannedMethod]) -> Span:
+        """
+        Returns the source span of a method declaration.
+
+        The span starts at the beginning of the line the declaration (including its annotations)
+        starts on and ends right after the closing brace of the method body.
+
+        Parameters
+        ----------
+        method : MethodDeclaration or ScannedMethod
+            The AST node of the method, or the method found by the scanner.
+
+        Returns
+        -------
+        Span
+            Start and end offsets of the method in `class_code`.
+        """
+        if isinstance(method, ScannedMethod):
+            return method.span
+        span = self._spans_by_position.get(method.position)
+        if span is None:
+            span = get_method_spans(self.class_code, [method], self.tokens, self.line_offsets)[method.position]
+            self._spans_by_position[method.position] = span
+        return span
+
+    def method_code(self, method_name: str) -> str:
+        """Return the source code of the method with the given name."""
+        start, end = self.method_spans[method_name]
+        return self.class_code[start:end]
+
+    def code_of(self, method: Union[MethodDeclaration, ScannedMethod]) -> str:
+        """Return the source code of the given method declaration."""
+        start, end = self.span_of(method)
+        return self.class_code[start:end]
+
+
+def get_parser_backend() -> str:
+    """Return the parser backend of chunking, the `JAVA_PARSER` setting (by default `DEFAULT_PARSER_BACKEND`)."""
+    return get_default_settings().get("JAVA_PARSER", DEFAULT_PARSER_BACKEND)
+
+
+def get_class_index(class_code: str, backend: Optional[str] = None) -> ClassIndex:
+    """
+    Returns the (cached) index of a Java class.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    backend : str, optional
+        Parser backend of the index. If omitted, the `JAVA_PARSER` setting is used, see `get_parser_backend`.
+
+    Returns
+    -------
+    ClassIndex
+        The index shared by all callers passing the same source code and backend.
+    """
+    return _get_class_index(class_code, backend or get_parser_backend())
+
+
+@lru_cache(maxsize=16)
+def _get_class_index(class_code: str, backend: str) -> ClassIndex:
+    # keyed on the backend too, so a changed `JAVA_PARSER` setting does not return a stale index
+    return ClassIndex(class_code, backend=backend)
+
+
+def _updates_state(node) -> bool:
+    for _, child in node:
+        if isinstance(child, MethodInvocation) and child.member.startswith("set"):
+            return True
+        if isinstance(child, Assignment):
+            return True
+    return False
+
+
+def _find_imports(class_code: str) -> str:
+    imports = []
+    for line in class_code.splitlines():
+        if line.strip().startswith("import "):
+            imports.append(line.strip())
+    return "\n".join(imports)
+
+
+_CLASS_HEADER_RE = re.compile(r"""
+    (                             # Capture group for the class header
+        (?:\s*@\w+(?:\([^)]*\))?\s*)*               # Annotations (simple, non-nested)
+        (?:public\s+|protected\s+|private\s+|abstract\s+|final\s+|static\s+)*  # Optional modifiers
+        class\s+\w+                                 # 'class' keyword and class name
+        (?:\s*<[^>]+>)?                             # Optional generics
+        (?:\s+extends\s+[^{\n]+)?                    # Optional 'extends' clause
+        (?:\s+implements\s+[^{\n]+)?                 # Optional 'implements' clause
+        \s*                                        # Optional trailing whitespace
+    )
+    (?=\{)                                           # Lookahead for the opening brace
+""", re.VERBOSE | re.DOTALL)
+
+
+def _find_class_definition(class_code: str) -> str:
+    match = _CLASS_HEADER_RE.search(class_code)
+    if match:
+        return match.group(1).strip()
+    return ""
+
+
+_FIELD_RE = re.compile(
+    r"(?P<modifiers>(?:\b(private|protected|public|static|final)\b\s*)+)\s*(?P<type>[\w<>,\s]+)\s+(?P<name>\w+)\s*(?P<init>=\s*[^;]+)?;",
+    re.MULTILINE
+)
+
+
+def _find_class_fields(class_code: str) -> str:
+    fields = []
+    for match in _FIELD_RE.finditer(class_code):
+        field_declaration = f"{match.group('modifiers').strip()} {match.group('type').strip()} {match.group('name').strip()}"
+        if match.group('init'):
+            field_declaration += f" {match.group('init').strip()}"
+        field_declaration += ";"
+        fields.append(field_declaration)
+    return "\n".join(fields)
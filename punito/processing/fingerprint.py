@@ -0,0 +1,102 @@
+import hashlib
+import json
+from typing import Dict, Iterable
+
+from .chunk_cache import MethodIndex
+from .class_index import ClassIndex
+from .preprocessor import ChunkLayout
+
+
+def _class_context(index: ClassIndex) -> str:
+    # every chunk is rendered with the imports, the class header and the fields of its class
+    return "\0".join(" ".join(part.split()) for part in (index.imports, index.class_definition, index.class_fields))
+
+
+def compute_generation_fingerprint(prompt_templates: Iterable[str], generation_params: dict) -> str:
+    """
+    Computes a fingerprint of how tests are generated, independent of the class.
+
+    Tests generated with other prompts or model parameters are not reused even if their
+    chunk is unchanged, so this fingerprint is mixed into every chunk fingerprint.
+
+    Parameters
+    ----------
+    prompt_templates : Iterable[str]
+        Texts of the prompt templates (and the test example) sent with the chunks.
+    generation_params : dict
+        JSON-serializable model and generation parameters, e.g. the model name and the
+        `max_tokens`, `temperature` and `stop` of every step.
+
+    Returns
+    -------
+    str
+        The fingerprint of the generation setup.
+    """
+    digest = hashlib.sha256(json.dumps(generation_params, sort_keys=True, default=str).encode("utf-8"))
+    for template in prompt_templates:
+        digest.update(f"\0{template}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _combine(method_index: MethodIndex, method_names: Iterable[str], context: str) -> str:
+    digest = hashlib.sha256(f"{context}\0\0".encode("utf-8"))
+    for name in sorted(method_names):
+        digest.update(f"{name}:{method_index[name][3]}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compute_chunk_fingerprints(layouts: Dict[str, Dict[str, ChunkLayout]], method_index: MethodIndex,
+                               index: ClassIndex, generation: str = "") -> Dict[str, Dict[str, str]]:
+    """
+    Computes a fingerprint for every chunk from the methods it was built from and the class context.
+
+    The fingerprint of a chunk combines the normalized code hashes of the public method,
+    its direct private dependencies and the transitive private dependencies of the tested
+    method with the imports, the class header and the field declarations, which are rendered
+    into every chunk as well, and with the `generation` fingerprint of the prompts and model
+    parameters. It changes only if one of these changes, so chunks with an unchanged
+    fingerprint do not need new tests.
+
+    Parameters
+    ----------
+    layouts : Dict[str, Dict[str, ChunkLayout]]
+        Chunk layouts as returned by `get_chunk_layouts`.
+    method_index : Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+        Method index of the class, as cached by `ChunkCache`.
+    index : ClassIndex
+        The index of the class, for its imports, header and fields.
+    generation : str, optional
+        Fingerprint of the generation setup, as computed by `compute_generation_fingerprint`.
+
+    Returns
+    -------
+    Dict[str, Dict[str, str]]
+        Mapping of public method name to a mapping of tested method name to fingerprint.
+    """
+    context = f"{_class_context(index)}\0{generation}"
+    return {public_fn: {name: _combine(method_index, set(layout.methods), context) for name, layout in chunks.items()}
+            for public_fn, chunks in layouts.items()}
+
+
+def compute_layout_fingerprint(layout: ChunkLayout, method_index: MethodIndex, index: ClassIndex,
+                               generation: str = "") -> str:
+    """
+    Computes the fingerprint of a single chunk, see `compute_chunk_fingerprints`.
+
+    Parameters
+    ----------
+    layout : ChunkLayout
+        The methods the chunk is built from.
+    method_index : Dict[str, Tuple[Tuple[int, int], List[str], List[str], str]]
+        Method index of the class, as cached by `ChunkCache`.
+    index : ClassIndex
+        The index of the class, for its imports, header and fields.
+    generation : str, optional
+        Fingerprint of the generation setup, as computed by `compute_generation_fingerprint`.
+
+    Returns
+    -------
+    str
+        The fingerprint of the chunk.
+    """
+    return _combine(method_index, set(layout.methods), f"{_class_context(index)}\0{generation}")
@@ -0,0 +1,223 @@
+import math
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from loguru import logger
+
+from .class_index import ClassIndex
+from .preprocessor import ChunkLayout
+
+# Rough average for Java code and English prompts with Llama tokenizers
+CHARS_PER_TOKEN = 3.5
+
+# Packed chunk names are used in file names; neither character can occur in a Java method name
+PART_SEPARATOR = "."
+MERGE_SEPARATOR = "+"
+
+
+def estimate_tokens(text: str, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    """
+    Estimates the number of tokens of a text without running a tokenizer.
+
+    Parameters
+    ----------
+    text : str
+        The text to estimate.
+    chars_per_token : float, optional
+        Average number of characters per token.
+
+    Returns
+    -------
+    int
+        Estimated number of tokens.
+    """
+    return math.ceil(len(text) / chars_per_token)
+
+
+def estimate_layout_tokens(index: ClassIndex, layout: ChunkLayout, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    """
+    Estimates the number of tokens of a rendered chunk from the sizes of its parts, without rendering it.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunk is built from.
+    layout : ChunkLayout
+        The methods the chunk is built from.
+    chars_per_token : float, optional
+        Average number of characters per token.
+
+    Returns
+    -------
+    int
+        Estimated number of tokens of the chunk code.
+    """
+    spans = index.method_spans
+    chars = len(index.imports) + len(index.class_definition) + len(index.class_fields)
+    chars += sum(spans[name][1] - spans[name][0] + 2 for name in layout.methods)
+    return math.ceil(chars / chars_per_token)
+
+
+def _source_order(index: ClassIndex, method_names: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sorted(method_names, key=lambda name: index.method_spans[name]))
+
+
+def _merge(index: ClassIndex, layouts: List[ChunkLayout]) -> ChunkLayout:
+    context = layouts[0].context
+    if all(layout.extra is None for layout in layouts):
+        return ChunkLayout(context)
+    extra = {name for layout in layouts for name in layout.extra or ()} - set(context)
+    return ChunkLayout(context, _source_order(index, extra))
+
+
+def _split(index: ClassIndex, name: str, layout: ChunkLayout, budget: int) -> List[Tuple[str, ChunkLayout]]:
+    if estimate_layout_tokens(index, layout) <= budget or not layout.extra or len(layout.extra) < 2:
+        return [(name, layout)]
+
+    parts: List[List[str]] = [[]]
+    for method in layout.extra:
+        candidate = ChunkLayout(layout.context, tuple(parts[-1] + [method]))
+        if parts[-1] and estimate_layout_tokens(index, candidate) > budget:
+            parts.append([])
+        parts[-1].append(method)
+
+    if len(parts) == 1:
+        return [(name, layout)]
+    return [(f"{name}{PART_SEPARATOR}part{i}", ChunkLayout(layout.context, tuple(part))) for i, part in enumerate(parts, 1)]
+
+
+def _pack(index: ClassIndex, chunks: Dict[str, ChunkLayout], budget: int) -> Dict[str, ChunkLayout]:
+    pieces = [piece for name, layout in chunks.items() for piece in _split(index, name, layout, budget)]
+
+    groups: List[List[Tuple[str, ChunkLayout]]] = []
+    for name, layout in pieces:
+        if groups:
+            candidate = _merge(index, [piece for _, piece in groups[-1]] + [layout])
+            if estimate_layout_tokens(index, candidate) <= budget:
+                groups[-1].append((name, layout))
+                continue
+        groups.append([(name, layout)])
+
+    return {MERGE_SEPARATOR.join(name for name, _ in group): _merge(index, [layout for _, layout in group]) for group in groups}
+
+
+def pack_layouts(index: ClassIndex, layouts: Dict[str, Dict[str, ChunkLayout]], target_tokens: int,
+                 overhead_tokens: int = 0) -> Dict[str, Dict[str, ChunkLayout]]:
+    """
+    Packs chunks into as few LLM requests as fit into a target token window.
+
+    Chunks whose prompt would exceed the window are split into parts, each keeping the public
+    method context and a subset of the transitive dependencies. Then, sibling chunks of the same
+    public method are merged (in order) as long as the merged prompt still fits. A part is named
+    after its tested method with a ".part<i>" suffix, and a merged chunk after all its parts,
+    joined by "+", so that names stay usable in file names. Use `chunk_method_names` to get the
+    tested methods of a packed chunk.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunks are built from.
+    layouts : Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+    target_tokens : int
+        Target size of a prompt in tokens.
+    overhead_tokens : int, optional
+        Tokens of the prompt that do not depend on the chunk (prompt template, test example).
+
+    Returns
+    -------
+    Dict[str, Dict[str, ChunkLayout]]
+        Packed layouts, in the same structure as `layouts`.
+    """
+    items = ((public_fn, name, layout) for public_fn, chunks in layouts.items() for name, layout in chunks.items())
+    packed = {}
+    for public_fn, name, layout in iter_packed_layouts(index, items, target_tokens, overhead_tokens):
+        packed.setdefault(public_fn, {})[name] = layout
+    return packed
+
+
+def iter_packed_layouts(index: ClassIndex, layouts: Iterable[Tuple[str, str, ChunkLayout]], target_tokens: int,
+                        overhead_tokens: int = 0) -> Iterator[Tuple[str, str, ChunkLayout]]:
+    """
+    Streaming variant of `pack_layouts`.
+
+    Chunks are packed per public method, so the packed chunks of a public method are yielded
+    as soon as its last chunk arrives. The input has to be grouped by public method,
+    as yielded by `iter_chunk_layouts`.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunks are built from.
+    layouts : Iterable[Tuple[str, str, ChunkLayout]]
+        Public method name, tested method name and chunk layout of every chunk.
+    target_tokens : int
+        Target size of a prompt in tokens.
+    overhead_tokens : int, optional
+        Tokens of the prompt that do not depend on the chunk (prompt template, test example).
+
+    Yields
+    ------
+    Tuple[str, str, ChunkLayout]
+        Public method name, packed chunk name and chunk layout.
+    """
+    budget = target_tokens - overhead_tokens
+    if budget <= 0:
+        logger.warning(f"Prompt overhead ({overhead_tokens} tokens) exceeds the target window "
+                       f"({target_tokens} tokens), chunks are not packed")
+        yield from layouts
+        return
+
+    before = after = 0
+    for public_fn, group in groupby(layouts, key=itemgetter(0)):
+        chunks = {name: layout for _, name, layout in group}
+        packed = _pack(index, chunks, budget)
+        before += len(chunks)
+        after += len(packed)
+        for name, layout in packed.items():
+            yield public_fn, name, layout
+
+    logger.info(f"Packed {before} chunks into {after} requests (target window: {target_tokens} tokens)")
+
+
+def chunk_method_names(name: str) -> List[str]:
+    """
+    Returns the tested methods of a (possibly packed) chunk from its name.
+
+    Parameters
+    ----------
+    name : str
+        The chunk name, as yielded by `iter_packed_layouts`.
+
+    Returns
+    -------
+    List[str]
+        Names of the tested methods, in chunk order and without duplicates.
+    """
+    names = (part.split(PART_SEPARATOR, 1)[0] for part in name.split(MERGE_SEPARATOR))
+    return list(dict.fromkeys(names))
+
+
+def iter_prefix_ordered_layouts(layouts: Iterable[Tuple[str, str, ChunkLayout]]) -> Iterator[Tuple[str, str, ChunkLayout]]:
+    """
+    Orders the chunks of every public method so that chunks sharing a prefix are adjacent.
+
+    The chunks of a public method share the class header and the method with its direct
+    dependencies and differ only in the transitive dependencies (`extra`) that follow them.
+    Sorting by those dependencies puts chunks starting with the same ones next to each other,
+    so their prompts reach a prefix-caching server back-to-back. The input has to be grouped
+    by public method, as yielded by `iter_chunk_layouts`; groups are yielded as they complete.
+
+    Parameters
+    ----------
+    layouts : Iterable[Tuple[str, str, ChunkLayout]]
+        Public method name, tested method name and chunk layout of every chunk.
+
+    Yields
+    ------
+    Tuple[str, str, ChunkLayout]
+        The same chunks, ordered by shared prefix within each public method.
+    """
+    for _, group in groupby(layouts, key=itemgetter(0)):
+        yield from sorted(group, key=lambda item: (item[2].context, item[2].extra or ()))
@@ -5,6 +5,8 @@ from collections import defaultdict
 from typing import List, Dict
 from loguru import logger
 
+from .spans import tokenize_java, parse_tokens, get_method_spans, expand_to_lines, compute_line_offsets
+
 def collect_class_tests(chunks: List[str], class_name: str) -> str:
     imports_set = set()
     test_methods = []
@@ -18,7 +20,8 @@ def collect_class_tests(chunks: List[str], class_name: str) -> str:
         chunk = re.sub(r'^```java\n|```$', '', chunk.strip())
         lines = chunk.splitlines()
         # TODO handle parsing error - prompt to fix compilation for chunk
-        tree = javalang.parse.parse(chunk)
+        tokens = tokenize_java(chunk)
+        tree = parse_tokens(tokens)
 
         # Collect imports
         for imp in tree.imports:
@@ -39,7 +42,9 @@ def collect_class_tests(chunks: List[str], class_name: str) -> str:
                     ann_str = "@" + annotation.name
                     if annotation.element:
                         # Handle annotations with parameters like @RunWith(SomeClass.class)
-                        element_str = chunk[annotation.position.offset:].split('\n', 1)[0].strip()
+                        line_offsets = compute_line_offsets(chunk)
+                        offset = line_offsets[annotation.position.line - 1] + annotation.position.column - 1
+                        element_str = chunk[offset:].split('\n', 1)[0].strip()
                         ann_str = element_str
                     class_annotations.append(ann_str)
 
@@ -64,19 +69,10 @@ def collect_class_tests(chunks: List[str], class_name: str) -> str:
                         mock_fields[declarator.name] = full_field
 
             # Extract methods
+            method_spans = get_method_spans(chunk, class_node.methods, tokens)
             for method in class_node.methods:
-                start_line = method.position.line - 1
-                brace_count = 0
-                end_line = start_line
-
-                for idx in range(start_line, len(lines)):
-                    brace_count += lines[idx].count('{') - lines[idx].count('}')
-                    if brace_count == 0 and idx != start_line:
-                        end_line = idx
-                        break
-
-                method_lines = lines[start_line:end_line + 1]
-                method_str = '\n'.join(method_lines)
+                start, end = method_spans[method.position]
+                method_str = chunk[start:end]
 
                 if method.modifiers and "private" in method.modifiers:
                     util_methods.append(method_str)
@@ -110,22 +106,17 @@ def extract_method_name(test_code: str) -> str:
     return "<unknown>"
 
 def extract_test_blocks(java_code: str) -> List[str]:
-    tree = javalang.parse.parse(java_code)
+    tokens = tokenize_java(java_code)
+    tree = parse_tokens(tokens)
+    # Include methods with @Test annotation or whose name starts with 'should'
+    methods = [node for _, node in tree.filter(javalang.tree.MethodDeclaration)
+               if node.annotations or node.name.startswith("should")]
+    method_spans = get_method_spans(java_code, methods, tokens)
+
     test_methods = []
-    for _, node in tree:
-        # Include methods with @Test annotation or whose name starts with 'should'
-        if (isinstance(node, javalang.tree.MethodDeclaration) and
-            (node.annotations or node.name.startswith("should"))):
-            start_line = node.position.line - 1
-            all_lines = java_code.splitlines()[start_line:]
-            method_code, brace_count = [], 0
-            for line in all_lines:
-                method_code.append(line)
-                brace_count += line.count('{')
-                brace_count -= line.count('}')
-                if brace_count <= 0:
-                    break
-            test_methods.append("\n".join(method_code))
+    for method in methods:
+        start, end = method_spans[method.position]
+        test_methods.append(java_code[start:end])
     return test_methods
 
 def extract_given_then_blocks(test_code: str):
@@ -204,30 +195,18 @@ def remove_duplicate_tests(tests_code: str) -> str:
 
     duplicate_method_names = {dup for group in duplicates for dup in group["duplicates"]}
 
-    tree = javalang.parse.parse(tests_code)
-    lines = tests_code.splitlines()
-    method_ranges = []
-
-    # Determine start and end lines of each method
-    for _, node in tree:
-        if isinstance(node, javalang.tree.MethodDeclaration):
-            method_name = node.name
-            if method_name in duplicate_method_names:
-                start_line = node.position.line - 1
-                # Extract method by counting braces
-                method_code, brace_count = [], 0
-                for idx in range(start_line, len(lines)):
-                    method_code.append(lines[idx])
-                    brace_count += lines[idx].count('{')
-                    brace_count -= lines[idx].count('}')
-                    if brace_count <= 0:
-                        end_line = idx
-                        method_ranges.append((start_line, end_line))
-                        break
-
-    # Remove duplicates in reverse order (to preserve indices)
-    for start, end in sorted(method_ranges, reverse=True):
-        del lines[start:end + 1]
-
-    return "\n".join(lines)
+    tokens = tokenize_java(tests_code)
+    tree = parse_tokens(tokens)
+    duplicate_methods = [node for _, node in tree.filter(javalang.tree.MethodDeclaration)
+                         if node.name in duplicate_method_names]
+    method_spans = get_method_spans(tests_code, duplicate_methods, tokens)
+
+    # Keep the text between the (whole-line) spans of duplicates
+    kept, last = [], 0
+    for start, end in sorted(expand_to_lines(tests_code, span) for span in method_spans.values()):
+        kept.append(tests_code[last:start])
+        last = end
+    kept.append(tests_code[last:])
+
+    return "".join(kept).rstrip("\n")
 
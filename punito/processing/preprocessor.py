@@ -1,10 +1,14 @@
 import javalang
 import re
-from typing import Set, Dict
-from javalang.tree import CompilationUnit, MethodDeclaration, MethodInvocation, FieldDeclaration, ClassDeclaration
+from typing import Callable, Set, Dict, Iterator, NamedTuple, Optional, Tuple, Union
+from javalang.tree import CompilationUnit, MethodDeclaration, MethodInvocation
 
+from .call_graph import CallGraph
+from .class_index import DEFAULT_PARSER_BACKEND, PARSER_BACKENDS, ClassIndex, get_class_index
+from .scanner import ScannedClass, ScannedMethod, scan_java_class
 
-def parse_java_class(class_code: str) -> CompilationUnit:
+
+def parse_java_class(class_code: str, backend: str = DEFAULT_PARSER_BACKEND) -> Union[CompilationUnit, ScannedClass]:
     """
     Parses Java source code into an abstract syntax tree (AST).
 
@@ -12,12 +16,22 @@ def parse_java_class(class_code: str) -> CompilationUnit:
     ----------
     class_code : str
         The Java source code as a string.
+    backend : str, optional
+        "javalang" (default, as for `ClassIndex`) for the full AST, or "scanner" for the facts needed
+        for chunking only, see `scan_java_class`. The scanner falls back to the AST if it is unsure
+        about the class.
 
     Returns
     -------
-    CompilationUnit
-        The root node of the Java AST.
+    CompilationUnit or ScannedClass
+        The root node of the Java AST, or the scanned class.
     """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Invalid parser backend: {backend}. Expected one of {PARSER_BACKENDS}.")
+    if backend == "scanner":
+        scanned = scan_java_class(class_code)
+        if scanned is not None:
+            return scanned
     return javalang.parse.parse(class_code)
 
 def get_class_definition(class_code: str) -> str:
@@ -34,36 +48,7 @@ def get_class_definition(class_code: str) -> str:
     str
         The class definition block as a string. Includes annotations and extends/implements clauses.
     """
-    # Regex pattern for annotations and class header up to the opening brace.
-    pattern_header = r"""
-        (?P<header>
-            (?:\s*@\w+(?:\([^)]*\))?\s*)*                   # Annotations (simple, non-nested parameters)
-            (?:public\s+|protected\s+|private\s+|abstract\s+|final\s+|static\s+)*  # Optional modifiers
-            class\s+\w+                                     # 'class' keyword and class name
-            (?:\s*<[^>]+>)?                                 # Optional generics
-            (?:\s+extends\s+[^{]+)?                         # Optional 'extends' clause
-            (?:\s+implements\s+[^{]+)?                      # Optional 'implements' clause
-            \s*                                            # Optional whitespace
-            \{                                             # Opening brace of the class body
-        )
-    """
-    pattern_header = r"""
-        (                             # Capture group for the class header
-            (?:\s*@\w+(?:\([^)]*\))?\s*)*               # Annotations (simple, non-nested)
-            (?:public\s+|protected\s+|private\s+|abstract\s+|final\s+|static\s+)*  # Optional modifiers
-            class\s+\w+                                 # 'class' keyword and class name
-            (?:\s*<[^>]+>)?                             # Optional generics
-            (?:\s+extends\s+[^{\n]+)?                    # Optional 'extends' clause
-            (?:\s+implements\s+[^{\n]+)?                 # Optional 'implements' clause
-            \s*                                        # Optional trailing whitespace
-        )
-        (?=\{)                                           # Lookahead for the opening brace
-    """
-    header_re = re.compile(pattern_header, re.VERBOSE | re.DOTALL)
-    match = header_re.search(class_code)
-    if match:
-        return match.group(1).strip()
-    return ""
+    return get_class_index(class_code).class_definition
 
 
 def get_class_fields(class_code: str) -> str:
@@ -80,34 +65,25 @@ def get_class_fields(class_code: str) -> str:
     str
         A string containing all field declarations, formatted correctly with initial values.
     """
-    pattern = r"(?P<modifiers>(?:\b(private|protected|public|static|final)\b\s*)+)\s*(?P<type>[\w<>,\s]+)\s+(?P<name>\w+)\s*(?P<init>=\s*[^;]+)?;"
-    matches = re.finditer(pattern, class_code, re.MULTILINE)
-
-    fields = []
-    for match in matches:
-        field_declaration = f"{match.group('modifiers').strip()} {match.group('type').strip()} {match.group('name').strip()}"
-        if match.group('init'):
-            field_declaration += f" {match.group('init').strip()}"
-        field_declaration += ";"
-        fields.append(field_declaration)
+    return get_class_index(class_code).class_fields
 
-    return "\n".join(fields)
 
-
-def get_all_methods(tree: CompilationUnit) -> Dict[str, MethodDeclaration]:
+def get_all_methods(tree: Union[CompilationUnit, ScannedClass]) -> Dict[str, Union[MethodDeclaration, ScannedMethod]]:
     """
     Retrieves all method declarations from a Java AST.
 
     Parameters
     ----------
-    tree : CompilationUnit
-        The root node of the Java AST.
+    tree : CompilationUnit or ScannedClass
+        The root node of the Java AST, or a class scanned by `parse_java_class`.
 
     Returns
     -------
-    Dict[str, MethodDeclaration]
-        A dictionary mapping method names to their corresponding AST nodes.
+    Dict[str, MethodDeclaration or ScannedMethod]
+        A dictionary mapping method names to their corresponding AST nodes (or scanned methods).
     """
+    if isinstance(tree, ScannedClass):
+        return dict(tree.methods)
     methods = {}
     for _, node in tree.filter(MethodDeclaration):
         if node.body is None:
@@ -116,7 +92,7 @@ def get_all_methods(tree: CompilationUnit) -> Dict[str, MethodDeclaration]:
     return methods
 
 
-def get_method_calls(method_name: str, all_methods) -> Set[str]:
+def get_method_calls(method_name: str, all_methods, call_graph: Optional[CallGraph] = None) -> Set[str]:
     """
     Identifies all method calls within a given method declaration.
 
@@ -126,12 +102,16 @@ def get_method_calls(method_name: str, all_methods) -> Set[str]:
         The name of AST node representing the method.
     all_methods : Dict[str, MethodDeclaration]
         A dictionary of all available methods.
+    call_graph : CallGraph, optional
+        Precomputed call graph of `all_methods`. If given, the method's AST is not walked again.
 
     Returns
     -------
     Set[str]
         A set of names of methods invoked within the given method.
     """
+    if call_graph is not None:
+        return set(call_graph.calls[method_name])
 
     method = all_methods[method_name]
     method_names = all_methods.keys()
@@ -159,24 +139,7 @@ def extract_method_code(class_code: str, method: MethodDeclaration) -> str:
     str
         The source code of the specified method.
     """
-    lines = class_code.splitlines()
-    start_pos = method.position.line - 1
-
-    bracket_count = 0
-    method_started = False
-    method_code = []
-
-    for line in lines[start_pos:]:
-        method_code.append(line)
-        bracket_count += line.count("{") - line.count("}")
-
-        if '{' in line:
-            method_started = True
-
-        if method_started and bracket_count == 0:
-            break
-
-    return "\n".join(method_code)
+    return get_class_index(class_code).code_of(method)
 
 
 def extract_imports(class_code: str) -> str:
@@ -193,14 +156,7 @@ def extract_imports(class_code: str) -> str:
     str
         All import statements concatenated into a single string.
     """
-    imports = []
-    lines = class_code.splitlines()
-
-    for line in lines:
-        if line.strip().startswith("import "):
-            imports.append(line.strip())
-
-    return "\n".join(imports)
+    return get_class_index(class_code).imports
 
 
 def is_public_method(method: MethodDeclaration) -> bool:
@@ -220,7 +176,8 @@ def is_public_method(method: MethodDeclaration) -> bool:
     return "public" in method.modifiers
 
 
-def get_dependencies(method_name: str, all_methods: Dict[str, MethodDeclaration], deps: Set[str]) -> None:
+def get_dependencies(method_name: str, all_methods: Dict[str, MethodDeclaration], deps: Set[str],
+                     call_graph: Optional[CallGraph] = None) -> None:
     """
     Recursively collects all methods that a given method depends on.
 
@@ -232,11 +189,19 @@ def get_dependencies(method_name: str, all_methods: Dict[str, MethodDeclaration]
         A dictionary of all available methods.
     deps : Set[str]
         A set to store collected dependencies.
+    call_graph : CallGraph, optional
+        Precomputed call graph of `all_methods`. If given, the memoized closure is used
+        instead of walking the dependencies again.
 
     Returns
     -------
     None
     """
+    if call_graph is not None:
+        if method_name not in deps:
+            deps.update(call_graph.private_closure(method_name))
+        return
+
     if (method_name not in all_methods
             or method_name in deps
             or is_public_method(all_methods[method_name])):
@@ -276,7 +241,7 @@ def is_pure_getter_or_setter(method_code: str, class_fields: set) -> bool:
 
 def get_function_with_individual_dependencies(class_code: str, target_method_name: str,
                                               all_methods: Dict[str, MethodDeclaration],
-                                              extracted_methods: Set[str]) -> Dict[str, str]:
+                                              extracted_methods: Optional[Set[str]] = None) -> Dict[str, str]:
     """
     Generates separate code blocks for each direct dependency of a target method, including imports,
     the target method, and nested dependencies.
@@ -289,7 +254,7 @@ def get_function_with_individual_dependencies(class_code: str, target_method_nam
         The name of the target method.
     all_methods : Dict[str, MethodDeclaration]
         A dictionary mapping method names to their corresponding AST nodes.
-    extracted_methods : Set[str]
+    extracted_methods : Set[str], optional
         A set to store the names of all already extracted methods.
 
     Returns
@@ -299,46 +264,119 @@ def get_function_with_individual_dependencies(class_code: str, target_method_nam
         the source code block containing the dependency, its nested dependencies, imports,
         and the target method.
     """
-    imports = extract_imports(class_code)
-    class_definition = get_class_definition(class_code)
-    class_fields = get_class_fields(class_code)
-    target_calls = get_method_calls(target_method_name, all_methods)
+    if extracted_methods is None:
+        extracted_methods = set()
 
-    dependency_blocks = {}
-    target_method_code = extract_method_code(class_code, all_methods[target_method_name])
+    index = get_class_index(class_code)
+    # methods parsed by the caller from the same code share the precomputed call graph of the index
+    call_graph = index.call_graph if all_methods.keys() == index.methods.keys() else CallGraph(all_methods)
 
-    direct_deps = [method for method in target_calls if not is_public_method(all_methods[method])]
+    return _get_dependency_blocks(index, target_method_name, all_methods, extracted_methods, call_graph)
 
-    direct_dep_code = [extract_method_code(class_code, all_methods[method])
-                    for method in direct_deps]
 
-    basic_context_code = f"{imports}\n\n{class_definition}\n{class_fields}\n\n{target_method_code}\n\n" + "\n\n".join(
-            direct_dep_code)
+class ChunkLayout(NamedTuple):
+    """
+    Methods a chunk is built from.
+
+    Attributes
+    ----------
+    context : Tuple[str, ...]
+        The target method followed by its direct private dependencies.
+    extra : Tuple[str, ...] or None
+        Transitive dependencies of the tested method, or None for the chunk of the target method itself.
+    """
+    context: Tuple[str, ...]
+    extra: Optional[Tuple[str, ...]] = None
+
+    @property
+    def methods(self) -> Tuple[str, ...]:
+        return self.context + (self.extra or ())
+
+
+def _get_dependency_layouts(index: ClassIndex, target_method_name: str,
+                            all_methods: Dict[str, MethodDeclaration],
+                            extracted_methods: Set[str], call_graph: CallGraph) -> Dict[str, ChunkLayout]:
+    target_calls = _in_source_order(index, all_methods, call_graph.calls[target_method_name])
+    direct_deps = [method for method in target_calls if not is_public_method(all_methods[method])]
 
-    dependency_blocks[
-        target_method_name] = basic_context_code
+    context = (target_method_name, *direct_deps)
+    layouts = {target_method_name: ChunkLayout(context)}
 
-    for dep in target_calls:
-        method = all_methods[dep]
-        if is_public_method(method) or dep in extracted_methods:
+    for dep in direct_deps:
+        if dep in extracted_methods:
             continue
 
         extracted_methods.add(dep)
 
-        collected_methods = set()
-        get_dependencies(dep, all_methods, collected_methods)
-
         # remove direct dependency, because it was already extracted
-        collected_methods.discard(dep)
+        collected_methods = call_graph.private_closure(dep) - {dep}
 
-        methods_code = [extract_method_code(class_code, all_methods[method])
-                        for method in collected_methods]
+        layouts[dep] = ChunkLayout(context, tuple(_in_source_order(index, all_methods, collected_methods)))
 
-        full_code = f"{basic_context_code}\n\n" + "\n\n".join(methods_code)
+    return layouts
 
-        dependency_blocks[dep] = full_code
 
-    return dependency_blocks
+def render_chunk(index: ClassIndex, layout: ChunkLayout, method_code: Optional[Callable[[str], str]] = None) -> str:
+    """
+    Renders the code of a chunk: imports, class header, fields, the context methods and the extra methods.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunk was built from.
+    layout : ChunkLayout
+        The methods the chunk is built from.
+    method_code : Callable[[str], str], optional
+        Returns the code of a method by name, by default `index.method_code`.
+
+    Returns
+    -------
+    str
+        The code of the chunk.
+    """
+    method_code = method_code or index.method_code
+    target_method_name, *direct_deps = layout.context
+    direct_dep_code = [method_code(method) for method in direct_deps]
+
+    code = (f"{index.imports}\n\n{index.class_definition}\n{index.class_fields}\n\n"
+            f"{method_code(target_method_name)}\n\n" + "\n\n".join(direct_dep_code))
+
+    if layout.extra is not None:
+        code += "\n\n" + "\n\n".join(method_code(method) for method in layout.extra)
+
+    return code
+
+
+def render_chunks(index: ClassIndex, layouts: Dict[str, Dict[str, ChunkLayout]]) -> Dict[str, Dict[str, str]]:
+    """
+    Renders the code of all chunks of a class.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunks were built from.
+    layouts : Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+
+    Returns
+    -------
+    Dict[str, Dict[str, str]]
+        Mapping of public method name to a mapping of tested method name to chunk code.
+    """
+    return {public_fn: {name: render_chunk(index, layout) for name, layout in chunks.items()}
+            for public_fn, chunks in layouts.items()}
+
+
+def _get_dependency_blocks(index: ClassIndex, target_method_name: str,
+                           all_methods: Dict[str, MethodDeclaration],
+                           extracted_methods: Set[str], call_graph: CallGraph) -> Dict[str, str]:
+    layouts = _get_dependency_layouts(index, target_method_name, all_methods, extracted_methods, call_graph)
+    method_code = lambda name: index.code_of(all_methods[name])
+    return {name: render_chunk(index, layout, method_code) for name, layout in layouts.items()}
+
+
+def _in_source_order(index: ClassIndex, all_methods: Dict[str, MethodDeclaration], method_names) -> list:
+    return sorted(method_names, key=lambda name: index.span_of(all_methods[name]))
 
 
 # Utility function to determine if a method only calls public methods and does nothing else
@@ -379,28 +417,143 @@ def filter_chunks(chunks: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]
 
     return filtered_chunks
 
-def get_chunked_code(class_code: str) -> Dict[str, Dict[str, str]]:
-    tree = parse_java_class(class_code)
-    all_methods = get_all_methods(tree)
 
-    parsed_class = parse_java_class(class_code)
-    # TODO integrate with get_class_fields
-    fields = {declarator.name for _, node in parsed_class.filter(FieldDeclaration)
-              for declarator in node.declarators}
+def is_removable_layout(index: ClassIndex, layout: ChunkLayout) -> bool:
+    """
+    Checks if a chunk only delegates, using the per-method flags of the class index.
+
+    Applies the same rule as `is_removable` to the methods of the chunk, without parsing the chunk again.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunk was built from.
+    layout : ChunkLayout
+        The methods the chunk is built from.
 
-    # List of public methods that are not pure getters or setters
-    public_methods = [
+    Returns
+    -------
+    bool
+        True if no method of the chunk (and no field initializer) calls a setter or assigns a value.
+    """
+    if index.fields_update_state:
+        return False
+    state_updating = index.state_updating_methods
+    return not any(method in state_updating for method in layout.methods)
+
+
+def get_tested_public_methods(index: ClassIndex) -> list:
+    """
+    Returns the public methods of a class that get tests, i.e. all public methods except pure getters and setters.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class.
+
+    Returns
+    -------
+    list
+        Names of the public methods in declaration order.
+    """
+    fields = index.field_names
+    return [
         method_name
-        for method_name, method in all_methods.items()
+        for method_name, method in index.methods.items()
         if "public" in method.modifiers
-           and not is_pure_getter_or_setter(
-            extract_method_code(class_code, all_methods[method_name]),
-            fields
-        )
+           and not is_pure_getter_or_setter(index.method_code(method_name), fields)
     ]
 
+
+def get_chunk_layouts(class_code: str, prune: bool = False) -> Dict[str, Dict[str, ChunkLayout]]:
+    """
+    Determines the methods of every chunk of a Java class, one chunk per private dependency of every public method.
+
+    Public pure getters and setters get no chunks. With `prune`, chunks that only delegate (see `is_removable`)
+    are dropped using per-method flags of the class index.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    prune : bool, optional
+        Whether to drop chunks that call no setter and assign nothing, by default False. Such chunks
+        may still compute and return values, so pruning them can leave methods without tests.
+
+    Returns
+    -------
+    Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+    """
+    chunk_layouts = {}
+    for public_fn, name, layout in iter_chunk_layouts(class_code, prune):
+        chunk_layouts.setdefault(public_fn, {})[name] = layout
+    return chunk_layouts
+
+
+def iter_chunk_layouts(class_code: str, prune: bool = False) -> Iterator[Tuple[str, str, ChunkLayout]]:
+    """
+    Streaming variant of `get_chunk_layouts`, yielding every chunk as soon as it is determined and filtered.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    prune : bool, optional
+        Whether to drop chunks that only delegate, by default False.
+
+    Yields
+    ------
+    Tuple[str, str, ChunkLayout]
+        Public method name, tested method name and chunk layout, grouped by public method
+        in declaration order.
+    """
+    index = get_class_index(class_code)
+    all_methods = index.methods
+
     extracted_methods = set()
-    chunked_code = {method: get_function_with_individual_dependencies(class_code, method, all_methods, extracted_methods)
-            for method in public_methods}
+    for method in get_tested_public_methods(index):
+        layouts = _get_dependency_layouts(index, method, all_methods, extracted_methods, index.call_graph)
+        for name, layout in layouts.items():
+            if not (prune and is_removable_layout(index, layout)):
+                yield method, name, layout
 
-    return filter_chunks(chunked_code)
+
+def get_chunked_code(class_code: str, prune: bool = False) -> Dict[str, Dict[str, str]]:
+    """
+    Splits a Java class into chunks of code, one per private dependency of every public method.
+
+    The class is parsed and indexed only once; all chunks are cut out of the shared `ClassIndex`.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    prune : bool, optional
+        Whether to drop chunks that only delegate, see `get_chunk_layouts`. By default False.
+
+    Returns
+    -------
+    Dict[str, Dict[str, str]]
+        Mapping of public method name to a mapping of tested method name to chunk code.
+    """
+    return render_chunks(get_class_index(class_code), get_chunk_layouts(class_code, prune))
+
+
+def iter_chunked_code(class_code: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Streaming variant of `get_chunked_code`, yielding every chunk as soon as it is built.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+
+    Yields
+    ------
+    Tuple[str, str, str]
+        Public method name, tested method name and chunk code.
+    """
+    index = get_class_index(class_code)
+    for public_fn, name, layout in iter_chunk_layouts(class_code):
+        yield public_fn, name, render_chunk(index, layout)
@@ -0,0 +1,365 @@
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+from javalang.tokenizer import Annotation, BasicType, Identifier, JavaToken, Keyword, Modifier, Operator, Separator
+from loguru import logger
+
+from .spans import Span, _offset, compute_line_offsets, tokenize_java
+
+_TYPE_KEYWORDS = frozenset(("class", "interface", "enum"))
+_COMPOUND_ASSIGNMENTS = frozenset(("+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "<<=", ">>=", ">>>="))
+
+
+class ScannedMethod(NamedTuple):
+    """
+    Facts about a method declaration found by the structural scanner.
+
+    Provides `name` and `modifiers` like a javalang `MethodDeclaration`, so it can be used
+    in its place wherever only those are needed.
+
+    Attributes
+    ----------
+    name : str
+        Name of the method.
+    modifiers : Set[str]
+        Modifiers of the method, e.g. "public" or "static".
+    span : Span
+        Start and end offsets, as computed by `get_method_spans`.
+    calls : FrozenSet[str]
+        Names of all methods invoked in the body (`super` invocations excluded).
+    updates_state : bool
+        True if the body calls a setter or contains an assignment.
+    """
+    name: str
+    modifiers: Set[str]
+    span: Span
+    calls: FrozenSet[str]
+    updates_state: bool
+
+
+class ScannedClass(NamedTuple):
+    """
+    Facts about a Java class found by the structural scanner.
+
+    Attributes
+    ----------
+    name : str
+        Name of the class.
+    methods : Dict[str, ScannedMethod]
+        Methods with a body, keyed by name. Of overloaded methods, the last one is kept.
+    field_names : Set[str]
+        Names of all fields.
+    fields_update_state : bool
+        True if any field initializer calls a setter or contains an assignment.
+    """
+    name: str
+    methods: Dict[str, ScannedMethod]
+    field_names: Set[str]
+    fields_update_state: bool
+
+
+class _Unsure(Exception):
+    pass
+
+
+class _Scanner:
+    """Single pass over the tokens of a class, reproducing the facts javalang would give for them."""
+
+    def __init__(self, class_code: str, tokens: List[JavaToken], line_offsets: List[int]):
+        self.tokens = tokens
+        self.values = [token.value for token in tokens]
+        self.line_offsets = line_offsets
+        self.class_name = ""
+        self.methods: Dict[str, ScannedMethod] = {}
+        self.field_names: Set[str] = set()
+        self.fields_update_state = False
+
+    def value(self, i: int) -> str:
+        return self.values[i] if 0 <= i < len(self.values) else ""
+
+    def scan(self) -> ScannedClass:
+        self.class_name, i = self._skip_to_class_body()
+        i = self._scan_class_body(i)
+        if any(value != ";" for value in self.values[i:]):
+            raise _Unsure("more than one top-level type")
+        return ScannedClass(self.class_name, self.methods, self.field_names, self.fields_update_state)
+
+    def _skip_to_class_body(self) -> Tuple[str, int]:
+        values, tokens = self.values, self.tokens
+        for i, token in enumerate(tokens):
+            if not isinstance(token, Keyword) or self.value(i - 1) == ".":
+                continue
+            if token.value in ("interface", "enum"):
+                raise _Unsure(f"top-level {token.value}")
+            if token.value == "class":
+                if not isinstance(tokens[i + 1], Identifier):
+                    raise _Unsure("unnamed class")
+                body = values.index("{", i)
+                return values[i + 1], body + 1
+        raise _Unsure("no class declaration")
+
+    def _skip_annotation(self, i: int) -> int:
+        # i points at "@"
+        if self.value(i + 1) == "interface":
+            raise _Unsure("annotation type declaration")
+        i += 2
+        while self.value(i) == "." and isinstance(self.tokens[i + 1], Identifier):
+            i += 2
+        if self.value(i) == "(":
+            i = self._skip_parens(i)
+        return i
+
+    def _skip_parens(self, i: int) -> int:
+        # i points at "(", returns the index after the matching ")"
+        depth = 0
+        for j in range(i, len(self.values)):
+            value = self.values[j]
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+        raise _Unsure("unbalanced parentheses")
+
+    def _scan_class_body(self, i: int) -> int:
+        values = self.values
+        while i < len(values):
+            value = values[i]
+            if value == "}":
+                return i + 1
+            if value == ";":
+                i += 1
+            elif value == "{" or (value == "static" and self.value(i + 1) == "{"):
+                # initializer block
+                i = self._scan_code(i if value == "{" else i + 1, block=True)[0]
+            else:
+                i = self._scan_member(i)
+        raise _Unsure("unterminated class body")
+
+    def _scan_member(self, i: int) -> int:
+        tokens, values = self.tokens, self.values
+        annotation_positions = []
+        modifiers = set()
+        while True:
+            token = tokens[i]
+            if isinstance(token, Annotation):
+                annotation_positions.append(token.position)
+                i = self._skip_annotation(i)
+            elif isinstance(token, Modifier):
+                modifiers.add(token.value)
+                i += 1
+            else:
+                break
+
+        first = i
+        if values[first] in _TYPE_KEYWORDS or (values[first] == "record" and isinstance(tokens[first + 1], Identifier)
+                                               and self.value(first + 2) in ("(", "<")):
+            raise _Unsure(f"nested {values[first]}")
+
+        # header up to the parameters, the first declarator or the end of the member
+        angle = 0
+        while i < len(values):
+            token, value = tokens[i], values[i]
+            if isinstance(token, Annotation):
+                i = self._skip_annotation(i)
+                continue
+            if value == "<":
+                angle += 1
+            elif value == ">":
+                angle -= 1
+            elif angle == 0 and value in ("(", "=", ";", ",", "{"):
+                break
+            i += 1
+        else:
+            raise _Unsure("unterminated member declaration")
+
+        if i - 1 < first or not isinstance(tokens[i - 1], Identifier):
+            raise _Unsure(f"unexpected member declaration at line {tokens[first].position.line}")
+        if values[i] == "{":
+            raise _Unsure(f"unexpected block at line {tokens[i].position.line}")
+        if values[i] == "(":
+            return self._scan_method(first, i, modifiers, annotation_positions)
+        return self._scan_field(i)
+
+    def _scan_method(self, first: int, paren: int, modifiers: Set[str], annotation_positions: list) -> int:
+        values = self.values
+        name = values[paren - 1]
+
+        type_start = first
+        if values[first] == "<":
+            depth = 0
+            for type_start in range(first, paren):
+                depth += {"<": 1, ">": -1}.get(values[type_start], 0)
+                if depth == 0:
+                    break
+            type_start += 1
+        is_constructor = type_start == paren - 1
+        if is_constructor and name != self.class_name:
+            raise _Unsure(f"method without return type: {name}")
+
+        i = self._skip_parens(paren)
+        while i < len(values) and values[i] not in ("{", ";"):
+            i = self._skip_parens(i) if values[i] == "(" else i + 1
+        if i == len(values):
+            raise _Unsure(f"unterminated declaration of {name}")
+        if values[i] == ";":
+            return i + 1
+
+        end, calls, updates_state = self._scan_code(i, block=True)
+        if not is_constructor:
+            start_position = min([self.tokens[first].position] + annotation_positions)
+            span = (self.line_offsets[start_position.line - 1],
+                    _offset(self.line_offsets, self.tokens[end - 1].position) + 1)
+            self.methods[name] = ScannedMethod(name, modifiers, span, frozenset(calls), updates_state)
+        return end
+
+    def _scan_field(self, i: int) -> int:
+        tokens, values = self.tokens, self.values
+        self.field_names.add(values[i - 1])
+        end, _, updates_state = self._scan_code(i, block=False, declaration=True)
+        self.fields_update_state |= updates_state
+
+        # further declarators: ", name" followed by "=", "," or ";" outside any brackets
+        depth = 0
+        for j in range(i, end - 1):
+            value = values[j]
+            if value in ("(", "[", "{"):
+                depth += 1
+            elif value in (")", "]", "}"):
+                depth -= 1
+            elif (depth == 0 and value == "," and isinstance(tokens[j + 1], Identifier)
+                  and values[j + 2] in ("=", ",", ";")):
+                self.field_names.add(values[j + 1])
+        return end
+
+    def _is_declaration_start(self, i: int) -> bool:
+        # identifier preceded by the end of a type, e.g. "String name" or "List<String> names"
+        previous = self.tokens[i - 1]
+        return isinstance(previous, (Identifier, BasicType)) or previous.value in (">", "]")
+
+    def _is_declarator(self, assign: int, declaration: bool) -> bool:
+        # distinguishes "Type name = ..." (or ", name = ..." in a declaration) from an assignment
+        tokens, values = self.tokens, self.values
+        target = assign - 1
+        if values[target] == "]":
+            return values[target - 1] == "["
+        if not isinstance(tokens[target], Identifier):
+            return False
+        if self._is_declaration_start(target):
+            return True
+        return values[target - 1] == "," and declaration
+
+    def _is_creator(self, i: int) -> bool:
+        # "new Foo(" or "new a.b.Foo("
+        j = i - 1
+        while self.value(j) == "." and isinstance(self.tokens[j - 1], Identifier):
+            j -= 2
+        return self.value(j) == "new"
+
+    def _scan_code(self, i: int, block: bool, declaration: bool = False) -> Tuple[int, Set[str], bool]:
+        """
+        Scans a block (starting at its "{") or a field declaration (up to its ";").
+
+        Returns the index after the end, the names of invoked methods and whether state is updated.
+        """
+        tokens, values = self.tokens, self.values
+        calls: Set[str] = set()
+        updates_state = False
+
+        # every frame is [opening bracket, index of the token before it, statement is a declaration]
+        frames: List[list] = [["{" if block else "", i - 1, declaration]]
+        if block:
+            i += 1
+        last_closed = None
+
+        while i < len(values):
+            token, value = tokens[i], values[i]
+
+            if isinstance(token, Separator):
+                if value in ("(", "["):
+                    frames.append([value, i - 1, False])
+                elif value == "{":
+                    if (values[i - 1] == ")" and last_closed is not None
+                            and not isinstance(tokens[last_closed], Keyword)):
+                        raise _Unsure(f"anonymous class at line {token.position.line}")
+                    frames.append([value, i - 1, False])
+                elif value in (")", "]"):
+                    if len(frames) == 1:
+                        raise _Unsure(f"unbalanced {value} at line {token.position.line}")
+                    last_closed = frames.pop()[1]
+                elif value == "}":
+                    frames.pop()
+                    if not frames:
+                        if not block:
+                            raise _Unsure(f"unbalanced }} at line {token.position.line}")
+                        return i + 1, calls, updates_state
+                    frames[-1][2] = False
+                elif value == ";":
+                    if not block and len(frames) == 1:
+                        return i + 1, calls, updates_state
+                    frames[-1][2] = False
+
+            elif isinstance(token, Identifier):
+                following = self.value(i + 1)
+                if following == "(":
+                    if not self._is_creator(i) and not (values[i - 1] == "." and self.value(i - 2) == "super"):
+                        calls.add(value)
+                        updates_state |= value.startswith("set")
+                elif self._is_declaration_start(i):
+                    frames[-1][2] = True
+
+            elif isinstance(token, Operator):
+                if value in _COMPOUND_ASSIGNMENTS:
+                    updates_state = True
+                elif value == "=":
+                    if self._is_declarator(i, frames[-1][2]):
+                        frames[-1][2] = True
+                    else:
+                        updates_state = True
+
+            elif isinstance(token, Annotation):
+                i = self._skip_annotation(i)
+                continue
+
+            elif value in _TYPE_KEYWORDS and values[i - 1] != ".":
+                raise _Unsure(f"local {value} at line {token.position.line}")
+
+            i += 1
+
+        raise _Unsure("unterminated block")
+
+
+def scan_java_class(class_code: str, tokens: Optional[List[JavaToken]] = None,
+                    line_offsets: Optional[List[int]] = None) -> Optional[ScannedClass]:
+    """
+    Extracts the facts needed for chunking from a Java class in a single pass over its tokens, without parsing it.
+
+    The scanner finds methods (names, modifiers, spans, invoked methods and whether they update state),
+    field names and whether field initializers update state, giving the same results as the javalang AST.
+    Classes it cannot handle with certainty (interfaces, enums, nested, local or anonymous classes,
+    several top-level types, unbalanced code) are reported as None, so the caller can fall back to javalang.
+
+    Parameters
+    ----------
+    class_code : str
+        The Java source code of the class.
+    tokens : List[JavaToken], optional
+        Tokens of `class_code`. Tokenized if omitted.
+    line_offsets : List[int], optional
+        Line start offsets of `class_code`. Computed if omitted.
+
+    Returns
+    -------
+    ScannedClass or None
+        The facts about the class, or None if the scanner was unsure.
+    """
+    if tokens is None:
+        tokens = tokenize_java(class_code)
+    if line_offsets is None:
+        line_offsets = compute_line_offsets(class_code)
+
+    try:
+        return _Scanner(class_code, tokens, line_offsets).scan()
+    except (_Unsure, IndexError, ValueError) as e:
+        logger.debug(f"Structural scanner unsure, falling back to javalang: {e or e.__class__.__name__}")
+        return None
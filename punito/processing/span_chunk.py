@@ -0,0 +1,82 @@
+from typing import Dict, Iterator, Optional, Tuple
+
+from .class_index import ClassIndex
+from .preprocessor import ChunkLayout
+from .spans import Span
+
+
+class SpanChunk:
+    """
+    Chunk code stored as references into the source of its class.
+
+    A rendered chunk repeats the imports, class header, fields and context methods of its
+    public method, so the rendered chunks of a class hold many copies of the same text.
+    A `SpanChunk` keeps only the spans of its methods and the index of the class, which
+    holds the shared source and header. The code is materialized by `str(chunk)`, i.e.
+    only when a prompt is built from it, and is equal to `render_chunk(index, layout)`.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunk was built from.
+    layout : ChunkLayout
+        The methods the chunk is built from.
+    """
+    __slots__ = ("index", "context", "extra")
+
+    def __init__(self, index: ClassIndex, layout: ChunkLayout):
+        spans = index.method_spans
+        self.index = index
+        self.context: Tuple[Span, ...] = tuple(spans[name] for name in layout.context)
+        self.extra: Optional[Tuple[Span, ...]] = (None if layout.extra is None
+                                                  else tuple(spans[name] for name in layout.extra))
+
+    def _parts(self) -> Iterator[str]:
+        index = self.index
+        code = index.class_code
+        (start, end), *direct_deps = self.context
+
+        yield f"{index.imports}\n\n{index.class_definition}\n{index.class_fields}\n\n"
+        yield code[start:end]
+        yield "\n\n"
+        yield "\n\n".join(code[start:end] for start, end in direct_deps)
+        if self.extra is not None:
+            yield "\n\n"
+            yield "\n\n".join(code[start:end] for start, end in self.extra)
+
+    def __str__(self) -> str:
+        return "".join(self._parts())
+
+    def __len__(self) -> int:
+        """Return the length of the materialized code without materializing it."""
+        index = self.index
+        # separators of the header (5) and after the public method (2)
+        length = len(index.imports) + len(index.class_definition) + len(index.class_fields) + 7
+        start, end = self.context[0]
+        length += end - start
+        for spans in (self.context[1:], self.extra or ()):
+            length += sum(end - start for start, end in spans) + 2 * max(len(spans) - 1, 0)
+        return length + (2 if self.extra is not None else 0)
+
+    def __repr__(self) -> str:
+        return f"SpanChunk(context={self.context}, extra={self.extra})"
+
+
+def span_chunks(index: ClassIndex, layouts: Dict[str, Dict[str, ChunkLayout]]) -> Dict[str, Dict[str, SpanChunk]]:
+    """
+    Builds span-backed chunks of a class, without copying any code.
+
+    Parameters
+    ----------
+    index : ClassIndex
+        The index of the class the chunks were built from.
+    layouts : Dict[str, Dict[str, ChunkLayout]]
+        Mapping of public method name to a mapping of tested method name to chunk layout.
+
+    Returns
+    -------
+    Dict[str, Dict[str, SpanChunk]]
+        Mapping of public method name to a mapping of tested method name to chunk.
+    """
+    return {public_fn: {name: SpanChunk(index, layout) for name, layout in chunks.items()}
+            for public_fn, chunks in layouts.items()}
@@ -0,0 +1,174 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import javalang
+from javalang.tokenizer import JavaToken, Position
+from javalang.tree import CompilationUnit, MethodDeclaration
+
+Span = Tuple[int, int]
+
+
+def tokenize_java(code: str) -> List[JavaToken]:
+    """
+    Splits Java source code into tokens. Comments are skipped by the tokenizer.
+
+    Parameters
+    ----------
+    code : str
+        The Java source code.
+
+    Returns
+    -------
+    List[JavaToken]
+        The tokens of the source code with their line/column positions.
+    """
+    return list(javalang.tokenizer.tokenize(code))
+
+
+def parse_tokens(tokens: List[JavaToken]) -> CompilationUnit:
+    """
+    Parses already tokenized Java source code into an abstract syntax tree (AST).
+
+    Parameters
+    ----------
+    tokens : List[JavaToken]
+        Tokens returned by `tokenize_java`.
+
+    Returns
+    -------
+    CompilationUnit
+        The root node of the Java AST.
+    """
+    return javalang.parser.Parser(tokens).parse()
+
+
+def compute_line_offsets(code: str) -> List[int]:
+    """
+    Computes the offset of the first character of every line (index 0 holds line 1).
+
+    Parameters
+    ----------
+    code : str
+        The source code.
+
+    Returns
+    -------
+    List[int]
+        Line start offsets.
+    """
+    offsets = [0]
+    find = code.find
+    pos = find("\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = find("\n", pos + 1)
+    return offsets
+
+
+def declaration_start(method: MethodDeclaration) -> Position:
+    """Return the position of the first token of a method declaration, including its annotations."""
+    positions = [method.position] + [annotation.position for annotation in method.annotations
+                                     if annotation.position is not None]
+    return min(positions)
+
+
+def get_method_spans(code: str, methods: Iterable[MethodDeclaration],
+                     tokens: Optional[List[JavaToken]] = None,
+                     line_offsets: Optional[List[int]] = None) -> Dict[Position, Span]:
+    """
+    Computes the source spans of all given method declarations in a single pass over the tokens.
+
+    A span starts at the beginning of the line holding the first token of the declaration
+    (annotations included) and ends right after the closing brace of the method body
+    (or after the semicolon of a method without body). Braces inside string literals and
+    comments are not counted, because the spans are taken from the token stream.
+
+    Parameters
+    ----------
+    code : str
+        The Java source code the methods were parsed from.
+    methods : Iterable[MethodDeclaration]
+        The AST nodes of the methods.
+    tokens : List[JavaToken], optional
+        Tokens of `code`. Tokenized again if omitted.
+    line_offsets : List[int], optional
+        Line start offsets of `code`. Computed if omitted.
+
+    Returns
+    -------
+    Dict[Position, Span]
+        Mapping of the method position (`MethodDeclaration.position`) to its start and end offsets.
+    """
+    if tokens is None:
+        tokens = tokenize_java(code)
+    if line_offsets is None:
+        line_offsets = compute_line_offsets(code)
+
+    # (position of the first token, method position) in source order
+    starts = sorted((declaration_start(method), method.position) for method in methods)
+    spans: Dict[Position, Span] = {}
+    next_start = 0
+
+    pending: List[Tuple[Position, Position, int]] = []  # (first token, method position, paren depth)
+    braces: List[Optional[Position]] = []
+
+    for token in tokens:
+        while next_start < len(starts) and token.position >= starts[next_start][0]:
+            first, key = starts[next_start]
+            pending.append((first, key, 0))
+            next_start += 1
+
+        value = token.value
+        if not isinstance(token, javalang.tokenizer.Separator):
+            continue
+
+        if pending:
+            first, key, depth = pending[-1]
+            if value == "(":
+                pending[-1] = (first, key, depth + 1)
+            elif value == ")":
+                pending[-1] = (first, key, depth - 1)
+            elif depth == 0 and value == "{":
+                pending.pop()
+                braces.append(key)
+                spans[key] = (line_offsets[first.line - 1], -1)
+                continue
+            elif depth == 0 and value == ";":
+                pending.pop()
+                spans[key] = (line_offsets[first.line - 1], _offset(line_offsets, token.position) + 1)
+                continue
+
+        if value == "{":
+            braces.append(None)
+        elif value == "}" and braces:
+            key = braces.pop()
+            if key is not None:
+                spans[key] = (spans[key][0], _offset(line_offsets, token.position) + 1)
+
+    # unterminated bodies (e.g. truncated code) extend to the end of the source
+    return {key: (start, end if end != -1 else len(code)) for key, (start, end) in spans.items()}
+
+
+def expand_to_lines(code: str, span: Span) -> Span:
+    """
+    Extends a span to cover whole lines, including the line break after its last line.
+
+    Parameters
+    ----------
+    code : str
+        The source code the span refers to.
+    span : Span
+        Start and end offsets.
+
+    Returns
+    -------
+    Span
+        Start and end offsets of the full lines covering the span.
+    """
+    start, end = span
+    start = code.rfind("\n", 0, start) + 1
+    line_break = code.find("\n", end)
+    return start, len(code) if line_break == -1 else line_break + 1
+
+
+def _offset(line_offsets: List[int], position: Position) -> int:
+    return line_offsets[position.line - 1] + position.column - 1
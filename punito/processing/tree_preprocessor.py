@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+from loguru import logger
+
+from .preprocessor import get_chunked_code
+from ..utils import read_file
+
+
+class ChunkingResult(NamedTuple):
+    """
+    Outcome of chunking a single Java file.
+
+    Attributes
+    ----------
+    path : Path
+        Path to the Java file.
+    chunks : Dict[str, Dict[str, str]] or None
+        Chunked code as returned by `get_chunked_code`, or None if chunking failed.
+    error : str or None
+        Description of the failure, or None if chunking succeeded.
+    """
+    path: Path
+    chunks: Optional[Dict[str, Dict[str, str]]]
+    error: Optional[str] = None
+
+
+def find_java_classes(root: Path, pattern: str = "*.java") -> List[Path]:
+    """
+    Recursively finds Java files below a directory.
+
+    Parameters
+    ----------
+    root : Path
+        Root directory of the source tree (e.g. a Maven module).
+    pattern : str, optional
+        Glob pattern the file names have to match, by default "*.java".
+
+    Returns
+    -------
+    List[Path]
+        Sorted paths of the matching files.
+    """
+    return sorted(path for path in root.rglob(pattern) if path.is_file())
+
+
+def _chunk_file(path: Path) -> ChunkingResult:
+    try:
+        class_code = read_file(path)
+        if not class_code:
+            return ChunkingResult(path, None, "File is empty or could not be read.")
+        return ChunkingResult(path, get_chunked_code(class_code))
+    except Exception as e:
+        return ChunkingResult(path, None, f"{e.__class__.__name__}: {e}")
+
+
+def _chunk_files(paths: List[Path]) -> List[ChunkingResult]:
+    # executed in a worker process; failures are isolated per file
+    return [_chunk_file(path) for path in paths]
+
+
+def _batched(paths: List[Path], batch_size: int) -> Iterator[List[Path]]:
+    for i in range(0, len(paths), batch_size):
+        yield paths[i:i + batch_size]
+
+
+def chunk_files(paths: Iterable[Path], max_workers: Optional[int] = None,
+                files_per_task: int = 8) -> Iterator[ChunkingResult]:
+    """
+    Chunks many Java files in parallel over a pool of processes.
+
+    Files are submitted in batches of `files_per_task` to amortize the inter-process overhead,
+    and at most two batches per worker are in flight at once, so memory stays bounded on large
+    trees. Results are yielded as soon as their batch finishes, not in input order. A file
+    that cannot be read or parsed yields a result with `error` set instead of aborting the run.
+
+    Parameters
+    ----------
+    paths : Iterable[Path]
+        Paths to the Java files.
+    max_workers : int, optional
+        Number of worker processes, by default the number of CPUs.
+    files_per_task : int, optional
+        Number of files chunked by a worker per submitted task, by default 8.
+
+    Yields
+    ------
+    ChunkingResult
+        Chunked code or error for every file.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    batches = _batched(list(paths), max(1, files_per_task))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: Set[Future] = set()
+
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            in_flight.add(executor.submit(_chunk_files, batch))
+            return True
+
+        while len(in_flight) < 2 * max_workers and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                submit_next()
+                for result in future.result():
+                    if result.error:
+                        logger.error(f"Chunking failed for {result.path}: {result.error}")
+                    yield result
+
+
+def chunk_source_tree(root: Path, pattern: str = "*PanelControllerBean.java", max_workers: Optional[int] = None,
+                      files_per_task: int = 8) -> Iterator[ChunkingResult]:
+    """
+    Chunks all Java classes of a source tree in parallel.
+
+    Parameters
+    ----------
+    root : Path
+        Root directory of the source tree (e.g. a Maven module).
+    pattern : str, optional
+        Glob pattern of the classes to chunk, by default "*PanelControllerBean.java".
+    max_workers : int, optional
+        Number of worker processes, by default the number of CPUs.
+    files_per_task : int, optional
+        Number of files chunked by a worker per submitted task, by default 8.
+
+    Yields
+    ------
+    ChunkingResult
+        Chunked code or error for every matching file, in order of completion.
+    """
+    paths = find_java_classes(root, pattern)
+    logger.info(f"Chunking {len(paths)} classes from {root} using {max_workers or os.cpu_count()} processes")
+    return chunk_files(paths, max_workers, files_per_task)
@@ -0,0 +1,28 @@
+from typing import Optional
+
+import httpx
+
+
+class FakeClock:
+    """Clock advanced by setting `now`, for components taking a `clock` callable."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def completion(content: str, total_tokens: Optional[int] = None) -> dict:
+    """Body of a completion response, reporting `total_tokens` as usage if given."""
+    body = {"choices": [{"message": {"content": content}}]}
+    if total_tokens is not None:
+        body["usage"] = {"total_tokens": total_tokens}
+    return body
+
+
+def status_error(status_code: int, headers: Optional[dict] = None, url: str = "http://llm") -> httpx.HTTPStatusError:
+    """The error `raise_for_status` raises for a response with `status_code`."""
+    request = httpx.Request("POST", url)
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.batching import MicroBatcher
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import CircuitBreaker, RetryPolicy
+from punito.tests.chat_model.helpers import completion
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_full_batches_are_sent_without_waiting(self):
+        batcher = MicroBatcher(max_batch_size=4, max_wait=5.0)
+        batches = []
+
+        def send(items):
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda item: batcher.submit(item, send), range(8)))
+
+        self.assertEqual(results, [item * 2 for item in range(8)])
+        self.assertEqual(sorted(len(batch) for batch in batches), [4, 4])
+        self.assertEqual(batcher.metrics().items, 8)
+        self.assertEqual(batcher.metrics().largest, 4)
+
+    def test_batch_is_sent_after_max_wait(self):
+        batcher = MicroBatcher(max_batch_size=16, max_wait=0.01)
+        self.assertEqual(batcher.submit(1, lambda items: [item + 1 for item in items]), 2)
+        self.assertEqual(batcher.metrics().batches, 1)
+
+    def test_errors_reach_every_caller(self):
+        batcher = MicroBatcher(max_batch_size=3, max_wait=5.0)
+
+        def send(items):
+            raise ConnectionError("down")
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(batcher.submit, item, send) for item in range(3)]
+            for future in futures:
+                self.assertRaises(ConnectionError, future.result)
+
+    def test_coroutines_are_batched(self):
+        batcher = MicroBatcher(max_batch_size=10, max_wait=0.01)
+        batches = []
+
+        async def send(items):
+            batches.append(items)
+            return [str(item) for item in items]
+
+        async def run():
+            return await asyncio.gather(*(batcher.asubmit(item, send) for item in range(25)))
+
+        self.assertEqual(asyncio.run(run()), [str(item) for item in range(25)])
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+
+    def test_cancelled_batch_task_releases_its_callers(self):
+        for max_wait in [0.01, 10.0]:  # cancelled while sending, and while waiting for more requests
+            batcher = MicroBatcher(max_batch_size=4, max_wait=max_wait)
+
+            async def hang(items):
+                await asyncio.sleep(60)
+
+            async def send(items):
+                return [str(item) for item in items]
+
+            async def run():
+                callers = [asyncio.ensure_future(batcher.asubmit(item, hang)) for item in range(3)]
+                await asyncio.sleep(0.05)
+                for task in asyncio.all_tasks() - set(callers) - {asyncio.current_task()}:
+                    task.cancel()
+                results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+                # the batcher keeps working after the cancelled batch
+                return results, await asyncio.gather(*(batcher.asubmit(item, send) for item in range(4)))
+
+            with self.subTest(max_wait=max_wait):
+                results, later = asyncio.run(run())
+                self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+                self.assertEqual(later, ["0", "1", "2", "3"])
+
+
+class TestBatchedLlamaChatModel(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = []
+        self.model = LlamaChatModel(model_name="llama", base_url="http://llm", single_flight=None,
+                                    micro_batcher=MicroBatcher(max_batch_size=8, max_wait=0.5))
+
+    def _invoke_concurrently(self, prompts):
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            return list(executor.map(lambda prompt: self.model.invoke([HumanMessage(content=prompt)]).content,
+                                     prompts))
+
+    def test_responses_are_routed_to_their_callers(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            self.paths.append(request.url.path)
+            payloads = json.loads(request.content)["requests"]
+            return httpx.Response(200, json={"responses": [completion(payload["messages"][0]["content"].upper())
+                                                           for payload in payloads]})
+
+        self.model._http = PooledClient(transport=httpx.MockTransport(handle))
+        prompts = [f"prompt {i}" for i in range(8)]
+
+        self.assertEqual(self._invoke_concurrently(prompts), [prompt.upper() for prompt in prompts])
+        self.assertEqual(self.paths, ["/batch/completions"])
+
+    def test_falls_back_to_single_requests(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            self.paths.append(request.url.path)
+            if request.url.path == "/batch/completions":
+                return httpx.Response(404)
+            return httpx.Response(200, json=completion("ok"))
+
+        self.model._http = PooledClient(transport=httpx.MockTransport(handle))
+
+        self.assertEqual(self._invoke_concurrently(["a", "b", "c"]), ["ok"] * 3)
+        self.assertEqual(self.model.invoke([HumanMessage(content="d")]).content, "ok")
+        self.assertEqual(self.paths.count("/batch/completions"), 1)
+        self.assertEqual(self.paths.count("/completions"), 4)
+
+    def test_failed_batch_counts_once_in_the_breaker(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            self.paths.append(request.url.path)
+            return httpx.Response(503)
+
+        transport = httpx.MockTransport(handle)
+        self.model._http = PooledClient(transport=transport, async_transport=transport)
+        self.model.retry_policy = RetryPolicy(max_attempts=1)
+        self.model.circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+
+        async def invoke_concurrently(prompts):
+            return await asyncio.gather(*(self.model.ainvoke([HumanMessage(content=prompt)]) for prompt in prompts),
+                                        return_exceptions=True)
+
+        results = asyncio.run(invoke_concurrently(["a", "b", "c"]))
+
+        self.assertTrue(all(isinstance(result, httpx.HTTPStatusError) for result in results))
+        self.assertEqual(self.paths, ["/batch/completions"])
+        # three callers got the error of one failed request, which does not reach the threshold of two
+        self.assertEqual(self.model.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self.model.invoke, [HumanMessage(content=prompt)]) for prompt in "def"]
+            for future in futures:
+                self.assertRaises(httpx.HTTPStatusError, future.result)
+        self.assertEqual(self.model.circuit_breaker.state, CircuitBreaker.OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
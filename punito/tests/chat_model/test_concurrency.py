@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.concurrency import AdaptiveLimiter, is_overload
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import RetryPolicy
+from punito.tests.chat_model.helpers import completion, status_error
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def _complete(self, limiter: AdaptiveLimiter, requests: int, latency: float = 1.0) -> None:
+        # keeps the limiter saturated, as a long queue of chunks does
+        for _ in range(requests):
+            for _ in range(limiter.limit):
+                limiter.acquire()
+            for _ in range(limiter.limit):
+                limiter.release(latency)
+
+    def test_overload_classification(self):
+        self.assertTrue(is_overload(status_error(429)))
+        self.assertTrue(is_overload(status_error(503)))
+        self.assertTrue(is_overload(httpx.ReadTimeout("timeout")))
+        self.assertFalse(is_overload(status_error(400)))
+        self.assertFalse(is_overload(httpx.ConnectError("refused")))
+
+    def test_limit_grows_while_in_use(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=6)
+        self._complete(limiter, 3)
+        self.assertEqual(limiter.limit, 5)
+        self._complete(limiter, 10)
+        self.assertEqual(limiter.limit, 6)
+
+    def test_limit_does_not_grow_while_unsaturated(self):
+        limiter = AdaptiveLimiter(initial_limit=4)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(1.0)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_overload_burst_cuts_limit_once(self):
+        limiter = AdaptiveLimiter(initial_limit=20, backoff_ratio=0.5)
+        for _ in range(5):
+            limiter.acquire()
+        for _ in range(5):
+            limiter.release(overloaded=True)
+
+        self.assertEqual(limiter.limit, 10)
+        self.assertEqual(limiter.metrics().overloads, 5)
+
+    def test_limit_is_not_cut_below_minimum(self):
+        limiter = AdaptiveLimiter(initial_limit=2, min_limit=2)
+        limiter.acquire()
+        limiter.release(overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_growing_latency_cuts_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=4, latency_tolerance=1.5)
+        self._complete(limiter, 10, latency=1.0)
+        self.assertEqual(limiter.limit, 4)
+
+        self._complete(limiter, 3, latency=10.0)
+        self.assertLess(limiter.limit, 4)
+
+    def test_mixed_completion_lengths_do_not_cut_limit(self):
+        # short plan and long tests completions, no errors
+        for limiter in (AdaptiveLimiter(initial_limit=16), AdaptiveLimiter(initial_limit=16, latency_tolerance=1.5)):
+            for i in range(50):
+                self._complete(limiter, 1, latency=8.0 if i % 2 else 30.0)
+            self.assertGreaterEqual(limiter.limit, 16)
+            self.assertEqual(limiter.metrics().overloads, 0)
+
+    def test_threads_never_exceed_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def request(_):
+            nonlocal in_flight, peak
+            with limiter.slot():
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                time.sleep(0.005)
+                with lock:
+                    in_flight -= 1
+
+        with ThreadPoolExecutor(max_workers=12) as executor:
+            list(executor.map(request, range(60)))
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(limiter.metrics().in_flight, 0)
+        self.assertEqual(limiter.metrics().queued, 0)
+
+    def test_coroutines_wait_for_slots(self):
+        limiter = AdaptiveLimiter(initial_limit=5, max_limit=5)
+        in_flight = 0
+        peak = 0
+        queued = []
+
+        async def request():
+            nonlocal in_flight, peak
+            async with limiter.aslot():
+                in_flight += 1
+                peak = max(peak, in_flight)
+                queued.append(limiter.metrics().queued)
+                await asyncio.sleep(0.001)
+                in_flight -= 1
+
+        async def run():
+            await asyncio.gather(*(request() for _ in range(50)))
+
+        asyncio.run(run())
+        self.assertEqual(peak, 5)
+        self.assertGreater(max(queued), 0)
+        self.assertEqual(limiter.metrics().queued, 0)
+
+    def test_cancelled_waiter_passes_wake_up_on(self):
+        limiter = AdaptiveLimiter(initial_limit=1)
+
+        async def run():
+            await limiter.aacquire()
+            cancelled = asyncio.create_task(limiter.aacquire())
+            waiting = asyncio.create_task(limiter.aacquire())
+            await asyncio.sleep(0)
+            limiter.release(1.0)
+            cancelled.cancel()
+            await asyncio.wait_for(waiting, 1)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.metrics().in_flight, 1)
+
+
+class TestLimitedLlamaChatModel(unittest.TestCase):
+
+    def test_overloaded_requests_lower_the_limit(self):
+        responses = [httpx.Response(429), httpx.Response(200, json=completion("ok"))]
+        limiter = AdaptiveLimiter(initial_limit=10)
+        model = LlamaChatModel(model_name="llama", base_url="http://llm", concurrency_limiter=limiter,
+                               retry_policy=RetryPolicy(base_delay=0.0, max_delay=0.0))
+        model._http = PooledClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertEqual(model.concurrency_metrics().limit, 7)
+        self.assertEqual(model.concurrency_metrics().in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import punito
+from punito.chat_model import LlamaChatModel, create_llama_model_from_config
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.routing import EndpointRouter
+from punito.utils import create_continuation_messages_from_yaml_template
+from punito.tests.chat_model.helpers import completion
+
+
+def _stream_body(tokens) -> str:
+    return "".join(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n"
+                   for token in tokens) + "data: [DONE]\n\n"
+
+
+class TestPooledLlamaChatModel(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.model = LlamaChatModel(model_name="llama", base_url="http://llm", endpoint="/v1/chat/completions")
+
+    def _use_transport(self, handler, **kwargs):
+        def record(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return handler(request)
+
+        self.model._http = PooledClient(transport=httpx.MockTransport(record), **kwargs)
+
+    def test_requests_share_one_client(self):
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+
+        client = self.model.http_client
+        self.assertEqual(self.model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertEqual(self.model.invoke([HumanMessage(content="again")]).content, "ok")
+
+        self.assertIs(self.model.http_client, client)
+        self.assertEqual(json.loads(self.requests[0].content)["messages"], [{"role": "user", "content": "hi"}])
+        self.assertEqual(self.model.pool_metrics().requests, 2)
+        self.assertEqual(self.model.pool_metrics().in_flight, 0)
+
+    @patch("punito.utils.prompt_utils.find_resources_path", lambda: Path(punito.__file__).parent / "resources")
+    def test_continuation_is_sent_with_chat_roles(self):
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+        history = [SystemMessage(content="You write tests."), HumanMessage(content="Plan the tests.")]
+        messages = create_continuation_messages_from_yaml_template("tester_continuation_prompt", history, "the plan",
+                                                                   {"execution_function_name": "onSave",
+                                                                    "tested_function_name": "validate",
+                                                                    "test_example": ""})
+
+        self.model.invoke(messages)
+
+        sent = json.loads(self.requests[0].content)["messages"]
+        self.assertEqual([message["role"] for message in sent], ["system", "user", "assistant", "user"])
+        self.assertEqual(sent[2]["content"], "the plan")
+
+    def test_client_is_created_once_across_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = set(executor.map(lambda _: id(self.model.http_client), range(32)))
+        self.assertEqual(len(clients), 1)
+
+    def test_stream_holds_connection_until_consumed(self):
+        self._use_transport(lambda request: httpx.Response(200, text=_stream_body(["a", "b"])))
+
+        stream = self.model.stream([HumanMessage(content="hi")])
+        self.assertEqual(next(stream).content, "a")
+        self.assertEqual(self.model.pool_metrics().in_flight, 1)
+        self.assertEqual([chunk.content for chunk in stream], ["b"])
+        self.assertEqual(self.model.pool_metrics().in_flight, 0)
+
+    def test_waits_for_free_connection_are_counted(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def slow(request: httpx.Request) -> httpx.Response:
+            started.release()
+            release.wait(5)
+            return httpx.Response(200, json=completion("ok"))
+
+        self._use_transport(slow, max_connections=1)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(self.model.invoke, [HumanMessage(content="1")])
+            started.acquire(timeout=5)
+            second = executor.submit(self.model.invoke, [HumanMessage(content="2")])
+            started.acquire(timeout=5)
+            release.set()
+            first.result(), second.result()
+
+        self.assertEqual(self.model.pool_metrics().waits, 1)
+
+    def test_warm_up_opens_connections(self):
+        self._use_transport(lambda request: httpx.Response(405))
+        self.assertEqual(self.model.warm_up(connections=3), 3)
+        self.assertEqual([request.method for request in self.requests], ["HEAD"] * 3)
+
+    def test_failed_warm_up_is_not_fatal(self):
+        def refuse(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("refused", request=request)
+
+        self._use_transport(refuse)
+        self.assertEqual(self.model.warm_up(connections=2), 0)
+
+    def test_warm_up_and_probes_start_with_first_request(self):
+        self.model = LlamaChatModel(model_name="llama", base_url="http://llm", endpoint="/v1/chat/completions",
+                                    router=EndpointRouter(["http://llm"]), warm_up_connections=2,
+                                    health_interval=60.0)
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+        self.assertIsNone(self.model.router._stop_probes)
+
+        self.model.invoke([HumanMessage(content="hi")])
+        self.model.invoke([HumanMessage(content="again")])
+
+        self.assertEqual([request.method for request in self.requests], ["HEAD", "HEAD", "POST", "POST"])
+        self.assertIsNotNone(self.model.router._stop_probes)
+        self.model.close()
+        self.assertIsNone(self.model.router._stop_probes)
+
+    def test_factory_sends_no_requests(self):
+        settings = {"MODEL": "llama", "BASE_URL": ["http://llm-1", "http://llm-2"], "ENDPOINT": "/v1/chat/completions",
+                    "HTTP_WARM_UP_CONNECTIONS": 4, "LLM_HEALTH_INTERVAL": 10.0}
+        with patch("punito.chat_model.llama_chat_model.get_default_settings", return_value=settings):
+            model = create_llama_model_from_config()
+
+        self.assertIsNone(model._http)
+        self.assertIsNone(model.router._stop_probes)
+        self.assertEqual((model.warm_up_connections, model.health_interval), (4, 10.0))
+
+
+class TestAsyncLlamaChatModel(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.model = LlamaChatModel(model_name="llama", base_url="http://llm", endpoint="/v1/chat/completions")
+
+    async def asyncTearDown(self):
+        await self.model.aclose()
+
+    def _use_transport(self, handler):
+        async def record(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return await handler(request)
+
+        self.model._http = PooledClient(async_transport=httpx.MockTransport(record))
+
+    async def test_ainvoke(self):
+        async def reply(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json=completion("ok"))
+
+        self._use_transport(reply)
+        message = await self.model.ainvoke([HumanMessage(content="hi")])
+
+        self.assertEqual(message.content, "ok")
+        self.assertEqual(json.loads(self.requests[0].content)["stream"], False)
+        self.assertEqual(self.model.pool_metrics().requests, 1)
+
+    async def test_first_async_request_warms_up_connections(self):
+        methods = []
+
+        def reply(request: httpx.Request) -> httpx.Response:
+            methods.append(request.method)
+            return httpx.Response(200, json=completion("ok"))
+
+        transport = httpx.MockTransport(reply)
+        self.model.warm_up_connections = 1
+        self.model._http = PooledClient(transport=transport, async_transport=transport)
+        await self.model.ainvoke([HumanMessage(content="hi")])
+        await self.model.ainvoke([HumanMessage(content="again")])
+
+        self.assertEqual(methods, ["HEAD", "POST", "POST"])
+
+    async def test_astream(self):
+        async def reply(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, text=_stream_body(["a", "b", "c"]))
+
+        self._use_transport(reply)
+        chunks = [chunk.content async for chunk in self.model.astream([HumanMessage(content="hi")])]
+
+        self.assertEqual(chunks, ["a", "b", "c"])
+        self.assertEqual(self.model.pool_metrics().in_flight, 0)
+
+    async def test_requests_are_in_flight_concurrently(self):
+        in_flight = 0
+        peak = 0
+
+        async def slow(request: httpx.Request) -> httpx.Response:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json=completion("ok"))
+
+        self._use_transport(slow)
+        messages = await asyncio.gather(*(self.model.ainvoke([HumanMessage(content=str(i))]) for i in range(100)))
+
+        self.assertEqual(len(messages), 100)
+        self.assertEqual(peak, 100)
+
+    async def test_http_errors_are_raised(self):
+        async def fail(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(400)
+
+        self._use_transport(fail)
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.model.ainvoke([HumanMessage(content="hi")])
+
+
+class TestGenerationParameters(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.model = LlamaChatModel(model_name="llama", base_url="http://llm")
+
+    def _use_transport(self, handler):
+        def record(request: httpx.Request) -> httpx.Response:
+            self.requests.append(json.loads(request.content))
+            return handler(request)
+
+        self.model._http = PooledClient(transport=httpx.MockTransport(record))
+
+    def test_stop_and_generation_parameters_are_sent(self):
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+
+        self.model.invoke([HumanMessage(content="hi")], stop=["</s>"], max_tokens=256, temperature=0.0, seed=1)
+        self.model.invoke([HumanMessage(content="hi")])
+
+        self.assertEqual(self.requests[0]["stop"], ["</s>"])
+        self.assertEqual(self.requests[0]["max_tokens"], 256)
+        self.assertEqual(self.requests[0]["temperature"], 0.0)
+        self.assertNotIn("seed", self.requests[0])
+        self.assertFalse({"stop", "max_tokens", "temperature"} & self.requests[1].keys())
+
+    def test_stream_stops_after_code_block(self):
+        tokens = ["Here:\n```java\nclass ", "ATest {}\n", "```\nThe test", " covers", " everything."]
+        sent = []
+
+        def body():
+            for token in tokens:
+                sent.append(token)
+                yield _stream_body([token]).replace("data: [DONE]\n\n", "").encode()
+
+        self._use_transport(lambda request: httpx.Response(200, content=body()))
+        chunks = [chunk.content for chunk in self.model.stream([HumanMessage(content="hi")],
+                                                               stop_after_code_block=True, max_tokens=64)]
+
+        self.assertEqual("".join(chunks), "Here:\n```java\nclass ATest {}\n```")
+        self.assertLess(len(sent), len(tokens))
+        self.assertEqual(self.requests[0]["max_tokens"], 64)
+        self.assertEqual(self.model.pool_metrics().in_flight, 0)
+
+    def test_stream_does_not_stop_after_untagged_code_block(self):
+        tokens = ["Example:\n```\nfoo();\n```\n", "```java\nclass ATest {}\n```", "\nDone."]
+        self._use_transport(lambda request: httpx.Response(200, text=_stream_body(tokens)))
+
+        chunks = [chunk.content for chunk in self.model.stream([HumanMessage(content="hi")],
+                                                               stop_after_code_block=True)]
+        self.assertEqual("".join(chunks), "".join(tokens[:2]))
+
+    def test_stream_without_code_block_is_read_to_the_end(self):
+        self._use_transport(lambda request: httpx.Response(200, text=_stream_body(["no ", "code"])))
+
+        chunks = [chunk.content for chunk in self.model.stream([HumanMessage(content="hi")],
+                                                               stop_after_code_block=True)]
+        self.assertEqual(chunks, ["no ", "code"])
+
+
+if __name__ == '__main__':
+    unittest.main()
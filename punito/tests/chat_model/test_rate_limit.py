@@ -0,0 +1,162 @@
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.rate_limit import RateLimiter
+from punito.chat_model.resilience import RetryPolicy
+from punito.processing.packing import estimate_tokens
+from punito.tests.chat_model.helpers import FakeClock, completion
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "rate_limit.sqlite"
+        self.clock = FakeClock(1000.0)
+        self.limiters = []
+
+    def tearDown(self):
+        for limiter in self.limiters:
+            limiter.close()
+        self.tmp_dir.cleanup()
+
+    def _limiter(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, scope: str = "gateway"):
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute, self.db_path, scope, clock=self.clock)
+        self.limiters.append(limiter)
+        return limiter
+
+    def test_requests_per_minute(self):
+        limiter = self._limiter(requests_per_minute=2)
+        self.assertEqual(limiter._take(0), 0.0)
+        self.assertEqual(limiter._take(0), 0.0)
+        self.assertAlmostEqual(limiter._take(0), 30.0)
+
+        self.clock.now += 30
+        self.assertEqual(limiter._take(0), 0.0)
+
+    def test_tokens_per_minute(self):
+        limiter = self._limiter(tokens_per_minute=600)
+        self.assertEqual(limiter._take(400), 0.0)
+        self.assertAlmostEqual(limiter._take(400), 20.0)
+
+        self.clock.now += 20
+        self.assertEqual(limiter._take(400), 0.0)
+
+    def test_request_larger_than_quota_is_admitted_when_bucket_is_full(self):
+        limiter = self._limiter(tokens_per_minute=100)
+        self.assertEqual(limiter._take(500), 0.0)
+        self.assertAlmostEqual(limiter._take(500), 60.0)
+
+    def test_budget_is_shared_between_instances(self):
+        first = self._limiter(requests_per_minute=3)
+        second = self._limiter(requests_per_minute=3)
+        other_scope = self._limiter(requests_per_minute=3, scope="other")
+
+        first.acquire(0)
+        second.acquire(0)
+        first.acquire(0)
+        self.assertGreater(second._take(0), 0.0)
+        self.assertEqual(other_scope._take(0), 0.0)
+
+    def test_adjust_settles_actual_usage(self):
+        limiter = self._limiter(tokens_per_minute=600)
+        limiter.acquire(600)
+        limiter.adjust(-300)
+        self.assertEqual(limiter._take(300), 0.0)
+
+        limiter.adjust(600)
+        self.assertAlmostEqual(limiter._take(100), 70.0)
+        self.assertEqual(limiter.metrics().tokens, 900)
+
+    def test_waiting_callers_are_queued(self):
+        limiter = RateLimiter(0, tokens_per_minute=6000, db_path=self.db_path)
+        self.limiters.append(limiter)
+        limiter.acquire(6000)
+
+        start = time.monotonic()
+        asyncio.run(limiter.aacquire(30))
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(limiter.metrics().waits, 1)
+
+    def test_async_transactions_do_not_block_the_event_loop(self):
+        limiter = self._limiter(tokens_per_minute=600)
+        take, adjust = limiter._take, limiter.adjust
+        threads = []
+        limiter._take = lambda tokens: threads.append(threading.get_ident()) or take(tokens)
+        limiter.adjust = lambda tokens: threads.append(threading.get_ident()) or adjust(tokens)
+
+        async def run():
+            await limiter.aacquire(400)
+            await limiter.aadjust(-200)
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+        self.assertEqual(limiter.metrics().tokens, 200)
+
+
+class TestRateLimitedLlamaChatModel(unittest.TestCase):
+
+    def test_reported_usage_corrects_the_estimate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            limiter = RateLimiter(0, tokens_per_minute=10000, db_path=Path(tmp_dir) / "rate_limit.sqlite",
+                                  clock=FakeClock(1000.0))
+            model = LlamaChatModel(model_name="llama", base_url="http://llm", rate_limiter=limiter,
+                                   expected_completion_tokens=500)
+            model._http = PooledClient(transport=httpx.MockTransport(lambda request: httpx.Response(
+                200, json=completion("ok", total_tokens=42))))
+
+            self.assertEqual(model.invoke([HumanMessage(content="x" * 35)]).content, "ok")
+            self.assertEqual(model.rate_limit_metrics().requests, 1)
+            self.assertEqual(model.rate_limit_metrics().tokens, 42)
+            limiter.close()
+
+    def test_streamed_completion_settles_the_estimate(self):
+        body = "".join(f'data: {{"choices": [{{"delta": {{"content": "{token}"}}}}]}}\n\n' for token in ["x" * 20] * 3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            limiter = RateLimiter(0, tokens_per_minute=10000, db_path=Path(tmp_dir) / "rate_limit.sqlite",
+                                  clock=FakeClock(1000.0))
+            model = LlamaChatModel(model_name="llama", base_url="http://llm", rate_limiter=limiter,
+                                   expected_completion_tokens=500)
+            model._http = PooledClient(transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text=body + "data: [DONE]\n\n")))
+
+            self.assertEqual("".join(chunk.content for chunk in model.stream([HumanMessage(content="x" * 35)])),
+                             "x" * 60)
+            # prompt and streamed completion instead of the 500 tokens budgeted for the completion
+            self.assertEqual(model.rate_limit_metrics().tokens, estimate_tokens("x" * 35) + estimate_tokens("x" * 60))
+            limiter.close()
+
+    def test_failed_attempts_are_charged_their_prompt_only(self):
+        body = 'data: {"choices": [{"delta": {"content": "ok"}}]}\n\ndata: [DONE]\n\n'
+        responses = [httpx.Response(502), httpx.Response(200, text=body),
+                     httpx.Response(503), httpx.Response(200, json=completion("ok"))]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            limiter = RateLimiter(0, tokens_per_minute=10000, db_path=Path(tmp_dir) / "rate_limit.sqlite",
+                                  clock=FakeClock(1000.0))
+            model = LlamaChatModel(model_name="llama", base_url="http://llm", rate_limiter=limiter,
+                                   expected_completion_tokens=500, retry_policy=RetryPolicy(base_delay=0.0))
+            model._http = PooledClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+            prompt_tokens = estimate_tokens("x" * 35)
+
+            self.assertEqual([chunk.content for chunk in model.stream([HumanMessage(content="x" * 35)])], ["ok"])
+            self.assertEqual(model.rate_limit_metrics().tokens, 2 * prompt_tokens + estimate_tokens("ok"))
+            self.assertEqual(model.invoke([HumanMessage(content="x" * 35)]).content, "ok")
+            # the completion reports no usage, so its estimate stands
+            self.assertEqual(model.rate_limit_metrics().tokens, 4 * prompt_tokens + estimate_tokens("ok") + 500)
+            self.assertEqual(model.rate_limit_metrics().requests, 4)
+            limiter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
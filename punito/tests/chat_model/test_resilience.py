@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import CircuitBreaker, RetryPolicy, call_with_retry, parse_retry_after
+from punito.tests.chat_model.helpers import FakeClock, completion, status_error
+
+NO_DELAY = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after(httpx.Response(429, headers={"Retry-After": "7"})), 7.0)
+        retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(httpx.Response(429, headers={"Retry-After": retry_at})), 60, delta=2)
+        self.assertIsNone(parse_retry_after(httpx.Response(429, headers={"Retry-After": "soon"})))
+        self.assertIsNone(parse_retry_after(httpx.Response(429)))
+
+    def test_only_transient_failures_are_retryable(self):
+        policy = RetryPolicy()
+        for status_code in (429, 502, 503, 504):
+            self.assertTrue(policy.is_retryable(status_error(status_code)), status_code)
+        for status_code in (400, 401, 404, 422):
+            self.assertFalse(policy.is_retryable(status_error(status_code)), status_code)
+        self.assertTrue(policy.is_retryable(httpx.ConnectError("refused")))
+        self.assertTrue(policy.is_retryable(httpx.ReadTimeout("timeout")))
+        self.assertFalse(policy.is_retryable(KeyError("choices")))
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+        delays = [policy.backoff(attempt) for attempt in range(1, 8) for _ in range(20)]
+        self.assertTrue(all(0 <= delay <= 5.0 for delay in delays))
+        self.assertTrue(all(policy.backoff(1) <= 1.0 for _ in range(20)))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_after_takes_precedence(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=100.0)
+        self.assertEqual(policy.retry_delay(status_error(429, {"Retry-After": "2"}), 1), 2.0)
+        self.assertIsNone(policy.retry_delay(status_error(429, {"Retry-After": "2"}), 3))
+
+    def test_retry_after_is_capped_by_max_delay(self):
+        policy = RetryPolicy(max_attempts=3, max_delay=30.0)
+        self.assertEqual(policy.retry_delay(status_error(429, {"Retry-After": "3600"}), 1), 30.0)
+        self.assertIsNone(policy.retry_delay(status_error(400), 1))
+
+    def test_call_with_retry_gives_up_after_max_attempts(self):
+        calls = []
+
+        def send():
+            calls.append(1)
+            raise status_error(503)
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            call_with_retry(send, NO_DELAY)
+        self.assertEqual(len(calls), 3)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.wait_time(), 10.0)
+
+    def test_single_probe_after_reset_timeout(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 10.0
+
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertGreater(self.breaker.wait_time(), 0.0)
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+
+    def test_failed_probe_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 10.0
+        self.breaker.wait_time()
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.wait_time(), 10.0)
+
+    def test_abandoned_probe_lets_another_request_probe(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 10.0
+        self.breaker.wait_time()
+
+        self.breaker.release()
+        self.assertEqual(self.breaker.wait_time(), 0.0)
+
+    def test_retry_after_keeps_breaker_open_longer(self):
+        for _ in range(3):
+            self.breaker.record_failure(retry_after=60.0)
+        self.assertEqual(self.breaker.wait_time(), 60.0)
+
+
+class TestRetryingLlamaChatModel(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.requests = []
+
+    def _model(self, responses, **kwargs) -> LlamaChatModel:
+        responses = list(responses)
+
+        def reply(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return responses.pop(0)
+
+        model = LlamaChatModel(model_name="llama", base_url="http://llm", retry_policy=NO_DELAY, **kwargs)
+        model._http = PooledClient(transport=httpx.MockTransport(reply), async_transport=httpx.MockTransport(reply))
+        return model
+
+    def test_transient_failures_are_retried(self):
+        model = self._model([httpx.Response(503), httpx.Response(429, headers={"Retry-After": "0"}),
+                             httpx.Response(200, json=completion("ok"))])
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(model.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_errors_are_not_retried(self):
+        model = self._model([httpx.Response(400)])
+        with self.assertRaises(httpx.HTTPStatusError):
+            model.invoke([HumanMessage(content="hi")])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_stream_is_retried_before_the_first_chunk(self):
+        body = f"data: {json.dumps({'choices': [{'delta': {'content': 'ok'}}]})}\n\ndata: [DONE]\n\n"
+        model = self._model([httpx.Response(502), httpx.Response(200, text=body)])
+        self.assertEqual([chunk.content for chunk in model.stream([HumanMessage(content="hi")])], ["ok"])
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_async_requests_are_retried(self):
+        model = self._model([httpx.Response(503), httpx.Response(200, json=completion("ok"))])
+        self.assertEqual((await model.ainvoke([HumanMessage(content="hi")])).content, "ok")
+        self.assertEqual(len(self.requests), 2)
+
+    def test_open_breaker_pauses_requests(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        model = self._model([httpx.Response(503), httpx.Response(503),
+                             httpx.Response(200, json=completion("ok"))],
+                            circuit_breaker=breaker)
+        start = time.monotonic()
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_cancelled_stream_releases_the_probe(self):
+        async def hang(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(60)
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        breaker.record_failure()
+        model = LlamaChatModel(model_name="llama", base_url="http://llm", circuit_breaker=breaker)
+        model._http = PooledClient(async_transport=httpx.MockTransport(hang))
+
+        async def consume():
+            return [chunk async for chunk in model.astream([HumanMessage(content="hi")])]
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        # the next request becomes the probe instead of waiting for the cancelled one
+        self.assertEqual(breaker.wait_time(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
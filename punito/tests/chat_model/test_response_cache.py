@@ -0,0 +1,149 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.response_cache import ResponseCache, ResponseCacheMiss
+
+
+def _payload(content: str, stream: bool = False) -> dict:
+    return {"model": "llama", "messages": [{"role": "human", "content": content}], "stream": stream}
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(Path(self.tmp_dir.name) / "responses")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_ignores_stream_flag_and_key_order(self):
+        payload = _payload("hi")
+        reordered = {"stream": True, "messages": payload["messages"], "model": "llama"}
+
+        self.assertEqual(ResponseCache.key(payload), ResponseCache.key(reordered))
+        self.assertNotEqual(ResponseCache.key(payload), ResponseCache.key(_payload("hello")))
+        self.assertNotEqual(ResponseCache.key(payload), ResponseCache.key({**payload, "temperature": 0.2}))
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get(_payload("hi")))
+        self.cache.put(_payload("hi"), "answer")
+        self.assertEqual(self.cache.get(_payload("hi", stream=True)), "answer")
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(self.cache.cache_dir, ttl_seconds=60)
+        cache.put(_payload("hi"), "answer")
+        path = next(cache.cache_dir.glob("*/*.json"))
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        path.write_text(json.dumps({**entry, "created": time.time() - 120}), encoding="utf-8")
+
+        self.assertIsNone(cache.get(_payload("hi")))
+        self.assertFalse(path.exists())
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.put(_payload("first"), "x" * 200)
+        entry_size = next(self.cache.cache_dir.glob("*/*.json")).stat().st_size
+        cache = ResponseCache(self.cache.cache_dir, max_bytes=2 * entry_size + 10)
+        time.sleep(0.01)
+        cache.put(_payload("second"), "x" * 200)
+        time.sleep(0.01)
+        self.assertIsNotNone(cache.get(_payload("first")))
+        cache.put(_payload("third"), "x" * 200)
+
+        self.assertIsNotNone(cache.get(_payload("first")))
+        self.assertIsNone(cache.get(_payload("second")))
+        self.assertIsNotNone(cache.get(_payload("third")))
+
+    def test_corrupted_entries_are_discarded(self):
+        self.cache.put(_payload("hi"), "answer")
+        path = next(self.cache.cache_dir.glob("*/*.json"))
+        path.write_text("{not json", encoding="utf-8")
+
+        self.assertIsNone(self.cache.get(_payload("hi")))
+        self.assertFalse(path.exists())
+
+    def test_exported_archive_imports_into_another_cache(self):
+        self.cache.put(_payload("hi"), "answer")
+        self.cache.put(_payload("hello"), "other")
+        archive = Path(self.tmp_dir.name) / "export" / "responses.zip"
+        self.assertEqual(self.cache.export_archive(archive), 2)
+
+        other = ResponseCache(Path(self.tmp_dir.name) / "other")
+        self.assertEqual(other.import_archive(archive), 2)
+        self.assertEqual(other.get(_payload("hi")), "answer")
+        self.assertEqual(other.import_archive(archive), 0)
+
+
+class TestCachedLlamaChatModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(Path(self.tmp_dir.name))
+        self.requests = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _model(self, cache_mode: str, content: str = "ok") -> LlamaChatModel:
+        def reply(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            if json.loads(request.content)["stream"]:
+                return httpx.Response(200, text=f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n"
+                                                "data: [DONE]\n\n")
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+        model = LlamaChatModel(model_name="llama", base_url="http://llm", cache_mode=cache_mode,
+                               response_cache=self.cache)
+        model._http = PooledClient(transport=httpx.MockTransport(reply))
+        return model
+
+    def test_readwrite_answers_repeated_requests_from_cache(self):
+        model = self._model("readwrite")
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertEqual([chunk.content for chunk in model.stream([HumanMessage(content="hi")])], ["ok"])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_streamed_completions_are_cached(self):
+        self._model("write", "streamed").stream([HumanMessage(content="hi")]).__next__()
+        self.assertIsNone(self.cache.get(_payload("hi")))
+
+        list(self._model("write", "streamed").stream([HumanMessage(content="hi")]))
+        self.assertEqual(self._model("read").invoke([HumanMessage(content="hi")]).content, "streamed")
+
+    def test_read_does_not_store_and_write_does_not_read(self):
+        self._model("read").invoke([HumanMessage(content="hi")])
+        self.assertIsNone(self.cache.get(_payload("hi")))
+
+        self._model("write", "first").invoke([HumanMessage(content="hi")])
+        self.assertEqual(self._model("write", "second").invoke([HumanMessage(content="hi")]).content, "second")
+        self.assertEqual(len(self.requests), 3)
+
+    def test_replay_only_never_contacts_the_server(self):
+        self._model("write").invoke([HumanMessage(content="hi")])
+        replay = self._model("replay-only")
+
+        self.assertEqual(replay.invoke([HumanMessage(content="hi")]).content, "ok")
+        with self.assertRaises(ResponseCacheMiss):
+            replay.invoke([HumanMessage(content="unknown")])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_off_ignores_the_cache(self):
+        self.cache.put(_payload("hi"), "cached")
+        self.assertEqual(self._model("off").invoke([HumanMessage(content="hi")]).content, "ok")
+
+    def test_invalid_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LlamaChatModel(model_name="llama", base_url="http://llm", cache_mode="sometimes")
+
+
+if __name__ == '__main__':
+    unittest.main()
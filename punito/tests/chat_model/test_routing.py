@@ -0,0 +1,176 @@
+import asyncio
+import unittest
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import RetryPolicy
+from punito.chat_model.routing import EndpointRouter
+from punito.tests.chat_model.helpers import FakeClock, completion, status_error
+
+URLS = ["http://replica-1", "http://replica-2", "http://replica-3"]
+
+
+class TestEndpointRouter(unittest.TestCase):
+
+    def test_requests_go_to_least_outstanding_endpoint(self):
+        router = EndpointRouter(URLS)
+        with router.route() as first, router.route() as second, router.route() as third:
+            self.assertEqual(sorted([first, second, third]), URLS)
+            with router.route() as fourth:
+                self.assertIn(fourth, URLS)
+        self.assertEqual([endpoint.outstanding for endpoint in router.metrics()], [0, 0, 0])
+
+    def test_idle_endpoints_share_sequential_requests(self):
+        router = EndpointRouter(URLS)
+        used = set()
+        for _ in range(3):
+            with router.route() as url:
+                used.add(url)
+        self.assertEqual(used, set(URLS))
+
+    def test_affinity_key_sticks_to_one_endpoint(self):
+        router = EndpointRouter(URLS, affinity=True)
+        for key in ["OrderController", "PanelControllerBean", "Other"]:
+            self.assertEqual(len({router.select(key) for _ in range(10)}), 1)
+        # keys spread over the endpoints
+        self.assertGreater(len({router.select(f"Class{i}") for i in range(50)}), 1)
+
+    def test_ejection_moves_only_the_keys_of_the_ejected_endpoint(self):
+        router = EndpointRouter(URLS, affinity=True, failure_threshold=1)
+        keys = [f"Class{i}" for i in range(50)]
+        before = {key: router.select(key) for key in keys}
+
+        router.record_failure(URLS[0])
+        after = {key: router.select(key) for key in keys}
+
+        for key in keys:
+            if before[key] == URLS[0]:
+                self.assertNotEqual(after[key], URLS[0])
+            else:
+                self.assertEqual(after[key], before[key])
+
+    def test_failing_endpoint_is_ejected_and_admitted_on_trial(self):
+        clock = FakeClock()
+        router = EndpointRouter(URLS[:2], failure_threshold=2, ejection_time=10.0, clock=clock)
+
+        router.record_failure(URLS[0])
+        self.assertTrue(router.metrics()[0].admitted)
+        router.record_failure(URLS[0])
+        self.assertFalse(router.metrics()[0].admitted)
+        self.assertEqual({router.select() for _ in range(4)}, {URLS[1]})
+
+        clock.now = 10.0
+        self.assertTrue(router.metrics()[0].admitted)
+        # a single failure on trial ejects it again
+        router.record_failure(URLS[0])
+        self.assertFalse(router.metrics()[0].admitted)
+        self.assertEqual(router.metrics()[0].ejections, 2)
+
+    def test_route_records_outcomes(self):
+        router = EndpointRouter(URLS[:1], failure_threshold=1)
+        with self.assertRaises(ValueError), router.route():
+            raise ValueError("bad request")
+        self.assertTrue(router.metrics()[0].admitted)
+
+        with self.assertRaises(httpx.HTTPStatusError), router.route():
+            raise status_error(503, url=URLS[0])
+        self.assertEqual(router.metrics()[0].failures, 1)
+        self.assertFalse(router.metrics()[0].admitted)
+
+    def test_requests_go_to_all_endpoints_if_all_are_ejected(self):
+        router = EndpointRouter(URLS[:2], failure_threshold=1)
+        for url in URLS[:2]:
+            router.record_failure(url)
+        self.assertIn(router.select(), URLS[:2])
+
+    def test_probes_eject_and_readmit(self):
+        router = EndpointRouter(URLS[:2], ejection_time=60.0)
+        healthy = {URLS[0]: True, URLS[1]: False}
+
+        router.probe(lambda url: healthy[url])
+        self.assertEqual([endpoint.admitted for endpoint in router.metrics()], [True, False])
+
+        healthy[URLS[1]] = True
+        router.probe(lambda url: healthy[url])
+        self.assertEqual([endpoint.admitted for endpoint in router.metrics()], [True, True])
+
+    def test_failing_probe_counts_as_unhealthy(self):
+        router = EndpointRouter(URLS[:2])
+
+        def check(url):
+            if url == URLS[1]:
+                raise httpx.ConnectError("refused")
+            return True
+
+        router.probe(check)
+        self.assertEqual([endpoint.admitted for endpoint in router.metrics()], [True, False])
+
+
+class TestRoutedLlamaChatModel(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = []
+        self.model = LlamaChatModel(model_name="llama", base_url=URLS[0], endpoint="/v1/chat/completions",
+                                    retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0),
+                                    circuit_breaker=None, router=EndpointRouter(URLS[:2], failure_threshold=1))
+
+    def _use_transport(self, handler):
+        def record(request: httpx.Request) -> httpx.Response:
+            self.hosts.append(request.url.host)
+            return handler(request)
+
+        transport = httpx.MockTransport(record)
+        self.model._http = PooledClient(transport=transport, async_transport=transport)
+
+    def test_failed_request_is_retried_on_another_replica(self):
+        def handler(request):
+            if request.url.host == "replica-1":
+                return httpx.Response(503)
+            return httpx.Response(200, json=completion("ok"))
+
+        self._use_transport(handler)
+        for _ in range(3):
+            self.assertEqual(self.model.invoke([HumanMessage(content="hi")]).content, "ok")
+
+        # ejected after its first failure
+        self.assertEqual(self.hosts.count("replica-1"), 1)
+        self.assertFalse(self.model.routing_metrics()[0].admitted)
+
+    def test_affinity_key_is_routed(self):
+        self.model.router = EndpointRouter(URLS, affinity=True)
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+
+        for i in range(4):
+            self.model.invoke([HumanMessage(content=f"chunk {i}")], affinity_key="OrderController")
+        self.assertEqual(len(set(self.hosts)), 1)
+        self.assertEqual(f"http://{self.hosts[0]}", self.model.router.select("OrderController"))
+
+    def test_async_requests_are_routed(self):
+        self._use_transport(lambda request: httpx.Response(200, json=completion("ok")))
+
+        async def run():
+            return await asyncio.gather(*(self.model.ainvoke([HumanMessage(content=f"chunk {i}")])
+                                          for i in range(4)))
+
+        self.assertEqual([message.content for message in asyncio.run(run())], ["ok"] * 4)
+        self.assertEqual(set(self.hosts), {"replica-1", "replica-2"})
+
+    def test_health_probes_use_health_endpoint(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            return httpx.Response(503 if request.url.host == "replica-2" else 200)
+
+        self._use_transport(handler)
+        self.model.router.probe(self.model._probe_endpoint)
+
+        self.assertEqual(paths, ["/health", "/health"])
+        self.assertEqual([endpoint.admitted for endpoint in self.model.routing_metrics()], [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
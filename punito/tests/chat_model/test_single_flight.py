@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from punito.chat_model import LlamaChatModel
+from punito.chat_model.http_pool import PooledClient
+from punito.chat_model.resilience import RetryPolicy
+from punito.chat_model.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_result(self):
+        group = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = 0
+
+        def fn():
+            nonlocal calls
+            calls += 1
+            started.set()
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(group.do, "key", fn)
+            started.wait(5)
+            followers = [executor.submit(group.do, "key", fn) for _ in range(3)]
+            while group.metrics().coalesced < 3:
+                time.sleep(0.001)
+            release.set()
+            results = [leader.result()] + [follower.result() for follower in followers]
+
+        self.assertEqual(results, ["result"] * 4)
+        self.assertEqual(calls, 1)
+        self.assertEqual(group.metrics().calls, 4)
+        self.assertEqual(group.metrics().in_flight, 0)
+
+    def test_error_is_raised_to_every_caller(self):
+        group = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fn():
+            started.set()
+            release.wait(5)
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(group.do, "key", fn)
+            started.wait(5)
+            follower = executor.submit(group.do, "key", fn)
+            while group.metrics().coalesced < 1:
+                time.sleep(0.001)
+            release.set()
+            self.assertRaises(ValueError, leader.result)
+            self.assertRaises(ValueError, follower.result)
+
+    def test_finished_calls_are_not_shared(self):
+        group = SingleFlight()
+        self.assertEqual(group.do("key", lambda: 1), 1)
+        self.assertEqual(group.do("key", lambda: 2), 2)
+        self.assertEqual(group.metrics().coalesced, 0)
+
+    def test_cancelled_caller_does_not_cancel_the_call(self):
+        group = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            cancelled = asyncio.create_task(group.ado("key", fn))
+            waiting = asyncio.create_task(group.ado("key", fn))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            return await waiting
+
+        self.assertEqual(asyncio.run(run()), "result")
+        self.assertEqual(group.metrics().coalesced, 1)
+
+
+class TestSingleFlightLlamaChatModel(unittest.TestCase):
+
+    def _model(self) -> LlamaChatModel:
+        return LlamaChatModel(model_name="llama", base_url="http://llm",
+                              retry_policy=RetryPolicy(base_delay=0.0, max_delay=0.0))
+
+    def test_identical_requests_in_flight_are_coalesced(self):
+        requests = []
+
+        async def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+        model = self._model()
+        model._http = PooledClient(async_transport=httpx.MockTransport(handle))
+
+        async def run():
+            same = [model.ainvoke([HumanMessage(content="hi")]) for _ in range(5)]
+            other = model.ainvoke([HumanMessage(content="other")])
+            return await asyncio.gather(*same, other)
+
+        results = asyncio.run(run())
+        self.assertEqual([result.content for result in results], ["ok"] * 6)
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(model.single_flight_metrics().coalesced, 4)
+
+    def test_threads_share_a_failed_request(self):
+        requests = 0
+        release = threading.Event()
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            nonlocal requests
+            requests += 1
+            release.wait(5)
+            return httpx.Response(400)
+
+        model = self._model()
+        model._http = PooledClient(transport=httpx.MockTransport(handle))
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(model.invoke, [HumanMessage(content="hi")]) for _ in range(3)]
+            while model.single_flight_metrics().coalesced < 2:
+                time.sleep(0.001)
+            release.set()
+            for future in futures:
+                self.assertRaises(httpx.HTTPStatusError, future.result)
+
+        self.assertEqual(requests, 1)
+
+    def test_disabled(self):
+        model = self._model()
+        model.single_flight = None
+        model._http = PooledClient(transport=httpx.MockTransport(lambda request: httpx.Response(
+            200, json={"choices": [{"message": {"content": "ok"}}]})))
+
+        self.assertEqual(model.invoke([HumanMessage(content="hi")]).content, "ok")
+        self.assertIsNone(model.single_flight_metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
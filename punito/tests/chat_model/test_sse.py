@@ -0,0 +1,73 @@
+import json
+import unittest
+
+from punito.chat_model.sse import SSEDecoder, parse_delta
+from punito.tests.chat_model.helpers import FakeClock
+
+
+def _event(content, **delta) -> bytes:
+    delta = {**delta, "content": content}
+    return f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n".encode()
+
+
+class TestParseDelta(unittest.TestCase):
+
+    def test_plain_delta(self):
+        self.assertEqual(parse_delta(b'{"choices":[{"delta":{"content":"abc"}}]}'), "abc")
+        self.assertEqual(parse_delta(b'{"choices": [{"delta": {"content": "a b"}}]}'), "a b")
+
+    def test_escaped_and_unicode_deltas(self):
+        for content in ['say "hi"', "line\nbreak", "back\\slash", "Grüße", "€"]:
+            self.assertEqual(parse_delta(_event(content)[len(b"data: "):].strip()), content)
+
+    def test_events_without_content(self):
+        self.assertEqual(parse_delta(b'{"choices":[{"delta":{"role":"assistant"}}]}'), "")
+        self.assertIsNone(parse_delta(b'{"choices":[{"delta":{"content":null}}]}'))
+
+    def test_malformed_events(self):
+        self.assertIsNone(parse_delta(b'{"choices":[{"delta":'))
+        self.assertIsNone(parse_delta(b'{"choices":[]}'))
+
+
+class TestSSEDecoder(unittest.TestCase):
+
+    def test_lines_split_across_reads(self):
+        body = b"".join(_event(token) for token in ["a", "b", "c"]) + b"data: [DONE]\n\n"
+        decoder = SSEDecoder()
+
+        deltas = []
+        for i in range(0, len(body), 7):
+            deltas.extend(decoder.feed(body[i:i + 7]))
+
+        self.assertEqual(deltas, ["a", "b", "c"])
+        self.assertTrue(decoder.done)
+
+    def test_other_fields_and_crlf_are_ignored(self):
+        decoder = SSEDecoder()
+        deltas = decoder.feed(b": keep-alive\r\nevent: message\r\n" + _event("x").replace(b"\n", b"\r\n"))
+        self.assertEqual(deltas, ["x"])
+
+    def test_last_line_without_line_break(self):
+        decoder = SSEDecoder()
+        self.assertEqual(decoder.feed(_event("a") + _event("b").strip()), ["a"])
+        self.assertEqual(decoder.close(), ["b"])
+
+    def test_nothing_is_decoded_after_done(self):
+        decoder = SSEDecoder()
+        self.assertEqual(decoder.feed(b"data: [DONE]\n\n" + _event("late")), [])
+        self.assertEqual(decoder.close(), [])
+
+    def test_deltas_are_coalesced_per_interval(self):
+        clock = FakeClock()
+        decoder = SSEDecoder(flush_interval=0.05, clock=clock)
+
+        self.assertEqual(decoder.feed(_event("a")), [])
+        clock.now = 0.02
+        self.assertEqual(decoder.feed(_event("b")), [])
+        clock.now = 0.06
+        self.assertEqual(decoder.feed(_event("c")), ["abc"])
+        self.assertEqual(decoder.feed(_event("d") + b"data: [DONE]\n\n"), ["d"])
+
+
+if __name__ == '__main__':
+    unittest.main()
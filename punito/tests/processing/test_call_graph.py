@@ -0,0 +1,61 @@
+import unittest
+
+from punito.processing import parse_java_class, get_all_methods
+from punito.processing.call_graph import CallGraph
+from punito.processing.preprocessor import get_dependencies
+
+
+JAVA_CODE = """
+public class TestClass {
+    public void target() {
+        a();
+        publicHelper();
+    }
+    public void publicHelper() {
+        d();
+    }
+    private void a() {
+        b();
+    }
+    private void b() {
+        c();
+        a();
+        publicHelper();
+    }
+    private void c() {
+        missing();
+    }
+    private void d() {
+    }
+}
+"""
+
+
+class TestCallGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.methods = get_all_methods(parse_java_class(JAVA_CODE))
+        self.graph = CallGraph(self.methods)
+
+    def test_calls_only_contain_declared_methods(self):
+        self.assertEqual(self.graph.calls["target"], {"a", "publicHelper"})
+        self.assertEqual(self.graph.calls["c"], set())
+
+    def test_closure_of_recursive_helpers(self):
+        self.assertEqual(self.graph.private_closure("a"), {"a", "b", "c"})
+        self.assertEqual(self.graph.private_closure("b"), {"a", "b", "c"})
+        self.assertEqual(self.graph.private_closure("c"), {"c"})
+
+    def test_closure_of_public_or_unknown_method_is_empty(self):
+        self.assertEqual(self.graph.private_closure("target"), set())
+        self.assertEqual(self.graph.private_closure("missing"), set())
+
+    def test_closure_matches_recursive_dependencies(self):
+        for name in self.methods:
+            deps = set()
+            get_dependencies(name, self.methods, deps)
+            self.assertEqual(self.graph.private_closure(name), deps, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
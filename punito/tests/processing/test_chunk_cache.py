@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from punito.processing import get_chunked_code
+from punito.processing.chunk_cache import ChunkCache, CachedClass, get_cached_class, stream_cached_class
+
+
+JAVA_CODE = """
+public class TestClass {
+    private String name;
+
+    public void target() {
+        helper();
+    }
+
+    private void helper() {
+        name = "x";
+    }
+}
+"""
+
+
+class TestChunkCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ChunkCache(Path(self.tmp_dir.name), version="1.0.0")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_second_lookup_skips_chunking(self):
+        expected_chunks = get_chunked_code(JAVA_CODE)
+        first = get_cached_class(JAVA_CODE, self.cache)
+        self.assertIn("helper", first.layouts["target"])
+        self.assertEqual(first.method_index["target"][2], ["helper"])
+
+        with mock.patch("punito.processing.chunk_cache.get_planned_layouts", side_effect=AssertionError), \
+                mock.patch("punito.processing.class_index.parse_tokens", side_effect=AssertionError):
+            second = get_cached_class(JAVA_CODE, self.cache)
+            chunks = second.chunks(JAVA_CODE)
+        self.assertEqual(first, second)
+        self.assertEqual(chunks, expected_chunks)
+
+    def test_stream_caches_class_once_exhausted(self):
+        stream = stream_cached_class(JAVA_CODE, self.cache)
+        first = next(stream.layouts)
+        self.assertEqual(first[:2], ("target", "target"))
+        self.assertIsNone(self.cache.get(JAVA_CODE))
+
+        rest = list(stream.layouts)
+        self.assertEqual(self.cache.get(JAVA_CODE).layouts, get_cached_class(JAVA_CODE, self.cache).layouts)
+
+        with mock.patch("punito.processing.chunk_cache.iter_chunk_layouts", side_effect=AssertionError):
+            cached = stream_cached_class(JAVA_CODE, self.cache)
+            self.assertEqual(list(cached.layouts), [first] + rest)
+        self.assertEqual(cached.method_index, stream.method_index)
+
+    def test_key_depends_on_content_and_version(self):
+        other_version = ChunkCache(Path(self.tmp_dir.name), version="2.0.0")
+        self.assertNotEqual(self.cache.key(JAVA_CODE), self.cache.key(JAVA_CODE + " "))
+        self.assertNotEqual(self.cache.key(JAVA_CODE), other_version.key(JAVA_CODE))
+        self.assertNotEqual(self.cache.key(JAVA_CODE), self.cache.key(JAVA_CODE, "min-chunks"))
+        self.assertNotEqual(self.cache.key(JAVA_CODE), self.cache.key(JAVA_CODE, prune=True))
+
+    def test_key_depends_on_parser_backend(self):
+        keys = set()
+        for backend in ("scanner", "javalang"):
+            with mock.patch("punito.processing.chunk_cache.get_parser_backend", return_value=backend):
+                keys.add(self.cache.key(JAVA_CODE))
+        self.assertEqual(len(keys), 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        entry = CachedClass({"m": {"x" * 1000: None}}, {})
+        self.cache.put("a", entry)
+        self.cache.put("b", entry)
+        entry_size = self.cache._entry_path(self.cache.key("a")).stat().st_size
+
+        old = self.cache._entry_path(self.cache.key("a"))
+        os.utime(old, (1, 1))
+        self.cache.max_bytes = 2 * entry_size
+        self.cache.put("c", entry)
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_directory_is_scanned_only_when_over_limit(self):
+        entry = CachedClass({"m": {"x" * 1000: None}}, {})
+        with mock.patch.object(Path, "glob", autospec=True, side_effect=Path.glob) as glob:
+            self.cache.put("a", entry)
+            entry_size = self.cache._entry_path(self.cache.key("a")).stat().st_size
+            self.cache.max_bytes = 3 * entry_size
+            self.cache.put("b", entry)
+            self.cache.put("b", entry)
+            self.cache.put("c", entry)
+            self.assertEqual(glob.call_count, 1)
+
+            self.cache.put("d", entry)
+            self.assertEqual(glob.call_count, 2)
+        self.assertEqual(len(list(Path(self.tmp_dir.name).glob("*/*.bin"))), 3)
+
+    def test_corrupted_entry_is_a_miss(self):
+        self.cache.put("a", CachedClass({}, {}))
+        self.cache._entry_path(self.cache.key("a")).write_bytes(b"garbage")
+        self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
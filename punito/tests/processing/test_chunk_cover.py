@@ -0,0 +1,106 @@
+import unittest
+
+from punito.processing.chunk_cover import get_minimal_cover_layouts, get_planned_layouts
+from punito.processing.preprocessor import get_chunk_layouts
+
+
+JAVA_CODE = """
+public class TestClass {
+    private String name;
+
+    public void first() {
+        d1();
+    }
+
+    public void second() {
+        d2();
+        d3();
+    }
+
+    private void d1() {
+        name = "d1";
+        d2();
+    }
+
+    private void d2() {
+        name = "d2";
+    }
+
+    private void d3() {
+        name = "d3";
+    }
+}
+"""
+
+
+SHARED_CODE = """
+public class TestClass {
+    private String name;
+
+    public void large() {
+        shared();
+        prepare();
+    }
+
+    public void small() {
+        shared();
+    }
+
+    private void shared() {
+        name = "shared";
+    }
+
+    private void prepare() {
+        name = name.trim().toLowerCase().replace("a", "b").replace("c", "d").replace("e", "f").strip();
+    }
+}
+"""
+
+
+def _tested(layouts):
+    return sorted(name for chunks in layouts.values() for name in chunks)
+
+
+class TestMinimalCoverLayouts(unittest.TestCase):
+
+    def test_dependencies_of_other_chunks_keep_their_chunk(self):
+        layouts = get_minimal_cover_layouts(JAVA_CODE)
+
+        # d2 is rendered in the chunk of d1, but only its own chunk makes it the tested function
+        self.assertEqual(list(layouts["first"]), ["first", "d1"])
+        self.assertEqual(list(layouts["second"]), ["second", "d2", "d3"])
+        self.assertEqual(layouts["first"]["d1"].extra, ("d2",))
+
+    def test_tests_the_same_methods_as_the_default_chunking(self):
+        for java_code in (JAVA_CODE, SHARED_CODE):
+            default = get_chunk_layouts(java_code)
+            for cost in ("chunks", "tokens"):
+                with self.subTest(cost=cost):
+                    self.assertEqual(_tested(get_minimal_cover_layouts(java_code, cost)), _tested(default))
+
+    def test_shared_dependency_is_tested_in_the_cheapest_context(self):
+        self.assertIn("shared", get_chunk_layouts(SHARED_CODE)["large"])
+
+        layouts = get_minimal_cover_layouts(SHARED_CODE, "tokens")
+        self.assertEqual(list(layouts["large"]), ["large", "prepare"])
+        self.assertEqual(list(layouts["small"]), ["small", "shared"])
+
+    def test_does_not_depend_on_public_method_order(self):
+        first = "    public void first() {\n        d1();\n    }\n\n"
+        reordered = JAVA_CODE.replace(first, "").replace("    private void d1()", first + "    private void d1()")
+
+        layouts = get_minimal_cover_layouts(JAVA_CODE)
+        self.assertEqual(get_minimal_cover_layouts(reordered), layouts)
+
+    def test_invalid_planner(self):
+        with self.assertRaises(ValueError):
+            get_minimal_cover_layouts(JAVA_CODE, "requests")
+        with self.assertRaises(ValueError):
+            get_planned_layouts(JAVA_CODE, "random")
+
+    def test_order_planner_is_the_default_chunking(self):
+        self.assertEqual(get_planned_layouts(JAVA_CODE, "order"), get_chunk_layouts(JAVA_CODE))
+
+
+if __name__ == '__main__':
+    unittest.main()
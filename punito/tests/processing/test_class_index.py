@@ -0,0 +1,118 @@
+import unittest
+from unittest import mock
+
+from punito.processing import ClassIndex, get_class_index, parse_java_class, get_all_methods
+from punito.processing.preprocessor import extract_method_code, extract_imports
+from punito.processing.scanner import ScannedClass
+
+
+JAVA_CODE = """import java.util.List;
+import java.util.Map;
+
+@Named
+public class TestClass extends Base {
+    private String name;
+
+    public void target() {
+        helper();
+    }
+
+    private void helper() {
+        if (name != null) {
+            name = "x";
+        }
+    }
+}
+"""
+
+
+class TestClassIndex(unittest.TestCase):
+
+    def test_method_code_matches_extract_method_code(self):
+        index = ClassIndex(JAVA_CODE)
+        methods = get_all_methods(parse_java_class(JAVA_CODE))
+        for name, method in methods.items():
+            self.assertEqual(index.method_code(name), extract_method_code(JAVA_CODE, method))
+
+    def test_method_code_is_slice_of_source(self):
+        index = ClassIndex(JAVA_CODE)
+        start, end = index.method_spans["helper"]
+        self.assertTrue(index.method_code("helper").startswith("    private void helper()"))
+        self.assertTrue(index.method_code("helper").endswith("    }"))
+        self.assertEqual(index.method_code("helper"), JAVA_CODE[start:end])
+
+    def test_braces_in_literals_and_comments_are_ignored(self):
+        java_code = """
+public class TestClass {
+    @Override
+    public String target() {
+        String s = "}{ }"; // }
+        /* } */
+        return s;
+    }
+
+    private void other() {
+    }
+}
+"""
+        index = ClassIndex(java_code)
+        code = index.method_code("target")
+        self.assertTrue(code.startswith("    @Override\n    public String target()"))
+        self.assertTrue(code.endswith("return s;\n    }"))
+        self.assertNotIn("other", code)
+
+    def test_state_updating_methods(self):
+        java_code = """
+public class TestClass {
+    private String name;
+
+    public void delegating() {
+        helper();
+    }
+
+    public void assigning() {
+        name = "x";
+    }
+
+    public void setting() {
+        model.setName("x");
+    }
+
+    private void helper() {
+        String local = "y";
+    }
+}
+"""
+        index = ClassIndex(java_code)
+        self.assertEqual(index.state_updating_methods, {"assigning", "setting"})
+        self.assertFalse(index.fields_update_state)
+
+    def test_class_facts(self):
+        index = ClassIndex(JAVA_CODE)
+        self.assertEqual(index.imports, "import java.util.List;\nimport java.util.Map;")
+        self.assertEqual(index.imports, extract_imports(JAVA_CODE))
+        self.assertEqual(index.class_definition, "@Named\npublic class TestClass extends Base")
+        self.assertEqual(index.field_names, {"name"})
+        self.assertEqual(index.class_fields, "private String name;")
+
+    def test_line_offsets(self):
+        index = ClassIndex(JAVA_CODE)
+        self.assertEqual(index.line_to_offset(2), JAVA_CODE.index("import java.util.Map;"))
+        self.assertEqual(index.offset_to_line(JAVA_CODE.index("public class")), 5)
+
+    def test_index_is_cached_per_source(self):
+        self.assertIs(get_class_index(JAVA_CODE), get_class_index(JAVA_CODE))
+
+    def test_index_follows_parser_setting(self):
+        for backend in ["javalang", "scanner"]:
+            with mock.patch("punito.processing.class_index.get_parser_backend", return_value=backend):
+                self.assertEqual(get_class_index(JAVA_CODE).backend, backend)
+        self.assertIsNot(get_class_index(JAVA_CODE, "javalang"), get_class_index(JAVA_CODE, "scanner"))
+
+    def test_parsers_share_default_backend(self):
+        self.assertEqual(ClassIndex(JAVA_CODE).backend, "javalang")
+        self.assertNotIsInstance(parse_java_class(JAVA_CODE), ScannedClass)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from punito.processing import ClassIndex
+from punito.processing.chunk_cache import build_method_index
+from punito.processing.preprocessor import get_chunk_layouts
+from punito.processing.fingerprint import compute_chunk_fingerprints, compute_generation_fingerprint
+
+
+JAVA_CODE = """
+public class TestClass {
+    private String name;
+
+    public void target() {
+        a();
+        b();
+    }
+
+    private void a() {
+        nested();
+    }
+
+    private void b() {
+        name = "b";
+    }
+
+    private void nested() {
+        name = "nested";
+    }
+}
+"""
+
+
+def _fingerprints(java_code, generation=""):
+    index = ClassIndex(java_code)
+    return compute_chunk_fingerprints(get_chunk_layouts(java_code), build_method_index(index), index, generation)
+
+
+class TestChunkFingerprints(unittest.TestCase):
+
+    def test_formatting_and_comments_do_not_change_fingerprints(self):
+        reformatted = JAVA_CODE.replace('name = "b";', '// comment\n        name  =  "b" ;')
+        self.assertEqual(_fingerprints(JAVA_CODE), _fingerprints(reformatted))
+
+    def test_change_of_transitive_dependency_changes_only_its_chunks(self):
+        before = _fingerprints(JAVA_CODE)
+        after = _fingerprints(JAVA_CODE.replace('name = "nested";', 'name = "changed";'))
+
+        self.assertNotEqual(before["target"]["a"], after["target"]["a"])
+        self.assertEqual(before["target"]["b"], after["target"]["b"])
+        self.assertEqual(before["target"]["target"], after["target"]["target"])
+
+    def test_change_of_class_context_changes_all_chunks(self):
+        before = _fingerprints(JAVA_CODE)
+        changes = [
+            ("private String name;", 'private String name = "initial";'),
+            ("private String name;", "private CharSequence name;"),
+            ("public class TestClass {", "import java.util.List;\n\npublic class TestClass {"),
+            ("public class TestClass {", "public class TestClass extends Base {"),
+        ]
+        for old, new in changes:
+            with self.subTest(new=new):
+                after = _fingerprints(JAVA_CODE.replace(old, new))
+                for name in before["target"]:
+                    self.assertNotEqual(before["target"][name], after["target"][name])
+
+    def test_change_of_prompts_or_parameters_changes_all_chunks(self):
+        generation = compute_generation_fingerprint(["system: plan", "system: tests"], {"temperature": 0.0})
+        before = _fingerprints(JAVA_CODE, generation)
+        changes = [
+            (["system: plan", "system: tests, changed"], {"temperature": 0.0}),
+            (["system: plan", "system: tests"], {"temperature": 0.7}),
+        ]
+        for templates, params in changes:
+            with self.subTest(templates=templates, params=params):
+                after = _fingerprints(JAVA_CODE, compute_generation_fingerprint(templates, params))
+                for name in before["target"]:
+                    self.assertNotEqual(before["target"][name], after["target"][name])
+
+
+if __name__ == '__main__':
+    unittest.main()
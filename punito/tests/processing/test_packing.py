@@ -0,0 +1,98 @@
+import unittest
+
+from punito.processing import ClassIndex
+from punito.processing.packing import (chunk_method_names, iter_packed_layouts, iter_prefix_ordered_layouts,
+                                      pack_layouts, estimate_layout_tokens)
+from punito.processing.preprocessor import ChunkLayout, get_chunk_layouts, iter_chunk_layouts, render_chunk
+
+
+JAVA_CODE = """
+public class TestClass {
+    private String name;
+
+    public void target() {
+        a();
+        b();
+    }
+
+    private void a() {
+        name = "a";
+        a1();
+        a2();
+    }
+
+    private void a1() {
+        name = "a1 with a rather long body to make the method larger than the others";
+    }
+
+    private void a2() {
+        name = "a2 with a rather long body to make the method larger than the others";
+    }
+
+    private void b() {
+        name = "b";
+    }
+}
+"""
+
+
+class TestPackLayouts(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ClassIndex(JAVA_CODE)
+        self.layouts = get_chunk_layouts(JAVA_CODE)
+
+    def test_small_siblings_are_merged(self):
+        packed = pack_layouts(self.index, self.layouts, target_tokens=10_000)
+        self.assertEqual(list(packed["target"].keys()), ["target+a+b"])
+        self.assertEqual(chunk_method_names("target+a+b"), ["target", "a", "b"])
+
+        code = render_chunk(self.index, packed["target"]["target+a+b"])
+        for method in ["target", "a", "a1", "a2", "b"]:
+            self.assertIn(f"void {method}()", code)
+        self.assertEqual(code.count("private void a()"), 1)
+
+    def test_oversized_chunk_is_split(self):
+        base = estimate_layout_tokens(self.index, self.layouts["target"]["a"]._replace(extra=("a1",)))
+        packed = pack_layouts(self.index, self.layouts, target_tokens=base)
+
+        names = "+".join(packed["target"])
+        self.assertIn("a.part1", names)
+        self.assertIn("a.part2", names)
+        for name in packed["target"]:
+            # the name is usable in file names, the tested methods are the real ones
+            self.assertRegex(name, r"^[\w.+]+$")
+            self.assertTrue(set(chunk_method_names(name)) <= {"target", "a", "b"})
+        for layout in packed["target"].values():
+            self.assertLessEqual(estimate_layout_tokens(self.index, layout), base)
+
+    def test_no_packing_when_overhead_exceeds_window(self):
+        self.assertEqual(pack_layouts(self.index, self.layouts, target_tokens=100, overhead_tokens=200),
+                         self.layouts)
+
+    def test_streamed_packing_matches_packing(self):
+        target_tokens = estimate_layout_tokens(self.index, self.layouts["target"]["a"])
+        expected = pack_layouts(self.index, self.layouts, target_tokens)
+        streamed = iter_packed_layouts(self.index, iter_chunk_layouts(JAVA_CODE), target_tokens)
+        self.assertEqual([(fn, name, layout) for fn, chunks in expected.items() for name, layout in chunks.items()],
+                         list(streamed))
+
+    def test_chunks_sharing_a_prefix_are_adjacent(self):
+        layouts = [
+            ("target", "b", ChunkLayout(("target", "a"), ("b", "c"))),
+            ("target", "a2", ChunkLayout(("target", "a"), ("a", "a2"))),
+            ("target", "target", ChunkLayout(("target", "a"))),
+            ("target", "a1", ChunkLayout(("target", "a"), ("a", "a1"))),
+            ("other", "x", ChunkLayout(("other",), ("x",))),
+        ]
+
+        ordered = [name for _, name, _ in iter_prefix_ordered_layouts(layouts)]
+        self.assertEqual(ordered, ["target", "a1", "a2", "b", "x"])
+
+    def test_prefix_ordering_keeps_the_chunks(self):
+        layouts = list(iter_chunk_layouts(JAVA_CODE))
+        self.assertCountEqual(list(iter_prefix_ordered_layouts(layouts)), layouts)
+
+
+if __name__ == '__main__':
+    unittest.main()
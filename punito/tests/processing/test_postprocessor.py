@@ -0,0 +1,189 @@
+import unittest
+
+from punito.processing import collect_class_tests
+from punito.processing.postprocessor import extract_test_blocks, find_duplicate_tests, remove_duplicate_tests
+
+
+TEST_CLASS = """import org.junit.Test;
+
+public class OrderMockitoTest {
+
+    @Test
+    public void shouldSave() {
+        // given
+        Order order = new Order();
+        // when
+        service.save(order);
+        // then
+        assertThat(order.isSaved()).isTrue();
+    }
+
+    @Test
+    @DisplayName("saves twice")
+    public void shouldSaveAgain() {
+        // given
+        Order other = new Order();
+        // when
+        service.save(other);
+        // then
+        assertThat(other.isSaved()).isTrue();
+    }
+
+    public void shouldLoad() {
+        // given
+        Order order = new Order(1);
+        // then
+        assertThat(order.getId()).isEqualTo(1);
+    }
+
+    private Order order(int id) {
+        return new Order(id);
+    }
+}
+"""
+
+CHUNKS = ["""```java
+import org.junit.Test;
+import org.mockito.Mock;
+import org.mockito.InjectMocks;
+
+@RunWith(MockitoJUnitRunner.class)
+@Tag("unit")
+public class OrderServiceMockitoTest extends BaseTest {
+
+    @Mock
+    private OrderRepository repository;
+
+    @InjectMocks
+    private OrderService service;
+
+    @Test
+    public void shouldSave() {
+        String s = "}";
+        service.save(new Order());
+    }
+
+    private Order order() {
+        return new Order();
+    }
+}
+```""", """import org.junit.Test;
+import java.util.List;
+
+public class OrderServiceMockitoTest {
+
+    @Mock
+    private OrderRepository repository;
+
+    @Test
+    @DisplayName("loads {all}")
+    public void shouldLoad() {
+        List<Order> orders = service.load();
+    }
+}"""]
+
+
+class TestExtractTestBlocks(unittest.TestCase):
+
+    def test_blocks_include_annotations(self):
+        blocks = extract_test_blocks(TEST_CLASS)
+
+        self.assertEqual(len(blocks), 3)
+        self.assertTrue(blocks[0].startswith("    @Test\n    public void shouldSave() {"))
+        self.assertTrue(blocks[1].startswith('    @Test\n    @DisplayName("saves twice")\n    public void shouldSaveAgain()'))
+        self.assertTrue(blocks[2].startswith("    public void shouldLoad() {"))
+        for block in blocks:
+            self.assertIn(block, TEST_CLASS)
+            self.assertTrue(block.endswith("    }"))
+
+    def test_braces_in_strings_and_comments(self):
+        java_code = """public class ParserMockitoTest {
+
+    @Test
+    public void shouldKeepBracesInStrings() {
+        String json = "{\\"a\\": {";  // a { in a comment
+        assertThat(json).isEqualTo("{\\"a\\": {");
+    }
+
+    /* a } in a block comment */
+    @Test
+    public void shouldParseCharBrace() {
+        char c = '}';
+        assertThat(c).isEqualTo('}');
+    }
+}
+"""
+        first_start = java_code.index("    @Test")
+        first_end = java_code.index("    }\n") + len("    }")
+        second_start = java_code.index("    @Test", first_end)
+        second_end = java_code.rindex("    }") + len("    }")
+
+        self.assertEqual(extract_test_blocks(java_code),
+                         [java_code[first_start:first_end], java_code[second_start:second_end]])
+
+
+class TestRemoveDuplicateTests(unittest.TestCase):
+
+    def test_duplicates_are_found_by_given_and_then(self):
+        self.assertEqual(find_duplicate_tests(TEST_CLASS), [{"test": "shouldSave", "duplicates": ["shouldSaveAgain"]}])
+
+    def test_duplicate_is_removed_with_its_annotations(self):
+        # the line-based version left the annotations of a removed test in front of the next one
+        expected = TEST_CLASS.replace("""    @Test
+    @DisplayName("saves twice")
+    public void shouldSaveAgain() {
+        // given
+        Order other = new Order();
+        // when
+        service.save(other);
+        // then
+        assertThat(other.isSaved()).isTrue();
+    }
+""", "").rstrip("\n")
+
+        self.assertEqual(remove_duplicate_tests(TEST_CLASS), expected)
+
+    def test_class_without_duplicates_is_unchanged(self):
+        tests_code = TEST_CLASS.replace("Order other = new Order();", "Order other = new Order(2);")
+        self.assertEqual(remove_duplicate_tests(tests_code), tests_code)
+
+
+class TestCollectClassTests(unittest.TestCase):
+
+    def test_chunks_are_merged(self):
+        expected = """import java.util.List;
+import org.junit.Test;
+import org.mockito.InjectMocks;
+import org.mockito.Mock;
+
+@RunWith(MockitoJUnitRunner.class)
+@Tag("unit")
+public class OrderServiceMockitoTest extends BaseTest {
+
+@Mock
+private OrderRepository repository;
+@InjectMocks
+private OrderService service;
+
+    @Test
+    public void shouldSave() {
+        String s = "}";
+        service.save(new Order());
+    }
+
+    @Test
+    @DisplayName("loads {all}")
+    public void shouldLoad() {
+        List<Order> orders = service.load();
+    }
+
+    private Order order() {
+        return new Order();
+    }
+}"""
+
+        self.assertEqual(collect_class_tests(CHUNKS, "OrderService"), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from typing import Dict
 import javalang
-from punito.processing import parse_java_class, get_all_methods, get_function_with_individual_dependencies
+from punito.processing import parse_java_class, get_all_methods, get_function_with_individual_dependencies, get_chunked_code
+from punito.processing.chunk_cover import CHUNK_PLANNERS, get_planned_layouts
+from punito.processing.preprocessor import iter_chunked_code
 
 
 class TestGetFunctionWithIndividualDependencies(unittest.TestCase):
@@ -228,5 +230,78 @@ class TestGetFunctionWithIndividualDependencies(unittest.TestCase):
         self.assertIn("public void presentMethod()", block)
         self.assertNotIn("void missingMethod()", block)
 
+
+class TestGetChunkedCode(unittest.TestCase):
+
+    def test_delegating_chunks_are_removed(self):
+        java_code = """
+        public class TestClass {
+            private String name;
+            public void delegating() {
+                helper();
+            }
+            public void updating() {
+                updater();
+            }
+            private void helper() {
+                String local = "y";
+            }
+            private void updater() {
+                name = "x";
+            }
+        }
+        """
+        result = get_chunked_code(java_code, prune=True)
+        self.assertEqual(set(result.keys()), {"updating"})
+        self.assertEqual(set(result["updating"].keys()), {"updating", "updater"})
+        self.assertIn('name = "x";', result["updating"]["updater"])
+
+        self.assertEqual(set(get_chunked_code(java_code).keys()), {"delegating", "updating"})
+
+    def test_computing_methods_keep_their_chunks(self):
+        java_code = """
+        public class TestClass {
+            private List<Order> orders;
+            public int total() {
+                return sum(open());
+            }
+            public List<Order> open() {
+                return orders.stream().filter(order -> order.isOpen()).collect(Collectors.toList());
+            }
+            private int sum(List<Order> selected) {
+                return selected.stream().mapToInt(Order::getAmount).sum();
+            }
+        }
+        """
+        for planner in CHUNK_PLANNERS:
+            with self.subTest(planner=planner):
+                layouts = get_planned_layouts(java_code, planner)
+                self.assertEqual(set(layouts.keys()), {"total", "open"})
+                self.assertIn("sum", layouts["total"])
+
+    def test_streamed_chunks_match_chunked_code(self):
+        java_code = """
+        public class TestClass {
+            private String name;
+            public void first() {
+                helper();
+            }
+            public void second() {
+                helper();
+                other();
+            }
+            private void helper() {
+                name = "x";
+            }
+            private void other() {
+                name = "y";
+            }
+        }
+        """
+        streamed = {}
+        for public_fn, dep_name, code in iter_chunked_code(java_code):
+            streamed.setdefault(public_fn, {})[dep_name] = code
+        self.assertEqual(streamed, get_chunked_code(java_code))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+
+from javalang.tree import MethodDeclaration
+
+from punito.processing import ClassIndex, get_all_methods, parse_java_class
+from punito.processing.scanner import ScannedClass, scan_java_class
+
+
+JAVA_CODE = """
+package de.example;
+
+import java.util.*;
+
+@Named("example")
+@SuppressWarnings({"unchecked"})
+public class ExamplePanelControllerBean<T extends Comparable<T>> extends Base<Map<String, List<T>>> {
+    private static final Logger LOG = LoggerFactory.getLogger(ExamplePanelControllerBean.class);
+    private final Map<String, List<Integer>> cache = new HashMap<>(), other = new TreeMap<>();
+    private int a = 1, b;
+    protected String[] names = {"x", "}"};
+    private Function<String, Integer> parser = s -> { counter = 2; return s.length(); };
+    private int counter;
+
+    static {
+        System.setProperty("a", "b");
+    }
+
+    public ExamplePanelControllerBean() {
+        this.counter = 0;
+    }
+
+    @Override
+    public
+    int compareTo(ExamplePanelControllerBean<T> other) {
+        return Integer.compare(counter, other.counter);
+    }
+
+    public void overloaded(int x) {
+        helper(x);
+    }
+
+    @Deprecated
+    public void overloaded(String s) {
+        if (s != null) s = s.trim();
+        readOnly();
+    }
+
+    public <R> R generic(Class<R> type) throws Exception {
+        return type.cast(this.<R>convert(null));
+    }
+
+    private <R> R convert(Object o) {
+        return (R) o;
+    }
+
+    public void setName(String name) {
+        names[0] = name;
+    }
+
+    private void helper(int i) {
+        String local = "{", second;
+        for (int j = 0, k = 1; j < i; j++) {
+            validate();
+        }
+    }
+
+    private void validate() {
+        counter += 1;
+    }
+
+    private void readOnly() {
+        int total = a + b;
+        LOG.info(String.valueOf(total));
+        super.setName("x");
+        names.forEach(this::setName);
+    }
+}
+"""
+
+
+class TestScanJavaClass(unittest.TestCase):
+
+    def test_matches_javalang(self):
+        scanned = scan_java_class(JAVA_CODE)
+        index = ClassIndex(JAVA_CODE, backend="javalang")
+
+        self.assertIsNotNone(scanned)
+        self.assertEqual(list(scanned.methods), list(index.methods))
+        for name, method in index.methods.items():
+            with self.subTest(method=name):
+                self.assertEqual(scanned.methods[name].modifiers, method.modifiers)
+                self.assertEqual(scanned.methods[name].span, index.method_spans[name])
+                self.assertEqual(scanned.methods[name].updates_state, name in index.state_updating_methods)
+                self.assertEqual(scanned.methods[name].calls & index.methods.keys(), index.call_graph.calls[name])
+        self.assertEqual(scanned.field_names, index.field_names)
+        self.assertEqual(scanned.fields_update_state, index.fields_update_state)
+
+    def test_facts(self):
+        scanned = scan_java_class(JAVA_CODE)
+        self.assertEqual(scanned.name, "ExamplePanelControllerBean")
+        self.assertNotIn("ExamplePanelControllerBean", scanned.methods)
+        self.assertEqual(scanned.field_names, {"LOG", "cache", "other", "a", "b", "names", "parser", "counter"})
+        self.assertTrue(scanned.fields_update_state)
+        self.assertIn("@Deprecated", JAVA_CODE[slice(*scanned.methods["overloaded"].span)])
+        # local declarations and super calls do not update state
+        self.assertFalse(scanned.methods["helper"].updates_state)
+        self.assertFalse(scanned.methods["readOnly"].updates_state)
+        self.assertTrue(scanned.methods["validate"].updates_state)
+
+    def test_unsure_about_anonymous_and_nested_classes(self):
+        anonymous = """
+        public class Foo {
+            public void start() {
+                Runnable r = new Runnable() {
+                    public void run() {}
+                };
+            }
+        }
+        """
+        nested = """
+        public class Foo {
+            private static class Inner {
+                void go() {}
+            }
+        }
+        """
+        interface = "public interface Foo { default void go() {} }"
+        for code in (anonymous, nested, interface):
+            with self.subTest(code=code):
+                self.assertIsNone(scan_java_class(code))
+
+    def test_class_index_falls_back_to_javalang(self):
+        code = """
+        public class Foo {
+            public void start() {
+                new Thread() {
+                    public void run() {}
+                }.start();
+            }
+        }
+        """
+        index = ClassIndex(code, backend="scanner")
+        self.assertIsNone(index.scan)
+        self.assertEqual(set(index.methods), {"start", "run"})
+        self.assertIsInstance(index.methods["start"], MethodDeclaration)
+
+    def test_parser_backends(self):
+        scanned = parse_java_class(JAVA_CODE, backend="scanner")
+        self.assertIsInstance(scanned, ScannedClass)
+        self.assertEqual(list(get_all_methods(scanned)), list(get_all_methods(parse_java_class(JAVA_CODE))))
+        with self.assertRaises(ValueError):
+            parse_java_class(JAVA_CODE, backend="antlr")
+
+
+if __name__ == '__main__':
+    unittest.main()
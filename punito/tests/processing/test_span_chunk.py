@@ -0,0 +1,72 @@
+import unittest
+
+from punito.processing import ClassIndex
+from punito.processing.preprocessor import ChunkLayout, get_chunk_layouts, render_chunk
+from punito.processing.span_chunk import SpanChunk, span_chunks
+
+
+JAVA_CODE = """
+import java.util.List;
+
+public class TestClass {
+    private String name;
+
+    public void target() {
+        a();
+        b();
+    }
+
+    private void a() {
+        name = "a";
+        a1();
+    }
+
+    private void a1() {
+        name = "a1";
+    }
+
+    private void b() {
+        name = "b";
+    }
+
+    public void lonely() {
+        name = "lonely";
+    }
+}
+"""
+
+
+class TestSpanChunk(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ClassIndex(JAVA_CODE)
+
+    def test_materializes_rendered_chunk(self):
+        layouts = [
+            ChunkLayout(("target", "a", "b")),
+            ChunkLayout(("target", "a", "b"), ("a1",)),
+            ChunkLayout(("target", "a", "b"), ()),
+            ChunkLayout(("lonely",)),
+        ]
+        for layout in layouts:
+            with self.subTest(layout=layout):
+                chunk = SpanChunk(self.index, layout)
+                expected = render_chunk(self.index, layout)
+                self.assertEqual(str(chunk), expected)
+                self.assertEqual(len(chunk), len(expected))
+
+    def test_stores_spans_instead_of_code(self):
+        chunk = SpanChunk(self.index, ChunkLayout(("target", "a", "b"), ("a1",)))
+        self.assertEqual(chunk.context, tuple(self.index.method_spans[name] for name in ("target", "a", "b")))
+        self.assertEqual(chunk.extra, (self.index.method_spans["a1"],))
+        self.assertFalse(hasattr(chunk, "__dict__"))
+
+    def test_span_chunks_mirror_layouts(self):
+        layouts = get_chunk_layouts(JAVA_CODE)
+        chunks = span_chunks(self.index, layouts)
+        self.assertEqual({fn: set(deps) for fn, deps in chunks.items()},
+                         {fn: set(deps) for fn, deps in layouts.items()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from punito.processing import get_chunked_code
+from punito.processing.tree_preprocessor import chunk_files, chunk_source_tree
+
+
+JAVA_CODE = """
+public class {name}PanelControllerBean {{
+    private String name;
+
+    public void save() {{
+        validate();
+        name = "{name}";
+    }}
+
+    public String load(String key) {{
+        return key.isEmpty() ? name : key;
+    }}
+
+    private void validate() {{
+        if (name == null) {{
+            name = "";
+        }}
+    }}
+}}
+"""
+
+
+class TestChunkSourceTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.classes = {}
+        for package, name in [("orders", "Order"), ("orders/items", "Item"), ("customers", "Customer")]:
+            path = self.root / package / f"{name}PanelControllerBean.java"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(JAVA_CODE.format(name=name))
+            self.classes[path] = path.read_text()
+        self.broken = self.root / "orders" / "BrokenPanelControllerBean.java"
+        self.broken.write_text("public class BrokenPanelControllerBean { public void save( { }")
+        (self.root / "orders" / "OrderService.java").write_text(JAVA_CODE.format(name="Service"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_tree_is_chunked_like_single_classes(self):
+        results = {result.path: result for result in chunk_source_tree(self.root, max_workers=2, files_per_task=1)}
+
+        self.assertEqual(set(results), set(self.classes) | {self.broken})
+        for path, class_code in self.classes.items():
+            self.assertIsNone(results[path].error)
+            self.assertEqual(results[path].chunks, get_chunked_code(class_code))
+
+        # a file that does not parse fails alone
+        self.assertIsNone(results[self.broken].chunks)
+        self.assertTrue(results[self.broken].error)
+
+    def test_batches_of_several_files(self):
+        paths = sorted(self.classes) + [self.broken]
+        results = list(chunk_files(paths, max_workers=1, files_per_task=3))
+
+        self.assertEqual(sorted(result.path for result in results), sorted(paths))
+        self.assertEqual(sum(result.error is not None for result in results), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import punito
+from punito.processing.chunk_cache import ChunkCache
+from punito.tests_generator import generator
+from punito.tests_generator.manifest import MANIFEST_FILENAME
+
+RESOURCES_PATH = Path(punito.__file__).parent / "resources"
+
+SOURCE_CODE = "public class Controller { public void onSave() { validate(); check(); } }"
+
+JAVA_CODE = """
+public class Controller {
+    private String name;
+
+    public void onSave() {
+        validate();
+        check();
+    }
+
+    private void validate() {
+        normalize();
+    }
+
+    private void check() {
+        name = "check";
+    }
+
+    private void normalize() {
+        name = "normalize";
+    }
+}
+"""
+
+
+TEST_CLASS = """import org.junit.Test;
+
+public class ControllerMockitoTest {{
+
+    @Test
+    public void shouldCover{method}() {{
+        // given
+        String tested = "{tested}";
+        // then
+        assertThat(tested).isNotEmpty();
+    }}
+}}"""
+
+
+def _tested_methods(messages) -> str:
+    return re.search(r"\*\*Tested Function:\*\* (.+)", messages[-1].content).group(1).strip()
+
+
+class FakeLLM:
+    """Answers plan prompts with a plan and test prompts with a test class, both naming the tested methods."""
+
+    def __init__(self):
+        self.requests = []
+
+    def _reply(self, messages) -> str:
+        self.requests.append(messages)
+        tested = _tested_methods(messages)
+        if "Tests Plan" not in messages[-1].content:
+            return f"plan for {tested}"
+        return TEST_CLASS.format(method=re.sub(r"\W", "", tested.title()), tested=tested)
+
+    def invoke(self, messages, config=None, **kwargs):
+        return AIMessage(content=self._reply(messages))
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        await asyncio.sleep(0)
+        return AIMessage(content=self._reply(messages))
+
+    def stream(self, messages, config=None, **kwargs):
+        yield AIMessageChunk(content=self._reply(messages))
+
+    async def astream(self, messages, config=None, **kwargs):
+        yield AIMessageChunk(content=self._reply(messages))
+
+
+class GeneratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.llm = FakeLLM()
+        for target in ["punito.utils.prompt_utils.find_resources_path",
+                       "punito.tests_generator.generator.find_resources_path",
+                       "punito.tests_generator.generator_utils.find_resources_path"]:
+            resources_patch = patch(target, lambda: RESOURCES_PATH)
+            resources_patch.start()
+            self.addCleanup(resources_patch.stop)
+        cache_patch = patch("punito.processing.chunk_cache.get_default_chunk_cache",
+                            lambda: ChunkCache(self.root / "cache"))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+        self.generator = self._create_generator("2026-01-01")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _create_generator(self, date_time: str, **kwargs) -> generator.TestsGenerator:
+        with patch("punito.tests_generator.generator.find_project_root", lambda: self.root), \
+                patch("punito.tests_generator.generator.create_llama_model_from_config", lambda **_: self.llm):
+            tests_generator = generator.TestsGenerator("Controller", date_time, target_tokens=0, planner="order",
+                                                       **kwargs)
+        return tests_generator
+
+
+class TestGenerateTestsForChunk(GeneratorTestCase):
+
+    def test_packed_chunk_names_the_real_methods(self):
+        tests = self.generator.generate_tests_for_chunk(SOURCE_CODE, "onSave", "validate.part1+check")
+
+        self.assertIn('String tested = "validate, check";', tests)
+        for request in self.llm.requests:
+            prompt = request[-1].content
+            self.assertIn("validate, check", prompt)
+            self.assertNotIn("part1", prompt)
+
+        output_dir = self.generator.base_fn_output_path / "onSave"
+        self.assertEqual((output_dir / "plan_validate.part1+check.txt").read_text(), "plan for validate, check")
+        self.assertEqual(self.generator._get_tests_path("onSave", "validate.part1+check").read_text(), tests)
+
+
+class TestIncrementalGeneration(GeneratorTestCase):
+
+    def _pending(self, class_code: str, previous: dict):
+        manifest, results = {}, []
+        pending = list(self.generator._iter_pending_chunks(class_code, "class ExampleTest {}", previous, manifest,
+                                                          results))
+        return pending, manifest, results
+
+    def _previous(self, pending) -> dict:
+        # the entries load_previous_tests returns for a run that generated tests for the pending chunks
+        previous = {}
+        for _, public_fn, dep_name, fingerprint in pending:
+            previous.setdefault(public_fn, {})[dep_name] = {"fingerprint": fingerprint, "tests": f"{dep_name}.java",
+                                                            "code": f"tests of {dep_name}"}
+        return previous
+
+    def test_unchanged_chunks_are_reused(self):
+        first, _, _ = self._pending(JAVA_CODE, {})
+        self.assertEqual({dep_name for _, _, dep_name, _ in first}, {"onSave", "validate", "check"})
+
+        changed = JAVA_CODE.replace('name = "normalize";', 'name = "changed";')
+        pending, manifest, results = self._pending(changed, self._previous(first))
+
+        # only the chunk testing the changed dependency is generated again
+        self.assertEqual([dep_name for _, _, dep_name, _ in pending], ["validate"])
+        self.assertEqual(sorted(results), ["tests of check", "tests of onSave"])
+        self.assertEqual(sorted(manifest["onSave"]), ["check", "onSave"])
+        self.assertEqual(self.generator._get_tests_path("onSave", "check").read_text(), "tests of check")
+
+    def test_changed_generation_parameters_regenerate_all_chunks(self):
+        first, _, _ = self._pending(JAVA_CODE, {})
+
+        self.generator.pipeline_steps["tests"]["generation"] = {"temperature": 0.7}
+        pending, _, results = self._pending(JAVA_CODE, self._previous(first))
+
+        self.assertEqual(len(pending), len(first))
+        self.assertEqual(results, [])
+
+
+
+class TestGenerateTestsForClass(GeneratorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_path = self.root / "Controller.java"
+        self.class_path.write_text(JAVA_CODE)
+
+    def _assert_class_tests_written(self):
+        # a plan and a tests request for each of the three chunks
+        self.assertEqual(len(self.llm.requests), 6)
+
+        output_path = self.generator.base_class_output_path
+        tests = (output_path / "ControllerMockitoTest").read_text()
+        for method in ["Onsave", "Validate", "Check"]:
+            self.assertEqual(tests.count(f"public void shouldCover{method}()"), 1)
+
+        manifest = json.loads((output_path / MANIFEST_FILENAME).read_text())["chunks"]
+        self.assertEqual(sorted(manifest["onSave"]), ["check", "onSave", "validate"])
+        for dep_name, entry in manifest["onSave"].items():
+            self.assertIn(f'String tested = "{dep_name}";', (output_path / entry["tests"]).read_text())
+
+    def test_async_generation(self):
+        asyncio.run(self.generator.agenerate_tests_for_class(self.class_path))
+        self._assert_class_tests_written()
+
+    def test_sync_generation(self):
+        self.generator.generate_tests_for_class(self.class_path)
+        self._assert_class_tests_written()
+
+    def test_failed_chunk_does_not_stop_the_others(self):
+        reply = self.llm._reply
+
+        def fail_for_check(messages):
+            if _tested_methods(messages) == "check":
+                raise ConnectionError("down")
+            return reply(messages)
+
+        self.llm._reply = fail_for_check
+        self.generator.generate_tests_for_class(self.class_path)
+
+        output_path = self.generator.base_class_output_path
+        manifest = json.loads((output_path / MANIFEST_FILENAME).read_text())["chunks"]
+        self.assertEqual(sorted(manifest["onSave"]), ["onSave", "validate"])
+        self.assertNotIn("shouldCoverCheck", (output_path / "ControllerMockitoTest").read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from punito.tests_generator.manifest import (MANIFEST_FILENAME, find_previous_manifest, load_previous_tests,
+                                             write_manifest)
+
+
+MANIFEST = {
+    "onSave": {
+        "onSave": {"fingerprint": "f1", "tests": "tests_per_public_function/onSave/onSave.java"},
+        "validate": {"fingerprint": "f2", "tests": "tests_per_public_function/onSave/validate.java"},
+    },
+}
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.version_path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_run(self, date_time: str, manifest: dict) -> Path:
+        class_path = self.version_path / date_time / "Controller"
+        for deps in manifest.values():
+            for dep_name, entry in deps.items():
+                path = class_path / entry["tests"]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(f"tests of {dep_name}")
+        write_manifest(manifest, class_path)
+        return class_path
+
+    def test_round_trip(self):
+        self._write_run("2026-01-01", MANIFEST)
+
+        previous = load_previous_tests(self.version_path / "2026-01-02" / "Controller")
+
+        self.assertEqual(previous, {"onSave": {
+            name: {**entry, "code": f"tests of {name}"} for name, entry in MANIFEST["onSave"].items()}})
+
+    def test_latest_earlier_run_is_found(self):
+        self._write_run("2026-01-01", MANIFEST)
+        latest = self._write_run("2026-01-03", MANIFEST)
+        self._write_run("2026-01-09", MANIFEST)
+        # a run without a manifest, e.g. one that failed, is skipped
+        (self.version_path / "2026-01-04" / "Controller").mkdir(parents=True)
+
+        self.assertEqual(find_previous_manifest(self.version_path / "2026-01-05" / "Controller"),
+                         latest / MANIFEST_FILENAME)
+        self.assertIsNone(find_previous_manifest(self.version_path / "2026-01-01" / "Controller"))
+
+    def test_entries_without_tests_are_skipped(self):
+        class_path = self._write_run("2026-01-01", MANIFEST)
+        (class_path / MANIFEST["onSave"]["validate"]["tests"]).unlink()
+
+        previous = load_previous_tests(self.version_path / "2026-01-02" / "Controller")
+
+        self.assertEqual(list(previous["onSave"]), ["onSave"])
+
+    def test_invalid_manifest_is_ignored(self):
+        class_path = self._write_run("2026-01-01", MANIFEST)
+        (class_path / MANIFEST_FILENAME).write_text("{not json")
+
+        self.assertEqual(load_previous_tests(self.version_path / "2026-01-02" / "Controller"), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
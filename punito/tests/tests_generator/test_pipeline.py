@@ -0,0 +1,93 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import punito
+from punito.tests_generator import pipeline
+
+# independent of the name of the checkout folder the project root is found by
+RESOURCES_PATH = Path(punito.__file__).parent / "resources"
+
+STEPS = {
+    "plan": {
+        "prompt": "planner_prompt",
+        "output_var": "tests_plan",
+        "target_filename": lambda input: f"plan_{input['tested_function_name']}.txt",
+    },
+    "tests": {
+        "prompt": "tester_prompt",
+        "output_var": "initial_tests",
+        "target_filename": lambda input: f"{input['tested_function_name']}.java",
+        "continuation_prompt": "tester_continuation_prompt",
+    },
+}
+
+PARAMS = {
+    "execution_function_name": "onSave",
+    "tested_function_name": "validate",
+    "source_code": "public class Controller { public void onSave() { validate(); } }",
+    "test_example": "class ExampleTest {}",
+}
+
+
+class FakeLLM:
+
+    def __init__(self):
+        self.requests = []
+        self.kwargs = []
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.requests.append(messages)
+        self.kwargs.append(kwargs)
+        return AIMessage(content=f"reply {len(self.requests)}")
+
+
+@patch("punito.utils.prompt_utils.find_resources_path", lambda: RESOURCES_PATH)
+@patch("punito.tests_generator.runnables.write_to_file")
+class TestTestsGenerationPipeline(unittest.TestCase):
+
+    def test_steps_are_separate_conversations(self, _):
+        llm = FakeLLM()
+        output = pipeline.TestsGenerationPipeline(STEPS, llm).run(["plan", "tests"], PARAMS, Path("out"))
+
+        plan_request, tests_request = llm.requests
+        self.assertEqual(output["initial_tests"], "reply 2")
+        self.assertEqual(len(tests_request), 2)
+        self.assertIn("reply 1", tests_request[1].content)
+        self.assertIn(PARAMS["source_code"], tests_request[1].content)
+        self.assertNotIn("TEST WRITING GUIDELINES", plan_request[0].content)
+
+    def test_tests_step_continues_the_plan_conversation(self, _):
+        llm = FakeLLM()
+        output = pipeline.TestsGenerationPipeline(STEPS, llm, continuation=True).run(["plan", "tests"], PARAMS,
+                                                                                     Path("out"))
+
+        plan_request, tests_request = llm.requests
+        self.assertEqual(output["initial_tests"], "reply 2")
+        self.assertEqual(tests_request[:2], plan_request)
+        self.assertEqual([type(message) for message in tests_request[2:]], [AIMessage, HumanMessage])
+        self.assertEqual(tests_request[2].content, "reply 1")
+        self.assertNotIn(PARAMS["source_code"], tests_request[3].content)
+        self.assertIn("onSave", tests_request[3].content)
+        self.assertIsInstance(tests_request[0], SystemMessage)
+
+        # the test guidelines and example are part of the shared prefix, the last turn only instructs
+        self.assertIn("TEST WRITING GUIDELINES", plan_request[0].content)
+        self.assertIn(PARAMS["test_example"], plan_request[0].content)
+        self.assertNotIn("TEST WRITING GUIDELINES", tests_request[3].content)
+
+    def test_affinity_key_is_passed_to_the_llm(self, _):
+        llm = FakeLLM()
+        pipeline.TestsGenerationPipeline(STEPS, llm).run(["plan", "tests"], {**PARAMS, "affinity_key": "Controller"},
+                                                         Path("out"))
+        self.assertEqual(llm.kwargs, [{"affinity_key": "Controller"}] * 2)
+
+        llm = FakeLLM()
+        pipeline.TestsGenerationPipeline(STEPS, llm).run(["plan", "tests"], PARAMS, Path("out"))
+        self.assertEqual(llm.kwargs, [{}, {}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,28 +1,49 @@
+import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from loguru import logger
 from .pipeline import TestsGenerationPipeline
 from .runnables import PromptAndSaveRunnable
 
-from .generator_utils import get_test_example
+from .generator_utils import get_test_example, estimate_prompt_overhead
+from .manifest import load_previous_tests, write_manifest
 from ..chat_model import create_llama_model_from_config
-from ..processing import get_chunked_code, collect_class_tests
+from ..processing import collect_class_tests
+from ..processing.chunk_cache import stream_cached_class
+from ..processing.fingerprint import compute_generation_fingerprint, compute_layout_fingerprint
+from ..processing.packing import chunk_method_names, iter_packed_layouts, iter_prefix_ordered_layouts
+from ..processing.span_chunk import SpanChunk
 from ..processing.postprocessor import remove_duplicate_tests
 from ..utils import (
     find_project_root,
+    find_resources_path,
     extract_class_name,
     get_package_version,
     read_file, write_to_file,
+    get_default_settings,
 )
 from ..utils.common_utils import measure_time
 
 
 class TestsGenerator:
-    def __init__(self, class_name: str, date_time: str):
+    def __init__(self, class_name: str, date_time: str, incremental: bool = False,
+                 target_tokens: Optional[int] = None, planner: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, cache_mode: Optional[str] = None,
+                 continuation: Optional[bool] = None):
         self.class_name = class_name
         self.date_time = date_time
+        self.incremental = incremental
+        # 0 disables packing of chunks into a target token window
+        self.target_tokens = (target_tokens if target_tokens is not None
+                              else int(get_default_settings().get("CHUNK_TARGET_TOKENS", 0)))
+        self.planner = planner or get_default_settings().get("CHUNK_PLANNER", "order")
+        # delegation-only chunks are dropped only on request, they may still compute values worth testing
+        self.prune_chunks = get_default_settings().get("PRUNE_DELEGATION_CHUNKS", False)
+        # worker threads of the sync path, or tasks of the async path; the LLM requests they send
+        # are limited by the adaptive concurrency limiter of the model
+        self.max_concurrency = max_concurrency or int(get_default_settings().get("MAX_CONCURRENT_REQUESTS", 50))
         self.base_class_output_path = (
                 find_project_root()
                 / "generated_tests"
@@ -31,21 +52,28 @@ class TestsGenerator:
                 / class_name
         )
         self.base_fn_output_path = self.base_class_output_path / "tests_per_public_function"
-        self.llm = create_llama_model_from_config()
+        self.llm = create_llama_model_from_config(cache_mode=cache_mode)
 
+        settings = get_default_settings()
         self.pipeline_steps = {
             "plan": {
                 "prompt": "planner_prompt",
                 "output_var": "tests_plan",
-                "target_filename": lambda input: f"plan_{input['tested_function_name']}.txt",
+                "target_filename": lambda input: f"plan_{_chunk_file_key(input)}.txt",
+                "generation": _generation_params(settings, "PLAN"),
             },
             "tests": {
                 "prompt": "tester_prompt",
                 "output_var": "initial_tests",
-                "target_filename": lambda input: f"{input['tested_function_name']}.java",
+                "target_filename": lambda input: f"{_chunk_file_key(input)}.java",
+                "generation": _generation_params(settings, "TESTS"),
+                "stop_after_code_block": settings.get("TESTS_STOP_AFTER_CODE_BLOCK", False),
+                "continuation_prompt": "tester_continuation_prompt",
             },
         }
-        self.pipeline = TestsGenerationPipeline(self.pipeline_steps, self.llm)
+        # the tests step continues the conversation of the plan step instead of resending the code
+        self.continuation = continuation if continuation is not None else settings.get("PIPELINE_CONTINUATION", False)
+        self.pipeline = TestsGenerationPipeline(self.pipeline_steps, self.llm, self.continuation)
 
     def _set_up_runnable_for_one_step_generation(self, step_config: dict, output_dir: Path) -> PromptAndSaveRunnable:
         return PromptAndSaveRunnable(
@@ -53,7 +81,9 @@ class TestsGenerator:
             self.llm,
             step_config["output_var"],
             output_dir,
-            step_config["target_filename"]
+            step_config["target_filename"],
+            step_config.get("generation"),
+            step_config.get("stop_after_code_block", False),
         )
 
     def _get_common_output_path(self, fn_name: str) -> Path:
@@ -90,42 +120,171 @@ class TestsGenerator:
                                                                  self._get_common_output_path(exe_fn_name))
         return runnable.invoke(placeholders)["initial_tests"]
 
-    def generate_tests_for_chunk(self, function_code: str, exe_fn_name: str, tst_fn_name: str,
+    def generate_tests_for_chunk(self, function_code: Union[str, SpanChunk], exe_fn_name: str, tst_fn_name: str,
                                  example_code: str = '', steps=None) -> str:
         if steps is None:
             steps = ["plan", "tests"]
 
+        tested_methods = ", ".join(chunk_method_names(tst_fn_name))
         placeholders = {
             "execution_function_name": exe_fn_name,
-            "tested_function_name": tst_fn_name,
-            "source_code": function_code,
+            # the prompt names the tested methods, the packed chunk name is only used for file names
+            "tested_function_name": tested_methods,
+            "chunk_name": tst_fn_name,
+            # span-backed chunks are materialized only now, right before the request
+            "source_code": str(function_code),
             "test_example": example_code,
+            # the chunks of a class go to the same server replica if the model routes by affinity
+            "affinity_key": self.class_name,
         }
 
-        logger.info(f"Pipeline execution started | Test function: {tst_fn_name} | Execution function: {exe_fn_name}")
+        logger.info(f"Pipeline execution started | Test function: {tested_methods} | Execution function: {exe_fn_name}")
         output = self.pipeline.run(steps, placeholders, self._get_common_output_path(exe_fn_name))
 
         return output["initial_tests"]
 
+    async def agenerate_tests_for_chunk(self, function_code: Union[str, SpanChunk], exe_fn_name: str,
+                                        tst_fn_name: str, example_code: str = '', steps=None) -> str:
+        if steps is None:
+            steps = ["plan", "tests"]
+
+        tested_methods = ", ".join(chunk_method_names(tst_fn_name))
+        placeholders = {
+            "execution_function_name": exe_fn_name,
+            # the prompt names the tested methods, the packed chunk name is only used for file names
+            "tested_function_name": tested_methods,
+            "chunk_name": tst_fn_name,
+            "source_code": str(function_code),
+            "test_example": example_code,
+            "affinity_key": self.class_name,
+        }
+
+        logger.info(f"Pipeline execution started | Test function: {tested_methods} | Execution function: {exe_fn_name}")
+        output = await self.pipeline.arun(steps, placeholders, self._get_common_output_path(exe_fn_name))
+
+        return output["initial_tests"]
+
+    def _get_tests_path(self, exe_fn_name: str, tst_fn_name: str) -> Path:
+        filename = self.pipeline_steps["tests"]["target_filename"]({"chunk_name": tst_fn_name})
+        return self._get_common_output_path(exe_fn_name) / filename
+
+    def _generation_fingerprint(self, example_code: str) -> str:
+        # tests of unchanged chunks are reused only if they would be generated with the same prompts and parameters
+        steps = self.pipeline_steps.values()
+        prompt_names = [step["prompt"] for step in steps]
+        if self.continuation:
+            prompt_names += [step["continuation_prompt"] for step in steps if "continuation_prompt" in step]
+        templates = [read_file(find_resources_path() / "prompts" / f"{name}.yaml") for name in prompt_names]
+        params = {
+            "model": getattr(self.llm, "model_name", None),
+            "continuation": self.continuation,
+            "steps": {name: {"generation": step.get("generation"),
+                             "stop_after_code_block": step.get("stop_after_code_block", False)}
+                      for name, step in self.pipeline_steps.items()},
+        }
+        return compute_generation_fingerprint([*templates, example_code], params)
+
+    def _reuse_previous_tests(self, previous: Dict[str, Dict[str, dict]], public_fn: str, dep_name: str,
+                              fingerprint: str, manifest: Dict[str, Dict[str, dict]]) -> Optional[str]:
+        """
+        Copies the tests of a chunk unchanged since the previous run into the current run.
+
+        Returns the reused tests, or None if the chunk changed. Reused chunks are recorded in `manifest`.
+        """
+        entry = previous.get(public_fn, {}).get(dep_name)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return None
+
+        write_to_file(entry["code"], self._get_tests_path(public_fn, dep_name))
+        manifest.setdefault(public_fn, {})[dep_name] = {"fingerprint": fingerprint, "tests": entry["tests"]}
+        return entry["code"]
+
+    def _iter_pending_chunks(self, class_code: str, example_code: str, previous: Dict[str, Dict[str, dict]],
+                             manifest: Dict[str, Dict[str, dict]],
+                             results: List[str]) -> Iterator[Tuple[SpanChunk, str, str, str]]:
+        """
+        Yields the chunks of a class that need new tests, as they are built.
+
+        Chunks unchanged since the previous run are not yielded; their tests are reused and
+        appended to `results`.
+
+        Yields
+        ------
+        Tuple[SpanChunk, str, str, str]
+            The chunk, its public method name, tested method name and fingerprint.
+        """
+        stream = stream_cached_class(class_code, planner=self.planner, prune=self.prune_chunks)
+        layouts = stream.layouts
+        generation = self._generation_fingerprint(example_code)
+
+        if self.target_tokens:
+            shared_prompts = {self.pipeline_steps[step]["prompt"]: prompts
+                              for step, prompts in self.pipeline.shared_prompts(list(self.pipeline_steps)).items()}
+            overhead = estimate_prompt_overhead([step["prompt"] for step in self.pipeline_steps.values()],
+                                                example_code, shared_prompts)
+            layouts = iter_packed_layouts(stream.index, layouts, self.target_tokens, overhead)
+        # requests sharing a prompt prefix go out back-to-back, while the server still has it cached
+        layouts = iter_prefix_ordered_layouts(layouts)
+
+        for public_fn, dep_name, layout in layouts:
+            fingerprint = compute_layout_fingerprint(layout, stream.method_index, stream.index, generation)
+            reused = self._reuse_previous_tests(previous, public_fn, dep_name, fingerprint, manifest)
+            if reused is not None:
+                results.append(reused)
+                continue
+
+            yield SpanChunk(stream.index, layout), public_fn, dep_name, fingerprint
+
+    def _record_tests(self, manifest: Dict[str, Dict[str, dict]], public_fn: str, dep_name: str,
+                      fingerprint: str) -> None:
+        manifest.setdefault(public_fn, {})[dep_name] = {
+            "fingerprint": fingerprint,
+            "tests": self._get_tests_path(public_fn, dep_name).relative_to(self.base_class_output_path).as_posix(),
+        }
+
+    def _write_class_tests(self, class_path: Path, results: List[str], manifest: Dict[str, Dict[str, dict]]) -> None:
+        write_manifest(manifest, self.base_class_output_path)
+        if hasattr(self.llm, "pool_metrics"):
+            logger.info(f"Connection pool: {self.llm.pool_metrics()}")
+        if getattr(self.llm, "concurrency_limiter", None) is not None:
+            logger.info(f"Concurrency: {self.llm.concurrency_metrics()}")
+        if getattr(self.llm, "rate_limiter", None) is not None:
+            logger.info(f"Rate limit: {self.llm.rate_limit_metrics()}")
+        if getattr(self.llm, "single_flight", None) is not None:
+            logger.info(f"Single-flight: {self.llm.single_flight_metrics()}")
+        if getattr(self.llm, "micro_batcher", None) is not None:
+            logger.info(f"Batching: {self.llm.batch_metrics()}")
+        if getattr(self.llm, "router", None) is not None:
+            for endpoint in self.llm.routing_metrics():
+                logger.info(f"Routing: {endpoint}")
+
+        test = collect_class_tests(results, extract_class_name(class_path))
+
+        final_test = remove_duplicate_tests(test)
+
+        write_to_file(final_test, self.base_class_output_path / f"{self.class_name}MockitoTest" )
+
     @measure_time
     def generate_tests_for_class(self, class_path: Path) -> None:
         class_code = read_file(class_path)
         example_code = get_test_example("PanelControllerExampleMockitoTest.java")
-        chunked_code = get_chunked_code(class_code)
 
         logger.info(f"Generating tests for class: {extract_class_name(class_path)}")
 
+        manifest = {}
         results = []
+        previous = load_previous_tests(self.base_class_output_path) if self.incremental else {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            # chunks are submitted while the remaining ones are still being built
+            futures = {}
+            for chunk, public_fn, dep_name, fingerprint in self._iter_pending_chunks(class_code, example_code,
+                                                                                    previous, manifest, results):
+                future = executor.submit(self.generate_tests_for_chunk, chunk, public_fn, dep_name, example_code)
+                futures[future] = (public_fn, dep_name, fingerprint)
 
-        with ThreadPoolExecutor(max_workers=50) as executor:
-            futures = [
-                executor.submit(
-                    self.generate_tests_for_chunk,
-                    dep_code, public_fn, dep_name, example_code
-                )
-                for public_fn, deps in chunked_code.items()
-                for dep_name, dep_code in deps.items()
-            ]
+            if self.incremental:
+                logger.info(f"Reusing tests of {len(results)} unchanged chunks, generating {len(futures)}")
 
             for future in as_completed(futures):
                 try:
@@ -133,9 +292,71 @@ class TestsGenerator:
                     results.append(result)
                 except Exception as e:
                     logger.error(f"Test generation failed: {e}")
+                    continue
 
-        test = collect_class_tests(results, extract_class_name(class_path))
+                self._record_tests(manifest, *futures[future])
 
-        final_test = remove_duplicate_tests(test)
+        self._write_class_tests(class_path, results, manifest)
 
-        write_to_file(final_test, self.base_class_output_path / f"{self.class_name}MockitoTest" )
+    @measure_time
+    async def agenerate_tests_for_class(self, class_path: Path, semaphore: Optional[asyncio.Semaphore] = None) -> None:
+        """
+        Async variant of `generate_tests_for_class`, running the requests of all chunks on the event loop.
+
+        Parameters
+        ----------
+        class_path : Path
+            Path to the Java class.
+        semaphore : asyncio.Semaphore, optional
+            Limits the chunks generated at the same time. Pass one semaphore to the generators
+            of several classes to share the limit between them; by default, each class is
+            limited to `max_concurrency` chunks.
+        """
+        class_code = read_file(class_path)
+        example_code = get_test_example("PanelControllerExampleMockitoTest.java")
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+
+        logger.info(f"Generating tests for class: {extract_class_name(class_path)}")
+
+        manifest = {}
+        results = []
+        previous = load_previous_tests(self.base_class_output_path) if self.incremental else {}
+
+        async def generate(chunk: SpanChunk, public_fn: str, dep_name: str) -> str:
+            async with semaphore:
+                return await self.agenerate_tests_for_chunk(chunk, public_fn, dep_name, example_code)
+
+        tasks = []
+        for chunk, public_fn, dep_name, fingerprint in self._iter_pending_chunks(class_code, example_code,
+                                                                                previous, manifest, results):
+            tasks.append((asyncio.create_task(generate(chunk, public_fn, dep_name)), (public_fn, dep_name, fingerprint)))
+            # lets the started requests go out while the remaining chunks are still being built
+            await asyncio.sleep(0)
+
+        if self.incremental:
+            logger.info(f"Reusing tests of {len(results)} unchanged chunks, generating {len(tasks)}")
+
+        outputs = await asyncio.gather(*(task for task, _ in tasks), return_exceptions=True)
+        for output, (_, key) in zip(outputs, tasks):
+            if isinstance(output, Exception):
+                logger.error(f"Test generation failed: {output}")
+                continue
+
+            results.append(output)
+            self._record_tests(manifest, *key)
+
+        self._write_class_tests(class_path, results, manifest)
+
+
+def _chunk_file_key(params: dict) -> str:
+    # chunks generated by the pipeline are saved under their chunk name, single steps under the tested method
+    return params.get("chunk_name") or params["tested_function_name"]
+
+
+def _generation_params(settings, step: str) -> dict:
+    """Generation parameters of a pipeline step from the `<STEP>_MAX_TOKENS`, `_TEMPERATURE` and `_STOP` settings."""
+    return {
+        "max_tokens": int(settings.get(f"{step}_MAX_TOKENS", 0)) or None,
+        "temperature": settings.get(f"{step}_TEMPERATURE"),
+        "stop": settings.get(f"{step}_STOP") or None,
+    }
@@ -1,13 +1,50 @@
-from punito.utils import find_resources_path, read_file
+from typing import Optional
+
+from langchain_core.messages import get_buffer_string
+
+from punito.processing.packing import estimate_tokens
+from punito.utils import find_resources_path, read_file, create_messages_from_yaml_template
 
 def get_test_example(file_name: str) -> str:
     """Returns example of Mockito test."""
 
     return read_file(find_resources_path() / "test_examples" / file_name)
 
+def estimate_prompt_overhead(prompt_names: list, example_code: str = '', shared_prompts: Optional[dict] = None) -> int:
+    """
+    Estimates the number of prompt tokens that do not depend on the chunk.
+
+    Parameters
+    ----------
+    prompt_names : list
+        Names of the prompt templates used for a chunk.
+    example_code : str, optional
+        Example test passed to the prompts.
+    shared_prompts : dict, optional
+        Mapping of prompt name to the prompt templates whose system prompts are appended to it.
+
+    Returns
+    -------
+    int
+        Estimated tokens of the largest prompt rendered with an empty chunk.
+    """
+    placeholders = {
+        "execution_function_name": "",
+        "tested_function_name": "",
+        "source_code": "",
+        "test_example": example_code,
+        "tests_plan": "",
+    }
+    shared_prompts = shared_prompts or {}
+    return max(estimate_tokens(get_buffer_string(create_messages_from_yaml_template(name, placeholders,
+                                                                                    shared_prompts.get(name))))
+               for name in prompt_names)
+
 def create_log_for_runnable_invocation(prompt_name: str, tst_fn_name: str, exe_fn_name: str) -> str:
     return {
         "planner_prompt": f"Planning tests for function: {tst_fn_name}, triggered by {exe_fn_name}",
         "tester_prompt": f"Generating tests for function: {tst_fn_name}, triggered by {exe_fn_name}",
+        "tester_continuation_prompt": f"Generating tests for function: {tst_fn_name}, triggered by {exe_fn_name}, "
+                                      f"continuing the plan conversation",
         "simple_planner_prompt": f"Planning tests for function: {tst_fn_name}, triggered by {exe_fn_name}"
     }[prompt_name]
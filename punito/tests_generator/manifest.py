@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+from ..utils import read_file, write_to_file
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def write_manifest(manifest: Dict[str, Dict[str, dict]], class_output_path: Path) -> None:
+    """
+    Saves the manifest of a test generation run.
+
+    Parameters
+    ----------
+    manifest : Dict[str, Dict[str, dict]]
+        Mapping of public method name to a mapping of tested method name to an entry with the
+        chunk `fingerprint` and the path of its generated `tests`, relative to `class_output_path`.
+    class_output_path : Path
+        Output directory of the class in the current run.
+    """
+    write_to_file(json.dumps({"chunks": manifest}, indent=2, sort_keys=True),
+                  class_output_path / MANIFEST_FILENAME)
+
+
+def find_previous_manifest(class_output_path: Path) -> Optional[Path]:
+    """
+    Finds the manifest of the latest earlier run for the same class and package version.
+
+    Runs are stored as `generated_tests/<version>/<date_time>/<class_name>`, so the latest run
+    is the one with the greatest `date_time` directory name.
+
+    Parameters
+    ----------
+    class_output_path : Path
+        Output directory of the class in the current run.
+
+    Returns
+    -------
+    Path or None
+        Path to the previous manifest, or None if there was no earlier run with a manifest.
+    """
+    current_run = class_output_path.parent
+    class_name = class_output_path.name
+    if not current_run.parent.exists():
+        return None
+
+    candidates = [run / class_name / MANIFEST_FILENAME for run in current_run.parent.iterdir()
+                  if run.is_dir() and run.name < current_run.name]
+    candidates = [path for path in candidates if path.is_file()]
+
+    return max(candidates, key=lambda path: path.parent.parent.name, default=None)
+
+
+def load_previous_tests(class_output_path: Path) -> Dict[str, Dict[str, dict]]:
+    """
+    Loads the chunk entries of the previous run, together with the code of their generated tests.
+
+    Parameters
+    ----------
+    class_output_path : Path
+        Output directory of the class in the current run.
+
+    Returns
+    -------
+    Dict[str, Dict[str, dict]]
+        Mapping of public method name to a mapping of tested method name to an entry with the
+        chunk `fingerprint`, the relative `tests` path and the tests `code`. Entries whose tests
+        can no longer be read are skipped.
+    """
+    manifest_path = find_previous_manifest(class_output_path)
+    if manifest_path is None:
+        logger.info("No previous run found, generating tests for all chunks")
+        return {}
+
+    try:
+        manifest = json.loads(read_file(manifest_path))["chunks"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring invalid manifest {manifest_path}: {e}")
+        return {}
+
+    logger.info(f"Comparing chunks with previous run: {manifest_path.parent.parent.name}")
+    previous = {}
+    for public_fn, deps in manifest.items():
+        for dep_name, entry in deps.items():
+            code = read_file(manifest_path.parent / entry["tests"])
+            if code:
+                previous.setdefault(public_fn, {})[dep_name] = {**entry, "code": code}
+    return previous
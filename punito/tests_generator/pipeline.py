@@ -1,4 +1,6 @@
 from pathlib import Path
+from typing import Dict, List
+
 from langchain_core.runnables import RunnableSequence
 
 from punito.tests_generator.runnables import PromptAndSaveRunnable
@@ -15,13 +17,45 @@ class TestsGenerationPipeline:
         - "prompt": Name of the prompt template.
         - "output_var": Key to store generated output.
         - "target_filename": Callable that returns the output filename.
+        Optionally:
+        - "generation": Generation parameters of the step's requests (`max_tokens`, `stop`, `temperature`).
+        - "stop_after_code_block": Whether to stream the output and stop once its fenced code block is complete.
+        - "continuation_prompt": Name of the prompt template continuing the conversation of the previous step.
     llm : Any
         Large language model instance.
+    continuation : bool, optional
+        Whether steps with a "continuation_prompt" continue the conversation of the previous step
+        instead of starting a new one, by default False. The previous step's output comes back as an
+        assistant message followed by the continuation prompt, so the code and context sent with
+        the previous step are not sent again and the server can reuse its cache of that request.
+        The continued step's system prompt (its "prompt") is appended to the one of the previous
+        step, so the continuation prompt itself only gives the instruction.
     """
 
-    def __init__(self, steps_config: dict, llm):
+    def __init__(self, steps_config: dict, llm, continuation: bool = False):
         self.llm = llm
         self.steps_config = steps_config
+        self.continuation = continuation
+
+    def shared_prompts(self, step_names: list) -> Dict[str, List[str]]:
+        """
+        Returns the system prompts each step shares with the step continuing its conversation.
+
+        Parameters
+        ----------
+        step_names : list
+            A list of step names, in execution order.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            Mapping of step name to the names of the prompt templates appended to its system prompt.
+        """
+        if not self.continuation:
+            return {}
+        return {step_name: [self.steps_config[next_step]["prompt"]]
+                for step_name, next_step in zip(step_names, step_names[1:])
+                if "continuation_prompt" in self.steps_config[next_step]}
 
     def build_pipeline(self, step_names: list, output_dir: Path) -> RunnableSequence:
         """
@@ -40,13 +74,23 @@ class TestsGenerationPipeline:
             A composed pipeline of `PromptAndSaveRunnable` instances.
         """
         runnables = []
+        shared_prompts = self.shared_prompts(step_names)
+        previous_output_key = None
         for step_name in step_names:
             config = self.steps_config[step_name]
             prompt = config["prompt"]
             output_key = config["output_var"]
             filename_fn = config["target_filename"]
 
-            runnables.append(PromptAndSaveRunnable(prompt, self.llm, output_key, output_dir, filename_fn))
+            continue_from = None
+            if self.continuation and previous_output_key is not None and "continuation_prompt" in config:
+                prompt = config["continuation_prompt"]
+                continue_from = previous_output_key
+
+            runnables.append(PromptAndSaveRunnable(prompt, self.llm, output_key, output_dir, filename_fn,
+                                                   config.get("generation"), config.get("stop_after_code_block", False),
+                                                   continue_from, shared_prompts.get(step_name)))
+            previous_output_key = output_key
         return RunnableSequence(*runnables)
 
     def run(self, flow: list, params: dict, output_dir: Path) -> dict:
@@ -70,3 +114,25 @@ class TestsGenerationPipeline:
 
         pipeline = self.build_pipeline(flow, output_dir)
         return pipeline.invoke(params)
+
+    async def arun(self, flow: list, params: dict, output_dir: Path) -> dict:
+        """
+        Async variant of `run`, awaiting the `ainvoke` of every step.
+
+        Parameters
+        ----------
+        flow : list
+            Ordered list of step names to run.
+        params : dict
+            Initial parameters passed to the first step (placeholders for the first prompt).
+        output_dir : Path
+            Directory to which outputs and prompts will be saved.
+
+        Returns
+        -------
+        dict
+            Dictionary with cumulative outputs from all steps, including initial `params`.
+        """
+
+        pipeline = self.build_pipeline(flow, output_dir)
+        return await pipeline.ainvoke(params)
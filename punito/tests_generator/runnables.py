@@ -1,17 +1,26 @@
 from pathlib import Path
-from typing import Any
-from langchain_core.messages import get_buffer_string
+from typing import Any, List, Optional
+from langchain_core.messages import BaseMessage, get_buffer_string
 from langchain_core.runnables import Runnable, RunnableConfig
 from loguru import logger
 
 from punito.tests_generator.generator_utils import create_log_for_runnable_invocation
-from punito.utils import create_messages_from_yaml_template, write_to_file
+from punito.utils import (create_continuation_messages_from_yaml_template, create_messages_from_yaml_template,
+                          write_to_file)
 
 
 class PromptAndSaveRunnable(Runnable):
     """
     Runnable that generates output using an LLM, saves the result and prompt to disk, and returns output in a dictionary.
 
+    The messages sent are returned as well, under `<output_key>_messages`. A runnable with
+    `continue_from` continues the conversation of the step that produced that output: its messages
+    are followed by the output as an assistant message and the user message of `prompt_name`.
+    A runnable with `shared_prompts` appends their system prompts to its own, for the steps
+    continuing its conversation.
+    An `affinity_key` in the input parameters is passed to the LLM, which routes requests with the
+    same key to the same server replica.
+
     Parameters
     ----------
     prompt_name : str
@@ -24,15 +33,29 @@ class PromptAndSaveRunnable(Runnable):
         Directory where output and prompts will be saved.
     filename_fn : callable
         Function that takes `params` as input and returns a filename string.
+    generation : dict, optional
+        Generation parameters passed to the LLM with every request, e.g. `max_tokens`, `stop` or `temperature`.
+    stop_after_code_block : bool, optional
+        Whether to stream the output and stop as soon as its fenced code block is complete, by default False.
+    continue_from : str, optional
+        Output key of the step whose conversation is continued, by default None (a new conversation).
+    shared_prompts : list, optional
+        Names of the prompt templates whose system prompts are appended to the one of `prompt_name`.
     """
 
     def __init__(self, prompt_name: str, llm, output_key: str,
-                 output_dir: Path, filename_fn: callable):
+                 output_dir: Path, filename_fn: callable, generation: Optional[dict] = None,
+                 stop_after_code_block: bool = False, continue_from: Optional[str] = None,
+                 shared_prompts: Optional[List[str]] = None):
         self.prompt_name = prompt_name
         self.llm = llm
         self.output_key = output_key
         self.output_dir = output_dir
         self.filename_fn = filename_fn
+        self.generation = {name: value for name, value in (generation or {}).items() if value is not None}
+        self.stop_after_code_block = stop_after_code_block
+        self.continue_from = continue_from
+        self.shared_prompts = shared_prompts
 
     def invoke(self, params: dict, config: RunnableConfig | None = None, **kwargs: Any) -> dict:
         """
@@ -53,11 +76,59 @@ class PromptAndSaveRunnable(Runnable):
             Dictionary combining original `params` with an additional key (`output_key`)
             containing the generated output string, which can be used in next step in the pipeline.
         """
+        messages = self._create_messages(params)
+        llm_kwargs = self._llm_kwargs(params)
+        if self.stop_after_code_block:
+            output = "".join(chunk.content for chunk in self.llm.stream(messages, config=config,
+                                                                        stop_after_code_block=True,
+                                                                        **llm_kwargs))
+        else:
+            output = self.llm.invoke(messages, config=config, **llm_kwargs).content
+        return self._save(params, messages, output)
+
+    async def ainvoke(self, params: dict, config: RunnableConfig | None = None, **kwargs: Any) -> dict:
+        """
+        Async variant of `invoke`; the LLM request does not block the event loop.
+
+        Parameters
+        ----------
+        params : dict
+            Input parameters for prompt.
+        config : RunnableConfig, optional
+            Configuration for the Runnable interface.
+        **kwargs : Any
+            Additional arguments.
+
+        Returns
+        -------
+        dict
+            Dictionary combining original `params` with the generated output under `output_key`.
+        """
+        messages = self._create_messages(params)
+        llm_kwargs = self._llm_kwargs(params)
+        if self.stop_after_code_block:
+            output = "".join([chunk.content async for chunk in self.llm.astream(messages, config=config,
+                                                                                stop_after_code_block=True,
+                                                                                **llm_kwargs)])
+        else:
+            output = (await self.llm.ainvoke(messages, config=config, **llm_kwargs)).content
+        return self._save(params, messages, output)
+
+    def _llm_kwargs(self, params: dict) -> dict:
+        if params.get("affinity_key") is None:
+            return self.generation
+        return {**self.generation, "affinity_key": params["affinity_key"]}
+
+    def _create_messages(self, params: dict) -> List[BaseMessage]:
         logger.info(create_log_for_runnable_invocation(self.prompt_name, params["tested_function_name"],
                                                        params["execution_function_name"]))
-        messages = create_messages_from_yaml_template(self.prompt_name, params)
-        output = self.llm.invoke(messages, config=config).content
+        if self.continue_from is not None:
+            return create_continuation_messages_from_yaml_template(self.prompt_name,
+                                                                   params[f"{self.continue_from}_messages"],
+                                                                   params[self.continue_from], params)
+        return create_messages_from_yaml_template(self.prompt_name, params, self.shared_prompts)
 
+    def _save(self, params: dict, messages: List[BaseMessage], output: str) -> dict:
         filename = self.filename_fn(params)
         output_path = self.output_dir / filename
         prompt_path = self.output_dir / "prompts" / f"{self.prompt_name}_{str(filename).replace('.java', '.txt')}"
@@ -65,4 +136,4 @@ class PromptAndSaveRunnable(Runnable):
         write_to_file(output, output_path)
         write_to_file(get_buffer_string(messages), prompt_path)
 
-        return {**params, self.output_key: output}
+        return {**params, self.output_key: output, f"{self.output_key}_messages": messages}
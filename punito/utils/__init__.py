@@ -1,4 +1,4 @@
 from .io_utils import read_file, read_yaml, write_to_file
 from .path_utils import find_project_root, find_resources_path, extract_class_name
 from .config_utils import get_default_settings, get_package_version, get_package_name
-from .prompt_utils import create_messages_from_yaml_template
\ No newline at end of file
+from .prompt_utils import create_messages_from_yaml_template, create_continuation_messages_from_yaml_template
\ No newline at end of file
@@ -1,26 +1,39 @@
+import inspect
 import time
 from loguru import logger
 from functools import wraps
 
+def _log_elapsed(func, start: float) -> None:
+    elapsed = time.perf_counter() - start
+
+    hours = int(elapsed // 3600)
+    minutes = int((elapsed % 3600) // 60)
+    seconds = elapsed % 60
+
+    parts = []
+    if hours > 0:
+        parts.append(f"{hours} h")
+    if minutes > 0:
+        parts.append(f"{minutes} min")
+    parts.append(f"{seconds:.3f} sec")
+
+    formatted = " ".join(parts)
+    logger.info(f"{func.__qualname__} executed in {formatted}")
+
 def measure_time(func):
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = await func(*args, **kwargs)
+            _log_elapsed(func, start)
+            return result
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         start = time.perf_counter()
         result = func(*args, **kwargs)
-        elapsed = time.perf_counter() - start
-
-        hours = int(elapsed // 3600)
-        minutes = int((elapsed % 3600) // 60)
-        seconds = elapsed % 60
-
-        parts = []
-        if hours > 0:
-            parts.append(f"{hours} h")
-        if minutes > 0:
-            parts.append(f"{minutes} min")
-        parts.append(f"{seconds:.3f} sec")
-
-        formatted = " ".join(parts)
-        logger.info(f"{func.__qualname__} executed in {formatted}")
+        _log_elapsed(func, start)
         return result
     return wrapper
@@ -1,3 +1,4 @@
+import os
 from functools import lru_cache
 
 from loguru import logger
@@ -6,6 +7,9 @@ import yaml
 
 def _format_long_path(path: Path) -> str:
     """Convert a pathlib.Path object to a long Windows path (\\?\ prefix)."""
+    # the prefix only exists on Windows, elsewhere it would be part of the file name
+    if os.name != "nt":
+        return str(path.resolve())
     return f"\\\\?\\{str(path.resolve())}"
 
 def read_file(path: Path) -> str:
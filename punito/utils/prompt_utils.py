@@ -1,9 +1,13 @@
+from typing import Optional
+
 from .path_utils import find_resources_path
 from .io_utils import read_yaml
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain_core.messages import AIMessage
 from langchain_core.messages.base import BaseMessage
 
-def create_messages_from_yaml_template(file_name: str, placeholders: dict) -> list[BaseMessage]:
+def create_messages_from_yaml_template(file_name: str, placeholders: dict,
+                                       shared_prompts: Optional[list[str]] = None) -> list[BaseMessage]:
     """
     Create a list of chat messages from a YAML template file.
 
@@ -13,6 +17,9 @@ def create_messages_from_yaml_template(file_name: str, placeholders: dict) -> li
         Name of the YAML file (without extension) containing 'system' and 'user' prompt templates.
     placeholders : dict
         Dictionary of placeholder values to format the prompt templates.
+    shared_prompts : list of str, optional
+        Names of YAML files whose 'system' templates are appended to the system message, so that
+        a conversation continued with their instructions already carries them.
 
     Returns
     -------
@@ -30,9 +37,48 @@ def create_messages_from_yaml_template(file_name: str, placeholders: dict) -> li
     if "system" not in data or "user" not in data:
         raise ValueError("Prompt YAML must contain both 'system' and 'user' keys.")
 
+    system = data["system"]
+    for shared_name in shared_prompts or []:
+        system += "\n" + read_yaml(str(find_resources_path() / 'prompts' / (shared_name + '.yaml')))["system"]
+
     prompt_template = ChatPromptTemplate.from_messages([
-        SystemMessagePromptTemplate.from_template(data["system"]),
+        SystemMessagePromptTemplate.from_template(system),
         HumanMessagePromptTemplate.from_template(data["user"])
     ])
 
-    return prompt_template.format_messages(**placeholders)
\ No newline at end of file
+    return prompt_template.format_messages(**placeholders)
+
+def create_continuation_messages_from_yaml_template(file_name: str, history: list[BaseMessage], reply: str,
+                                                    placeholders: dict) -> list[BaseMessage]:
+    """
+    Continue a conversation with the reply to it and a user message from a YAML template file.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the YAML file (without extension) containing a 'user' prompt template.
+    history : list of BaseMessage
+        Messages of the conversation so far.
+    reply : str
+        The model's reply to `history`, added as an assistant message.
+    placeholders : dict
+        Dictionary of placeholder values to format the prompt template.
+
+    Returns
+    -------
+    list of BaseMessage
+        The conversation followed by the reply and the formatted user message.
+
+    Raises
+    ------
+    ValueError
+        If the 'user' key is missing in the YAML file.
+    """
+
+    data = read_yaml(str(find_resources_path() / 'prompts' / (file_name + '.yaml')))
+
+    if "user" not in data:
+        raise ValueError("Continuation prompt YAML must contain a 'user' key.")
+
+    user_message = HumanMessagePromptTemplate.from_template(data["user"]).format(**placeholders)
+    return [*history, AIMessage(content=reply), user_message]